@@ -0,0 +1,541 @@
+"""
+Benchmark the CPU-bound (non-LLM) stages of the pipeline.
+
+Runs each stage over the GROBID corpus and over synthetic corpora scaled up
+from it, records wall time and peak resident memory (RSS, including lxml's
+C-level trees), and compares the result
+with a stored baseline. Exits with status 1 when a stage regresses past the
+threshold.
+
+Usage:
+  python benchmark.py                              # Compare with benchmark_baseline.json
+  python benchmark.py --scales 1,10 --repeat 5
+  python benchmark.py --only tei_parse,classify_table
+  python benchmark.py --save-baseline              # Record a new baseline
+"""
+
+import sys
+import argparse
+import gc
+import json
+import logging
+import multiprocessing
+import platform
+import random
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+try:
+    import resource  # POSIX
+except ImportError:
+    resource = None
+try:
+    import psutil  # Optional: peak working set on Windows
+except ImportError:
+    psutil = None
+
+# Add parent to path (V1 modules) and the V2 phase modules
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "om_qex_extraction_v2" / "src"))
+# Project root, for the V1 utilities the V2 phases import (om_qex_extraction.src)
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.tei_parser import TEIParser
+from src.paragraph_table_detector import detect_paragraph_tables
+from src.smart_table_filter import TableReferences, classify_table
+from src.table_classifier import classify_tables
+from src.table_extractor import extract_tables
+from src.text_index import TextIndex
+from src.corpus_store import CorpusStore
+from src.tei_compact import compact_tei
+from src.tei_document import TEIDocument
+from src.comparer import ExtractionComparer
+from fix_literal_text_parsing import fix_outcome, should_parse_outcome
+from phase4_outcome_mapping import Phase4OutcomeMapping
+from phase5_qex_extraction import Phase5QEXExtraction
+from phase6_postprocessing import Phase6PostProcessing
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DEFAULT_TEI_DIR = PROJECT_ROOT / "data" / "grobid_outputs" / "tei"
+DEFAULT_HUMAN_CSV = PROJECT_ROOT / "data" / "human_extraction" / "8 week SR QEX Pierre SOF and TEEP(Quant Extraction Form).csv"
+DEFAULT_BASELINE = Path(__file__).parent / "benchmark_baseline.json"
+
+# Regressions smaller than these are treated as noise
+MIN_SECONDS_DELTA = 0.05
+MIN_PEAK_MB_DELTA = 1.0
+
+OUTCOME_NAMES = [
+    'Total consumption', 'Food expenditure', 'Livestock value', 'Total assets', 'Savings balance',
+    'Household income', 'Labor hours', 'Food security index', 'Mental health index', 'Women empowerment index'
+]
+TREATMENT_ARMS = ['Treatment', 'Full package', 'Asset transfer only', 'Cash transfer']
+
+
+# ----------------------------------------------------------------------
+# Corpus
+# ----------------------------------------------------------------------
+
+def load_corpus(tei_dir: Path, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Parse the TEI corpus once into the inputs every stage needs.
+
+    Returns:
+        One dict per paper: key, tei_file, full_text, tables
+    """
+    papers = []
+    for tei_file in sorted(tei_dir.glob("*.tei.xml"))[:limit]:
+        key = tei_file.name.replace('.tei.xml', '')
+        parser = TEIParser(tei_file)
+        papers.append({
+            'key': key,
+            'tei_file': tei_file,
+            'full_text': parser.get_full_text(),
+            'tables': extract_tables(TEIDocument.from_file(tei_file), key)
+        })
+    return papers
+
+
+def synthetic_outcomes(key: str, count: int, rng: random.Random) -> List[Dict]:
+    """Phase 3-style outcome records; about a third lack parsed statistics."""
+    outcomes = []
+    for i in range(count):
+        effect = round(rng.uniform(-2.0, 5.0), 3)
+        se = round(abs(effect) / rng.uniform(1.0, 4.0) + 0.01, 3)
+        stars = rng.choice(['', '*', '**', '***'])
+        parsed = rng.random() > 0.33
+        outcomes.append({
+            'table_number': str(rng.randint(1, 12)),
+            'outcome_name': rng.choice(OUTCOME_NAMES),
+            'outcome_description': f"Synthetic outcome {i} for {key}",
+            'treatment_arm': rng.choice(TREATMENT_ARMS),
+            'subgroup': rng.choice([None, None, 'Women', 'Men']),
+            'effect_size': effect if parsed else None,
+            'standard_error': se if parsed else None,
+            'p_value': round(rng.uniform(0.001, 0.5), 3) if parsed else None,
+            'confidence_interval': None,
+            'sample_size': rng.randint(200, 5000),
+            'literal_text': f"{rng.choice(TREATMENT_ARMS)} | {effect:,}{stars} ({se})",
+            'text_position': f"Table {rng.randint(1, 12)}, Row {i}"
+        })
+    return outcomes
+
+
+def scale_corpus(papers: List[Dict], scale: int, outcomes_per_paper: int, seed: int = 0) -> Dict:
+    """
+    Build the inputs for one corpus size.
+
+    The TEI papers are repeated `scale` times; synthetic outcomes and LLM
+    rows are generated per (paper, copy) from a fixed seed.
+    """
+    rng = random.Random(seed)
+    keys = [f"{p['key']}_{copy_index}" for copy_index in range(scale) for p in papers]
+    return {
+        'papers': [p for _ in range(scale) for p in papers],
+        'outcomes': {key: synthetic_outcomes(key, outcomes_per_paper, rng) for key in keys}
+    }
+
+
+# ----------------------------------------------------------------------
+# Stages
+# ----------------------------------------------------------------------
+
+def _read_tei(tei_file: Path, streaming: bool):
+    parser = TEIParser(tei_file, streaming=streaming)
+    parser.get_metadata()
+    parser.get_full_text()
+    parser.get_sections()
+    parser.get_figures()
+
+
+def bench_tei_parse(corpus: Dict, context: Dict) -> int:
+    for paper in corpus['papers']:
+        _read_tei(paper['tei_file'], streaming=False)
+    return len(corpus['papers'])
+
+
+def bench_tei_parse_streaming(corpus: Dict, context: Dict) -> int:
+    for paper in corpus['papers']:
+        _read_tei(paper['tei_file'], streaming=True)
+    return len(corpus['papers'])
+
+
+def bench_table_extract(corpus: Dict, context: Dict) -> int:
+    count = 0
+    for paper in corpus['papers']:
+        tei_file = paper['tei_file']
+        document = TEIDocument.from_file(tei_file)
+        count += len(extract_tables(document, paper['key'], tei_file.read_text(encoding='utf-8')))
+    return count
+
+
+def bench_paragraph_tables(corpus: Dict, context: Dict) -> int:
+    count = 0
+    for paper in corpus['papers']:
+        count += len(detect_paragraph_tables(TEIDocument.from_file(paper['tei_file'])))
+    return count
+
+
+def bench_text_index(corpus: Dict, context: Dict) -> int:
+    """Index every paper (copies re-index their file) and look up the references to each table."""
+    count = 0
+    with tempfile.TemporaryDirectory() as index_dir:
+        index = TextIndex(Path(index_dir) / "text_index.sqlite")
+        for paper in corpus['papers']:
+            index.update_file(paper['tei_file'], force=True)
+            for table in paper['tables']:
+                if table['numbered']:
+                    index.table_context(paper['key'], table['table_number'])
+                    count += 1
+        index.close()
+    return count
+
+
+def bench_corpus_store(corpus: Dict, context: Dict) -> int:
+    """Pack every paper's text into a store, then read a context window around each table reference."""
+    count = 0
+    with tempfile.TemporaryDirectory() as store_dir:
+        sources = {}
+        for i, paper in enumerate(corpus['papers']):
+            path = Path(store_dir) / f"{i}.txt"
+            path.write_text(paper['full_text'], encoding='utf-8')
+            sources[f"{paper['key']}_{i}"] = path
+        store = CorpusStore.build(sources, Path(store_dir) / "store")
+        for i, paper in enumerate(corpus['papers']):
+            key = f"{paper['key']}_{i}"
+            for table in paper['tables']:
+                offset = store.find(key, f"Table {table['table_number']}")
+                if offset != -1:
+                    window = store.window(key, offset, 500, 500)
+                    store.paragraph_at(key, offset)
+                    window.release()
+                count += 1
+        store.close()
+    return count
+
+
+def bench_tei_compact(corpus: Dict, context: Dict) -> int:
+    """Compact every paper's TEI for the Phase 1/Phase 3 prompts."""
+    for paper in corpus['papers']:
+        compact_tei(paper['tei_file'].read_text(encoding='utf-8'))
+    return len(corpus['papers'])
+
+
+def bench_classify_table(corpus: Dict, context: Dict) -> int:
+    count = 0
+    for paper in corpus['papers']:
+        references = TableReferences(paper['full_text'])
+        for table in paper['tables']:
+            classify_table(table, paper['full_text'], references)
+            count += 1
+    return count
+
+
+def bench_classify_tables_batch(corpus: Dict, context: Dict) -> int:
+    """Feature matrix of every table in the corpus, scored in one batch."""
+    frame = classify_tables((p['key'], p['tables'], p['full_text']) for p in corpus['papers'])
+    return len(frame)
+
+
+def bench_phase4_group(corpus: Dict, context: Dict) -> int:
+    phase4 = Phase4OutcomeMapping(None, "", {})
+    for outcomes in corpus['outcomes'].values():
+        phase4._group_by_outcome(outcomes)
+    return sum(len(o) for o in corpus['outcomes'].values())
+
+
+def bench_phase5_validate(corpus: Dict, context: Dict) -> int:
+    phase5 = Phase5QEXExtraction(None, "", {})
+    for outcomes in corpus['outcomes'].values():
+        phase5._validate_statistics(outcomes)
+    return sum(len(o) for o in corpus['outcomes'].values())
+
+
+def bench_phase6_export(corpus: Dict, context: Dict) -> int:
+    phase4 = Phase4OutcomeMapping(None, "", {})
+    phase6 = Phase6PostProcessing(None, "", {})
+    count = 0
+    with tempfile.TemporaryDirectory() as output_dir:
+        for key, outcomes in corpus['outcomes'].items():
+            groups = phase4._group_by_outcome(outcomes)
+            records = phase6._flatten_outcome_groups(groups, key)
+            phase6.save_result({'_key': key, 'records': records}, Path(output_dir))
+            count += len(records)
+    return count
+
+
+def bench_fix_literal_text(corpus: Dict, context: Dict) -> int:
+    count = 0
+    for outcomes in corpus['outcomes'].values():
+        for outcome in outcomes:
+            if should_parse_outcome(outcome):
+                fix_outcome(dict(outcome))
+            count += 1
+    return count
+
+
+def bench_compare_extractions(corpus: Dict, context: Dict) -> int:
+    human_df = context.get('human_df')
+    if human_df is None:
+        return 0
+    comparer = ExtractionComparer()
+    comparer.compare_extractions(context['llm_df'], human_df)
+    return len(context['llm_df'])
+
+
+def compare_context(corpus: Dict, human_csv: Path, seed: int = 0) -> Dict:
+    """Human extractions plus one synthetic LLM row per (paper, copy) matched to a human StudyID."""
+    if not human_csv.exists():
+        return {}
+    comparer = ExtractionComparer()
+    human_df = comparer.load_human_extraction(human_csv)
+    study_ids = [s for s in human_df['StudyID'].dropna().astype(str).unique()]
+    if not study_ids:
+        return {}
+
+    rng = random.Random(seed)
+    rows = []
+    for key, outcomes in corpus['outcomes'].items():
+        outcome = outcomes[0] if outcomes else {}
+        rows.append({
+            'study_id': rng.choice(study_ids),
+            'author_name': key,
+            'year_of_publication': rng.randint(2005, 2023),
+            'program_name': "Graduation programme",
+            'country': rng.choice(['Ethiopia', 'Peru', 'Malawi']),
+            'year_intervention_started': rng.randint(2005, 2020),
+            'outcome_name': outcome.get('outcome_name'),
+            'outcome_description': outcome.get('outcome_description'),
+            'evaluation_design': "Randomized Controlled Trial",
+            'sample_size_treatment': rng.randint(100, 2000),
+            'sample_size_control': rng.randint(100, 2000),
+            'effect_size': outcome.get('effect_size'),
+            'p_value': outcome.get('p_value'),
+            'graduation_components': json.dumps({'consumption_support': 'Yes', 'assets': 'Yes', 'coaching': 'No'})
+        })
+    return {'human_df': human_df, 'llm_df': pd.DataFrame(rows)}
+
+
+STAGES: Dict[str, Callable[[Dict, Dict], int]] = {
+    'tei_parse': bench_tei_parse,
+    'tei_parse_streaming': bench_tei_parse_streaming,
+    'table_extract': bench_table_extract,
+    'paragraph_tables': bench_paragraph_tables,
+    'text_index': bench_text_index,
+    'corpus_store': bench_corpus_store,
+    'tei_compact': bench_tei_compact,
+    'classify_table': bench_classify_table,
+    'classify_tables_batch': bench_classify_tables_batch,
+    'phase4_group': bench_phase4_group,
+    'phase5_validate': bench_phase5_validate,
+    'phase6_export': bench_phase6_export,
+    'fix_literal_text': bench_fix_literal_text,
+    'compare_extractions': bench_compare_extractions,
+}
+
+
+# ----------------------------------------------------------------------
+# Measurement and baseline comparison
+# ----------------------------------------------------------------------
+
+def _peak_rss() -> Optional[int]:
+    """Peak resident set size of this process in bytes (None where it cannot be read)."""
+    try:
+        # Linux: VmHWM follows _reset_peak_rss(); ru_maxrss also keeps the peak of the process before exec
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024  # Linux reports KB
+    if psutil is not None:
+        return getattr(psutil.Process().memory_info(), 'peak_wset', None)
+    return None
+
+
+def _reset_peak_rss():
+    """Reset the peak RSS mark to the current RSS (Linux; elsewhere the mark keeps the setup peak)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _stage_peak_rss(name: str, corpus: Dict, context: Dict) -> Optional[int]:
+    """Run one stage in a fresh process; growth of its peak RSS during the stage (bytes)."""
+    logging.basicConfig(level=logging.ERROR)
+    gc.collect()
+    _reset_peak_rss()
+    before = _peak_rss()
+    STAGES[name](corpus, context)
+    after = _peak_rss()
+    return None if before is None or after is None else max(after - before, 0)
+
+
+def measure(name: str, corpus: Dict, context: Dict, repeat: int) -> Dict:
+    """
+    Best-of-`repeat` wall time (perf_counter), then one extra run in a
+    freshly spawned process for peak memory: the growth of its peak RSS
+    during the stage, so lxml trees and other C-level allocations count and
+    earlier stages' allocations do not. Outside Linux the peak mark cannot
+    be reset after setup, so small stages may report 0. None where peak RSS
+    is unavailable (Windows without psutil).
+    """
+    stage = STAGES[name]
+    timings = []
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = stage(corpus, context)
+        timings.append(time.perf_counter() - start)
+
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        peak = pool.apply(_stage_peak_rss, (name, corpus, context))
+
+    best = min(timings)
+    return {
+        'seconds': round(best, 4),
+        'median_seconds': round(sorted(timings)[len(timings) // 2], 4),
+        'peak_mb': round(peak / 1024 / 1024, 2) if peak is not None else None,
+        'items': items,
+        'items_per_second': round(items / best, 1) if best > 0 else None
+    }
+
+
+def find_regressions(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Stages whose time or peak RSS exceeds the baseline by more than `threshold` (relative)."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result['items'] != base.get('items'):
+            regressions.append(f"{name}: processed {result['items']} items, baseline {base.get('items')} "
+                               f"(different corpus - re-record the baseline)")
+            continue
+        if (result['seconds'] > base['seconds'] * (1 + threshold)
+                and result['seconds'] - base['seconds'] > MIN_SECONDS_DELTA):
+            regressions.append(f"{name}: {result['seconds']:.3f}s vs baseline {base['seconds']:.3f}s "
+                               f"(+{(result['seconds'] / base['seconds'] - 1) * 100:.0f}%)")
+        if (result['peak_mb'] is not None and base.get('peak_mb') is not None
+                and result['peak_mb'] > base['peak_mb'] * (1 + threshold)
+                and result['peak_mb'] - base['peak_mb'] > MIN_PEAK_MB_DELTA):
+            regressions.append(f"{name}: peak {result['peak_mb']:.1f} MB vs baseline {base['peak_mb']:.1f} MB "
+                               f"(+{(result['peak_mb'] / base['peak_mb'] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local (non-LLM) pipeline stages")
+    parser.add_argument('--tei-dir', type=str, default=str(DEFAULT_TEI_DIR), help='TEI corpus directory')
+    parser.add_argument('--human-csv', type=str, default=str(DEFAULT_HUMAN_CSV), help='Human extraction CSV (comparison stage)')
+    parser.add_argument('--limit', type=int, help='Use only the first N papers')
+    parser.add_argument('--scales', type=str, default='1,5', help='Corpus multipliers (default: 1,5)')
+    parser.add_argument('--outcomes-per-paper', type=int, default=60, help='Synthetic outcomes per paper (default: 60)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage; the fastest counts (default: 3)')
+    parser.add_argument('--only', type=str, help=f"Comma-separated stages ({', '.join(STAGES)})")
+    parser.add_argument('--baseline', type=str, default=str(DEFAULT_BASELINE), help='Baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed relative regression (default: 0.25)')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--output', type=str, help='Also write the results to this JSON file')
+
+    args = parser.parse_args()
+
+    # Per-paper log messages from the stages would dominate the timings
+    logging.basicConfig(level=logging.ERROR)
+
+    stage_names = [s.strip() for s in args.only.split(',')] if args.only else list(STAGES)
+    unknown = [s for s in stage_names if s not in STAGES]
+    if unknown:
+        print(f"❌ Unknown stage(s): {', '.join(unknown)}")
+        return 2
+    scales = [int(s) for s in args.scales.split(',')]
+
+    print(f"📚 Loading corpus from {args.tei_dir}")
+    papers = load_corpus(Path(args.tei_dir), args.limit)
+    if not papers:
+        print(f"❌ No TEI files found in {args.tei_dir}")
+        return 2
+    print(f"   {len(papers)} papers, {sum(len(p['tables']) for p in papers)} tables")
+
+    results: Dict[str, Dict] = {}
+    for scale in scales:
+        corpus = scale_corpus(papers, scale, args.outcomes_per_paper)
+        context = compare_context(corpus, Path(args.human_csv)) if 'compare_extractions' in stage_names else {}
+
+        print(f"\n{'='*72}")
+        print(f"SCALE x{scale} ({len(corpus['papers'])} papers)")
+        print(f"{'='*72}")
+        print(f"  {'stage':<22}{'best s':>10}{'median s':>10}{'peak MB':>10}{'items':>10}{'items/s':>10}")
+        for name in stage_names:
+            if name == 'compare_extractions' and not context:
+                print(f"  {name:<22}   skipped (no human extraction CSV)")
+                continue
+            result = measure(name, corpus, context, args.repeat)
+            results[f"{name}@x{scale}"] = result
+            peak = f"{result['peak_mb']:.1f}" if result['peak_mb'] is not None else "n/a"
+            print(f"  {name:<22}{result['seconds']:>10.3f}{result['median_seconds']:>10.3f}"
+                  f"{peak:>10}{result['items']:>10}{result['items_per_second'] or 0:>10.0f}")
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'papers': len(papers),
+        'outcomes_per_paper': args.outcomes_per_paper,
+        'repeat': args.repeat,
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+    baseline_file = Path(args.baseline)
+    if args.save_baseline:
+        with open(baseline_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"\n💾 Baseline saved to {baseline_file}")
+        return 0
+
+    if not baseline_file.exists():
+        print(f"\n⚠️  No baseline at {baseline_file} - run with --save-baseline to record one")
+        return 0
+
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = find_regressions(results, baseline.get('results', {}), args.threshold)
+
+    print(f"\n{'='*72}")
+    print(f"BASELINE ({baseline.get('created', 'unknown date')}, threshold +{args.threshold * 100:.0f}%)")
+    print(f"{'='*72}")
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base:
+            change = (result['seconds'] / base['seconds'] - 1) * 100 if base['seconds'] else 0.0
+            print(f"  {name:<28}{base['seconds']:>10.3f}s -> {result['seconds']:>8.3f}s ({change:+.0f}%)")
+        else:
+            print(f"  {name:<28}   not in baseline")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s):")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+
+    print(f"\n✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
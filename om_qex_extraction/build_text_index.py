@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Build (or update) the full-text index over the TEI corpus and query it.
+
+Only new and changed TEI files are re-indexed, so rerunning after GROBID
+outputs change is cheap. The V2 pipeline also updates the index per paper.
+
+Usage:
+  python build_text_index.py                       # Index new/changed TEI files
+  python build_text_index.py --rebuild             # Re-index everything
+  python build_text_index.py --query "savings AND impact" --key PHRKN65M
+  python build_text_index.py --table 3 --key PHRKN65M
+"""
+
+import sys
+import io
+
+# Force UTF-8 output encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+import argparse
+import time
+from pathlib import Path
+
+import yaml
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.text_index import PASSAGE_KINDS, TextIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text index over TEI paragraphs, captions and table cells")
+    parser.add_argument('--tei-dir', type=str, help='TEI directory (default: data/grobid_outputs/tei)')
+    parser.add_argument('--index', type=str,
+                        help='Index database (default: text_index.path from config, '
+                             'else om_qex_extraction/outputs/cache/text_index.sqlite)')
+    parser.add_argument('--rebuild', action='store_true', help='Re-index every TEI file')
+    parser.add_argument('--query', type=str, help='FTS5 query to run after updating')
+    parser.add_argument('--table', type=str, help='Show references to this table number (needs --key)')
+    parser.add_argument('--key', type=str, help='Restrict queries to one paper')
+    parser.add_argument('--kinds', nargs='+', choices=PASSAGE_KINDS, help='Restrict --query to passage kinds')
+    parser.add_argument('--limit', type=int, default=10, help='Maximum results (default: 10)')
+
+    args = parser.parse_args()
+
+    # Paths
+    project_root = Path(__file__).parent.parent
+    tei_dir = Path(args.tei_dir) if args.tei_dir else project_root / "data" / "grobid_outputs" / "tei"
+
+    config = {}
+    config_path = Path(__file__).parent / "config" / "config.yaml"
+    if config_path.exists():
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f) or {}
+    if args.index:
+        index = TextIndex(Path(args.index))
+    else:
+        index = TextIndex.from_config({'text_index': {**(config.get('text_index') or {}), 'enabled': True}},
+                                      project_root)
+        if index is None:
+            print("❌ SQLite FTS5 is not available")
+            return 1
+
+    tei_files = sorted(tei_dir.glob("*.tei.xml"))
+    if not tei_files:
+        print(f"❌ No TEI files found in {tei_dir}")
+        return 1
+
+    print(f"📇 Indexing {len(tei_files)} TEI files into {index.db_path}...")
+    start = time.perf_counter()
+    counts = index.update(tei_files, force=args.rebuild)
+    removed = index.prune(f.name.replace('.tei.xml', '') for f in tei_files)
+    stats = index.stats()
+    print(f"  - Indexed: {counts['indexed']}, unchanged: {counts['unchanged']}, "
+          f"failed: {counts['failed']}, removed: {removed} ({time.perf_counter() - start:.1f}s)")
+    print(f"  - {stats['documents']} papers, {stats['passages']} passages: "
+          + ', '.join(f"{n} {kind}" for kind, n in sorted(stats['by_kind'].items())))
+
+    if args.table:
+        if not args.key:
+            print("--table needs --key")
+            return 1
+        context = index.table_context(args.key, args.table)
+        print(f"\nTable {args.table} in {args.key}: {context['mentions']} references")
+        for excerpt in context['excerpts']:
+            print(f"  [section {excerpt['section_index']}, {excerpt['xml_id']}] ...{excerpt['text']}...")
+
+    if args.query:
+        results = index.search(args.query, key=args.key, kinds=args.kinds, limit=args.limit)
+        print(f"\n{len(results)} results for {args.query!r}")
+        for passage in results:
+            location = f"section {passage['section_index']}" if passage['section_index'] is not None else passage['part']
+            print(f"  {passage['key']} {passage['kind']} ({location}, chars {passage['char_start']}-"
+                  f"{passage['char_end']}): {passage['text'][:120]}")
+
+    index.close()
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
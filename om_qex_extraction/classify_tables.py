@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Classify every extracted table as results vs descriptive in one batch (no LLM calls).
+
+Reads the {key}_table_N.json and {key}.txt files written by extract_tables.py,
+builds the feature matrix and scores it with the table_classifier weights
+(config table_classifier.weights, or --weights). Writes one CSV row per table
+with the decision, score and every feature.
+
+Usage:
+  python classify_tables.py --all
+  python classify_tables.py --keys PHRKN65M ABM3E3ZP
+  python classify_tables.py --all --weights outputs/table_classifier.json --output outputs/tables.csv
+"""
+
+import sys
+import io
+
+# Force UTF-8 output encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+import argparse
+import time
+from pathlib import Path
+
+import yaml
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.table_classifier import TableClassifier, classify_tables, load_corpus_tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify extracted tables as results vs descriptive")
+    parser.add_argument('--all', action='store_true', help='Run on all papers')
+    parser.add_argument('--keys', nargs='+', help='Run on specific keys (e.g., CV27ZK8Q 35NWH5BA)')
+    parser.add_argument('--data-dir', type=str,
+                        help='Directory with tables/ and text/ (default: data/final_114_combined)')
+    parser.add_argument('--weights', type=str,
+                        help='Classifier weights JSON (default: config table_classifier.weights, else built-in)')
+    parser.add_argument('--output', type=str,
+                        help='CSV file (default: outputs/table_classification.csv)')
+
+    args = parser.parse_args()
+
+    if not args.all and not args.keys:
+        print("Please specify --keys [KEYS] or --all")
+        parser.print_help()
+        return 1
+
+    # Paths
+    project_root = Path(__file__).parent.parent
+    data_dir = Path(args.data_dir) if args.data_dir else project_root / "data" / "final_114_combined"
+    output_file = Path(args.output) if args.output else Path(__file__).parent / "outputs" / "table_classification.csv"
+
+    weights = args.weights
+    config_path = Path(__file__).parent / "config" / "config.yaml"
+    if weights is None and config_path.exists():
+        with open(config_path, 'r') as f:
+            weights = ((yaml.safe_load(f) or {}).get('table_classifier', {}) or {}).get('weights')
+        if weights and not Path(weights).is_absolute():
+            weights = project_root / weights
+
+    tables_dir = data_dir / "tables"
+    if not any(tables_dir.glob("*_table_*.json")):
+        print(f"❌ No tables found in {tables_dir} (run extract_tables.py first)")
+        return 1
+
+    try:
+        classifier = TableClassifier.load(Path(weights) if weights else None)
+    except (OSError, ValueError) as e:
+        print(f"❌ Could not load classifier weights {weights}: {e}")
+        return 1
+
+    print(f"📊 Classifying tables ({'weights: ' + str(weights) if weights else 'built-in weights'})...")
+    start = time.perf_counter()
+    frame = classify_tables(load_corpus_tables(tables_dir, data_dir / "text", keys=args.keys), classifier)
+    elapsed = time.perf_counter() - start
+
+    if args.keys:
+        found = set(frame['key'])
+        missing = [k for k in args.keys if k not in found]
+        if missing:
+            print(f"⚠️  Warning: No tables for {', '.join(missing)}")
+
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    frame.to_csv(output_file, index=False)
+
+    print(f"\n{'='*60}")
+    print(f"✅ TABLE CLASSIFICATION COMPLETE ({elapsed:.1f}s)")
+    print(f"{'='*60}")
+    print(f"  - Papers: {frame['key'].nunique()}")
+    print(f"  - Tables: {len(frame)} ({int(frame['is_results'].sum())} results, "
+          f"{int((frame['is_figure'] > 0).sum())} figures)")
+    print(f"  - Output: {output_file}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Extract structured tables from GROBID TEI files (no LLM calls).
+
+Writes {key}_table_N.json (caption, rows, cells, table_number, source offsets)
+and {key}.txt full text in the layout smart_table_filter reads.
+
+Usage:
+  python extract_tables.py --all                 # All papers, one process per CPU
+  python extract_tables.py --keys PHRKN65M ABM3E3ZP
+  python extract_tables.py --all --workers 4 --output ../data/final_114_combined
+"""
+
+import sys
+import io
+
+# Force UTF-8 output encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+import argparse
+import time
+from pathlib import Path
+
+import yaml
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.table_extractor import extract_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract structured tables from TEI XML")
+    parser.add_argument('--all', action='store_true', help='Run on all papers')
+    parser.add_argument('--keys', nargs='+', help='Run on specific keys (e.g., CV27ZK8Q 35NWH5BA)')
+    parser.add_argument('--tei-dir', type=str, help='TEI directory (default: data/grobid_outputs/tei)')
+    parser.add_argument('--output', type=str,
+                        help='Output directory; tables/ and text/ are created inside (default: data/final_114_combined)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--no-text', action='store_true', help='Do not write {key}.txt full text files')
+    parser.add_argument('--no-doc-cache', action='store_true', help='Do not use the parsed-document cache')
+
+    args = parser.parse_args()
+
+    # Paths
+    project_root = Path(__file__).parent.parent
+    tei_dir = Path(args.tei_dir) if args.tei_dir else project_root / "data" / "grobid_outputs" / "tei"
+    output_dir = Path(args.output) if args.output else project_root / "data" / "final_114_combined"
+
+    all_tei_files = sorted(tei_dir.glob("*.tei.xml"))
+    if not all_tei_files:
+        print(f"❌ No TEI files found in {tei_dir}")
+        return 1
+
+    if args.keys:
+        tei_files = [f for f in all_tei_files if f.name.replace('.tei.xml', '') in args.keys]
+        if len(tei_files) != len(args.keys):
+            print(f"⚠️  Warning: Found {len(tei_files)} of {len(args.keys)} requested keys")
+    elif args.all:
+        tei_files = all_tei_files
+    else:
+        print("Please specify --keys [KEYS] or --all")
+        parser.print_help()
+        return 1
+
+    # Share parsed documents with the extraction pipelines (config doc_cache section)
+    cache_dir = None
+    config_path = Path(__file__).parent / "config" / "config.yaml"
+    if not args.no_doc_cache and config_path.exists():
+        with open(config_path, 'r') as f:
+            cache_config = (yaml.safe_load(f) or {}).get('doc_cache', {}) or {}
+        if cache_config.get('enabled', True):
+            cache_dir = Path(cache_config.get('path', 'om_qex_extraction/outputs/cache/documents'))
+            if not cache_dir.is_absolute():
+                cache_dir = project_root / cache_dir
+
+    print(f"📊 Extracting tables from {len(tei_files)} papers...")
+    start = time.perf_counter()
+    summaries = extract_corpus(
+        tei_files,
+        output_dir / "tables",
+        text_dir=None if args.no_text else output_dir / "text",
+        workers=args.workers,
+        cache_dir=cache_dir
+    )
+    elapsed = time.perf_counter() - start
+
+    failed = [s for s in summaries if s['error']]
+    done = [s for s in summaries if not s['error']]
+    total_tables = sum(s['tables'] for s in done)
+
+    print(f"\n{'='*60}")
+    print(f"✅ TABLE EXTRACTION COMPLETE ({elapsed:.1f}s)")
+    print(f"{'='*60}")
+    print(f"  - Papers: {len(done)}/{len(summaries)}")
+    print(f"  - Tables: {total_tables} "
+          f"({sum(s['numbered'] for s in done)} numbered, {sum(s['with_rows'] for s in done)} with cell grids)")
+    print(f"  - Tables directory: {output_dir / 'tables'}")
+    if not args.no_text:
+        print(f"  - Text directory: {output_dir / 'text'}")
+    for s in failed:
+        print(f"❌ {s['key']}: {s['error']}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Summarize the token ledger: where do tokens and latency go?
+
+Usage:
+  python ledger_summary.py                       # Latest run
+  python ledger_summary.py --run all             # Every run in the ledger
+  python ledger_summary.py --run 20251117_142233 --top 20
+  python ledger_summary.py --ledger ../om_qex_extraction_v2/om_qex_extraction_v2/outputs/token_ledger.jsonl
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.token_ledger import load_ledger
+
+
+def summarize(df: pd.DataFrame, by: str) -> pd.DataFrame:
+    """Aggregate calls, tokens and latency per group, largest token users first."""
+    summary = df.groupby(by).agg(
+        calls=('phase', 'size'),
+        cached=('cached', 'sum'),
+        errors=('status', lambda s: (s == 'error').sum()),
+        truncated=('status', lambda s: (s == 'truncated').sum()),
+        estimated_prompt=('estimated_prompt_tokens', 'sum'),
+        prompt_tokens=('prompt_tokens', 'sum'),
+        completion_tokens=('completion_tokens', 'sum'),
+        total_tokens=('total_tokens', 'sum'),
+        latency_s=('latency_s', 'sum'),
+        max_latency_s=('latency_s', 'max')
+    )
+    return summary.sort_values('total_tokens', ascending=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize LLM token usage and latency from the token ledger")
+    parser.add_argument('--ledger', type=str, help='Path to the ledger JSONL (default: outputs/token_ledger.jsonl)')
+    parser.add_argument('--run', type=str, default='latest', help='Run id, "latest" (default) or "all"')
+    parser.add_argument('--top', type=int, default=10, help='Number of papers to list (default: 10)')
+    parser.add_argument('--csv', type=str, help='Also write the per-paper summary to this CSV file')
+
+    args = parser.parse_args()
+
+    ledger_file = Path(args.ledger) if args.ledger else Path(__file__).parent / "outputs" / "token_ledger.jsonl"
+    entries = load_ledger(ledger_file)
+    if not entries:
+        print(f"❌ No ledger entries found in {ledger_file}")
+        return 1
+
+    df = pd.DataFrame(entries)
+    df['key'] = df['key'].fillna('(none)')
+
+    if args.run == 'latest':
+        run_id = df['run_id'].max()
+        df = df[df['run_id'] == run_id]
+        print(f"📒 Run {run_id} ({len(df)} calls)")
+    elif args.run != 'all':
+        df = df[df['run_id'] == args.run]
+        if df.empty:
+            print(f"❌ Run {args.run} not found in {ledger_file}")
+            return 1
+        print(f"📒 Run {args.run} ({len(df)} calls)")
+    else:
+        print(f"📒 All runs ({df['run_id'].nunique()} runs, {len(df)} calls)")
+
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', 20)
+
+    # Totals
+    api_calls = df[~df['cached'].astype(bool)]
+    print(f"\n{'='*60}")
+    print(f"TOTALS")
+    print(f"{'='*60}")
+    print(f"  API calls:          {len(api_calls)} ({int(df['cached'].sum())} served from cache)")
+    print(f"  Prompt tokens:      {int(df['prompt_tokens'].sum()):,}")
+    print(f"  Completion tokens:  {int(df['completion_tokens'].sum()):,}")
+    print(f"  Total tokens:       {int(df['total_tokens'].sum()):,}")
+    print(f"  Total latency:      {df['latency_s'].sum():.1f}s")
+
+    # How well the offline estimate tracks the provider's count
+    measured = api_calls[api_calls['prompt_tokens'] > 0]
+    if not measured.empty:
+        ratio = measured['prompt_tokens'].sum() / max(1, measured['estimated_prompt_tokens'].sum())
+        print(f"  Actual/estimated prompt tokens: {ratio:.2f}")
+
+    print(f"\n{'='*60}")
+    print(f"PER PHASE")
+    print(f"{'='*60}")
+    print(summarize(df, ['pipeline', 'phase']).to_string())
+
+    per_paper = summarize(df, 'key')
+    print(f"\n{'='*60}")
+    print(f"PER PAPER (top {args.top} by total tokens)")
+    print(f"{'='*60}")
+    print(per_paper.head(args.top).to_string())
+
+    if args.csv:
+        per_paper.to_csv(args.csv)
+        print(f"\n✅ Saved per-paper summary to {args.csv}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Prepare the whole corpus in one parallel pass (no LLM calls).
+
+For every paper: parsed-document cache entry, {key}_table_N.json tables,
+{key}.txt full text (also packed into a memory-mapped corpus store),
+full-text index passages, and per-paper statistics
+(characters, estimated tokens, tables, figures, pages) with the content
+hashes of its TEI, text and PDF inputs. Papers whose inputs are unchanged
+since the last run are skipped.
+
+Usage:
+  python preprocess_corpus.py --all                  # One process per CPU
+  python preprocess_corpus.py --all --force          # Redo every paper
+  python preprocess_corpus.py --keys PHRKN65M ABM3E3ZP --workers 1
+"""
+
+import sys
+import io
+
+# Force UTF-8 output encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+import argparse
+import csv
+import time
+from pathlib import Path
+
+import yaml
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.corpus_preprocessor import MANIFEST_NAME, STORE_DIR_NAME, preprocess_corpus
+
+STATS_COLUMNS = [
+    'key', 'title', 'year', 'pages', 'tei_chars', 'tei_tokens_est', 'full_text_chars', 'full_text_tokens_est',
+    'grobid_text_chars', 'sections', 'tables', 'numbered_tables', 'tables_with_rows', 'paragraph_tables',
+    'uncertain_paragraphs', 'figures', 'references', 'tei_sha256', 'pdf_sha256', 'seconds'
+]
+
+
+def write_stats_csv(results: dict, csv_path: Path):
+    """One row per paper: statistics, input hashes and processing time."""
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=STATS_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for key, entry in results.items():
+            inputs = entry.get('inputs', {})
+            writer.writerow({
+                'key': key,
+                **entry.get('stats', {}),
+                'tei_sha256': (inputs.get('tei') or {}).get('sha256'),
+                'pdf_sha256': (inputs.get('pdf') or {}).get('sha256'),
+                'seconds': entry.get('seconds', {}).get('total')
+            })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocess the TEI/text/PDF corpus in parallel")
+    parser.add_argument('--all', action='store_true', help='Run on all papers')
+    parser.add_argument('--keys', nargs='+', help='Run on specific keys (e.g., CV27ZK8Q 35NWH5BA)')
+    parser.add_argument('--tei-dir', type=str, help='TEI directory (default: data/grobid_outputs/tei)')
+    parser.add_argument('--text-dir', type=str, help='GROBID text directory (default: data/grobid_outputs/text)')
+    parser.add_argument('--pdf-dir', type=str, help='PDF directory, for page counts (default: data/pdfs)')
+    parser.add_argument('--output', type=str,
+                        help='Output directory for tables/, text/, the manifest and corpus_stats.csv '
+                             '(default: data/final_114_combined)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Redo papers whose inputs are unchanged')
+    parser.add_argument('--no-text', action='store_true', help='Do not write {key}.txt full text files')
+    parser.add_argument('--no-doc-cache', action='store_true', help='Do not fill the parsed-document cache')
+    parser.add_argument('--no-index', action='store_true', help='Do not update the full-text index')
+
+    args = parser.parse_args()
+
+    # Paths
+    project_root = Path(__file__).parent.parent
+    tei_dir = Path(args.tei_dir) if args.tei_dir else project_root / "data" / "grobid_outputs" / "tei"
+    text_dir = Path(args.text_dir) if args.text_dir else project_root / "data" / "grobid_outputs" / "text"
+    pdf_dir = Path(args.pdf_dir) if args.pdf_dir else project_root / "data" / "pdfs"
+    output_dir = Path(args.output) if args.output else project_root / "data" / "final_114_combined"
+
+    all_keys = sorted(f.name.replace('.tei.xml', '') for f in tei_dir.glob("*.tei.xml"))
+    if not all_keys:
+        print(f"❌ No TEI files found in {tei_dir}")
+        return 1
+
+    if args.keys:
+        keys = [k for k in all_keys if k in args.keys]
+        if len(keys) != len(args.keys):
+            print(f"⚠️  Warning: Found {len(keys)} of {len(args.keys)} requested keys")
+    elif args.all:
+        keys = all_keys
+    else:
+        print("Please specify --keys [KEYS] or --all")
+        parser.print_help()
+        return 1
+
+    # Shared artifact locations (config doc_cache / text_index sections)
+    config = {}
+    config_path = Path(__file__).parent / "config" / "config.yaml"
+    if config_path.exists():
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f) or {}
+
+    cache_dir = None
+    cache_config = config.get('doc_cache', {}) or {}
+    if not args.no_doc_cache and cache_config.get('enabled', True):
+        cache_dir = Path(cache_config.get('path', 'om_qex_extraction/outputs/cache/documents'))
+        if not cache_dir.is_absolute():
+            cache_dir = project_root / cache_dir
+
+    index_path = None
+    index_config = config.get('text_index', {}) or {}
+    if not args.no_index and index_config.get('enabled', True):
+        index_path = Path(index_config.get('path', 'om_qex_extraction/outputs/cache/text_index.sqlite'))
+        if not index_path.is_absolute():
+            index_path = project_root / index_path
+
+    def progress(done: int, total: int, entry: dict):
+        stats = entry.get('stats', {})
+        if entry['error']:
+            print(f"  [{done:>{len(str(total))}}/{total}] ❌ {entry['key']}: {entry['error']}", flush=True)
+        else:
+            print(f"  [{done:>{len(str(total))}}/{total}] {entry['key']:<10} {entry['seconds']['total']:6.2f}s  "
+                  f"{stats['tables']} tables, {stats['paragraph_tables']} paragraph tables, "
+                  f"~{stats['full_text_tokens_est']:,} tokens, {stats['pages'] or '?'} pages", flush=True)
+
+    print(f"📦 Preprocessing {len(keys)} papers into {output_dir}...")
+    start = time.perf_counter()
+    results = preprocess_corpus(
+        keys, tei_dir, output_dir,
+        text_dir=text_dir if text_dir.exists() else None,
+        pdf_dir=pdf_dir if pdf_dir.exists() else None,
+        workers=args.workers,
+        cache_dir=cache_dir,
+        index_path=index_path,
+        write_text=not args.no_text,
+        force=args.force,
+        progress=progress
+    )
+    elapsed = time.perf_counter() - start
+
+    write_stats_csv(results, output_dir / "corpus_stats.csv")
+
+    redone = [e for e in results.values() if not e['skipped']]
+    failed = [e for e in results.values() if e['error']]
+    done = [e for e in results.values() if not e['error']]
+    print(f"\n{'='*60}")
+    print(f"✅ PREPROCESSING COMPLETE ({elapsed:.1f}s)")
+    print(f"{'='*60}")
+    print(f"  - Papers: {len(redone)} processed, {len(results) - len(redone)} unchanged, {len(failed)} failed")
+    print(f"  - Tables: {sum(e['stats']['tables'] for e in done)} structured, "
+          f"{sum(e['stats']['paragraph_tables'] for e in done)} in paragraphs")
+    print(f"  - Estimated tokens (full text): {sum(e['stats']['full_text_tokens_est'] for e in done):,}")
+    print(f"  - Manifest: {output_dir / MANIFEST_NAME}")
+    print(f"  - Statistics: {output_dir / 'corpus_stats.csv'}")
+    if not args.no_text:
+        print(f"  - Corpus store: {output_dir / STORE_DIR_NAME}")
+    slowest = sorted(redone, key=lambda e: e['seconds'].get('total', 0), reverse=True)[:3]
+    if slowest:
+        print("  - Slowest: " + ', '.join(f"{e['key']} ({e['seconds']['total']:.2f}s)" for e in slowest))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
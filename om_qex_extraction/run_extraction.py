@@ -7,6 +7,7 @@ Usage:
   python run_extraction.py --test         # Test on 1 paper
   python run_extraction.py --sample 5     # Run on 5 papers
   python run_extraction.py --all          # Run on all 95 papers
+  python run_extraction.py --all --resume # Continue an interrupted run
 """
 
 import sys
@@ -21,7 +22,7 @@ from pathlib import Path
 # Add parent to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from src.extraction_engine import ExtractionEngine, load_metadata_from_master
+from src.extraction_engine import ExtractionEngine, load_metadata_from_master, paper_key
 
 
 def main():
@@ -33,6 +34,12 @@ def main():
     parser.add_argument('--all', action='store_true', help='Run on all papers')
     parser.add_argument('--keys', nargs='+', help='Run on specific keys (e.g., CV27ZK8Q 35NWH5BA)')
     parser.add_argument('--output', type=str, help='Custom output directory')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip papers already extracted in the output directory with the same prompt/model')
+    parser.add_argument('--concurrency', type=int, help='Papers to process in parallel (default: from config)')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the LLM response cache')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Ignore cached LLM responses and overwrite them with fresh API calls')
     
     args = parser.parse_args()
     
@@ -87,14 +94,24 @@ def main():
     
     # Initialize engine
     print(f"\n🔧 Initializing extraction engine ({args.mode.upper()} mode)...")
-    engine = ExtractionEngine(config_path, mode=args.mode)
+    engine = ExtractionEngine(config_path, mode=args.mode,
+                              use_cache=not args.no_cache, refresh_cache=args.refresh)
     
     # Run extraction
     print(f"\n{'='*60}")
     print(f"STARTING EXTRACTION")
     print(f"{'='*60}\n")
     
-    results = engine.extract_batch(tei_files, metadata_map)
+    # Each paper is checkpointed to output_dir/json as soon as it completes
+    checkpoint = engine.open_checkpoint(output_dir)
+    if args.resume:
+        print(f"♻️  RESUME: reusing papers already done under fingerprint {checkpoint.fingerprint}")
+    
+    engine.extract_batch(tei_files, metadata_map, concurrency=args.concurrency,
+                         checkpoint=checkpoint, resume=args.resume)
+    
+    # Rebuild consolidated outputs from the checkpoint files
+    results = checkpoint.completed_results([paper_key(f) for f in tei_files])
     
     # Save results
     if results:
@@ -110,6 +127,9 @@ def main():
         print(f"  - JSON files: {output_dir / 'json'}")
         print(f"  - CSV file: {output_dir / 'extracted_data.csv'}")
         print(f"  - Summary: {output_dir / 'extraction_summary.txt'}")
+        print(f"  - Run manifest: {checkpoint.manifest_file}")
+        if engine.ledger is not None:
+            print(f"  - Token ledger: {engine.ledger.ledger_file} (run {engine.ledger.run_id})")
     else:
         print(f"\n❌ No successful extractions")
         return 1
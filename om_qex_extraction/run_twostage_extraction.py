@@ -16,6 +16,7 @@ Usage:
   python run_twostage_extraction.py --keys PHRKN65M
   python run_twostage_extraction.py --sample 5
   python run_twostage_extraction.py --all
+  python run_twostage_extraction.py --all --resume
 """
 
 import sys
@@ -31,10 +32,12 @@ if sys.platform == 'win32':
 # Add parent to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from src.extraction_engine import ExtractionEngine, load_metadata_from_master
+from src.checkpoint import compute_input_hash
+from src.extraction_engine import ExtractionEngine, load_metadata_from_master, paper_key
 
 
-def run_twostage_extraction(tei_files, metadata_map, config_path, output_dir):
+def run_twostage_extraction(tei_files, metadata_map, config_path, output_dir,
+                            use_cache=True, refresh_cache=False, concurrency=None, resume=False):
     """
     Run two-stage extraction pipeline.
     
@@ -43,6 +46,10 @@ def run_twostage_extraction(tei_files, metadata_map, config_path, output_dir):
         metadata_map: Dict mapping Key -> metadata
         config_path: Path to config.yaml
         output_dir: Base output directory
+        use_cache: Consult the persistent LLM response cache
+        refresh_cache: Ignore cached responses and overwrite them
+        concurrency: Papers processed in parallel (default: from config)
+        resume: Reuse per-paper checkpoints from a previous run with the same prompt/model
     
     Returns:
         Dict with OM and QEX results
@@ -65,8 +72,14 @@ def run_twostage_extraction(tei_files, metadata_map, config_path, output_dir):
     print(f"Finding ALL outcomes with statistical analysis...")
     print(f"{'='*70}\n")
     
-    om_engine = ExtractionEngine(config_path, mode="om")
-    om_results = om_engine.extract_batch(tei_files, metadata_map)
+    om_engine = ExtractionEngine(config_path, mode="om", use_cache=use_cache, refresh_cache=refresh_cache)
+    om_checkpoint = om_engine.open_checkpoint(om_dir)
+    om_engine.extract_batch(tei_files, metadata_map, concurrency=concurrency,
+                            checkpoint=om_checkpoint, resume=resume)
+    
+    # Rebuild stage 1 results from the checkpoint files
+    keys = [paper_key(f) for f in tei_files]
+    om_results = om_checkpoint.completed_results(keys)
     
     if not om_results:
         print("❌ Stage 1 (OM) failed - no outcomes identified")
@@ -88,32 +101,18 @@ def run_twostage_extraction(tei_files, metadata_map, config_path, output_dir):
     print(f"Extracting detailed statistics using OM guidance...")
     print(f"{'='*70}\n")
     
-    qex_engine = ExtractionEngine(config_path, mode="qex")
-    
-    # Extract with OM guidance
-    qex_results = []
-    for i, (tei_file, om_result) in enumerate(zip(tei_files, om_results), 1):
-        key = tei_file.stem
-        metadata = metadata_map.get(key) if metadata_map else None
-        
-        print(f"\n{'='*60}")
-        print(f"Paper {i}/{len(tei_files)}: {tei_file.name}")
-        print(f"{'='*60}")
-        
-        # Get OM outcomes as guidance
-        om_outcomes = om_result.get('outcomes', [])
-        print(f"OM found {len(om_outcomes)} outcomes - using as guidance for QEX")
-        
-        # Extract with guidance
-        qex_result = qex_engine.extract_with_om_guidance(tei_file, metadata, om_outcomes)
-        
-        if qex_result:
-            qex_result['_key'] = key
-            qex_result['_tei_file'] = str(tei_file)
-            qex_result['_om_outcome_count'] = len(om_outcomes)  # Track how many OM found
-            qex_results.append(qex_result)
-        else:
-            print(f"⚠️  QEX extraction failed for {tei_file.name}")
+    # Share the LLM caller (same API budget and circuit breaker) and the parsed documents from stage 1
+    qex_engine = ExtractionEngine(config_path, mode="qex", use_cache=use_cache, refresh_cache=refresh_cache,
+                                  llm=om_engine.llm, doc_cache=om_engine.doc_cache)
+    
+    # Extract with OM guidance (outcomes are matched to papers by key)
+    om_by_key = {r.get('_key'): r for r in om_results}
+    qex_checkpoint = qex_engine.open_checkpoint(qex_dir, guided=True)
+    qex_engine.extract_batch_with_om_guidance(tei_files, metadata_map, om_results, concurrency=concurrency,
+                                              checkpoint=qex_checkpoint, resume=resume)
+    # Only results guided by this run's OM outcomes count
+    om_hashes = {key: compute_input_hash(om_by_key.get(key, {}).get('outcomes', [])) for key in keys}
+    qex_results = qex_checkpoint.completed_results(keys, input_hashes=om_hashes)
     
     if not qex_results:
         print("\n❌ Stage 2 (QEX) failed - no detailed extractions")
@@ -140,6 +139,8 @@ def run_twostage_extraction(tei_files, metadata_map, config_path, output_dir):
     print(f"\n📂 Outputs:")
     print(f"   OM results:  {om_dir}")
     print(f"   QEX results: {qex_dir}")
+    if om_engine.ledger is not None:
+        print(f"   Token ledger: {om_engine.ledger.ledger_file} (run {om_engine.ledger.run_id})")
     
     return {
         'om_results': om_results,
@@ -157,6 +158,12 @@ def main():
     parser.add_argument('--keys', nargs='+', help='Run on specific keys')
     parser.add_argument('--output', type=str, default='outputs/twostage',
                         help='Output directory (default: outputs/twostage)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip papers already extracted in the output directory with the same prompt/model')
+    parser.add_argument('--concurrency', type=int, help='Papers to process in parallel (default: from config)')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the LLM response cache')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Ignore cached LLM responses and overwrite them with fresh API calls')
     
     args = parser.parse_args()
     
@@ -197,7 +204,9 @@ def main():
         metadata_map = None
     
     # Run two-stage extraction
-    results = run_twostage_extraction(tei_files, metadata_map, config_path, args.output)
+    results = run_twostage_extraction(tei_files, metadata_map, config_path, args.output,
+                                      use_cache=not args.no_cache, refresh_cache=args.refresh,
+                                      concurrency=args.concurrency, resume=args.resume)
     
     if results:
         return 0
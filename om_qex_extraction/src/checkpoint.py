@@ -0,0 +1,211 @@
+"""
+Run Checkpointing - Crash-safe per-paper results and a resumable run manifest.
+Each paper's JSON is written atomically as soon as it completes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write_json(path: Path, data, indent: int = 2):
+    """
+    Write JSON so that readers only ever see the old or the complete new file.
+
+    The data is written to a temporary file in the same directory, flushed
+    to disk, then moved over the target with os.replace.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_name = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+
+def compute_fingerprint(model_config: Dict, prompt_template: str, mode: str, extra: Optional[Dict] = None) -> str:
+    """
+    Fingerprint the settings that determine an extraction's output.
+
+    Results are only reused on resume when the model, generation parameters,
+    extraction mode, prompt template and any extra settings (e.g. prompt
+    compaction) are all unchanged.
+
+    Returns:
+        Short SHA-256 hex digest
+    """
+    payload = json.dumps({
+        'model': model_config.get('name'),
+        'temperature': model_config.get('temperature'),
+        'top_p': model_config.get('top_p'),
+        'max_tokens': model_config.get('max_tokens'),
+        'mode': mode,
+        'prompt_template': prompt_template,
+        **({'extra': extra} if extra else {})
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def compute_input_hash(data) -> str:
+    """
+    Fingerprint a paper's own prompt input (e.g. the OM outcomes that guide
+    its QEX prompt), stored per checkpoint entry.
+
+    Returns:
+        Short SHA-256 hex digest
+    """
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class RunCheckpoint:
+    """Per-paper checkpoint files plus a run manifest for one output directory."""
+
+    MANIFEST_NAME = "run_manifest.json"
+
+    def __init__(self, output_dir: Path, fingerprint: str):
+        """
+        Open the checkpoint for an output directory.
+
+        Args:
+            output_dir: Extraction output directory (JSON files go in output_dir/json)
+            fingerprint: Fingerprint of the current model/prompt settings
+        """
+        self.output_dir = Path(output_dir)
+        self.json_dir = self.output_dir / "json"
+        self.manifest_file = self.output_dir / self.MANIFEST_NAME
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict:
+        """Load the existing manifest, or start a new one."""
+        if self.manifest_file.exists():
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                logger.info(f"Loaded run manifest with {len(manifest.get('papers', {}))} papers: {self.manifest_file}")
+                return manifest
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"Could not read run manifest {self.manifest_file}: {e} - starting a new one")
+
+        return {'created': datetime.now().isoformat(timespec='seconds'), 'papers': {}}
+
+    def _save_manifest(self):
+        """Persist the manifest (lock must be held)."""
+        self.manifest['updated'] = datetime.now().isoformat(timespec='seconds')
+        self.manifest['fingerprint'] = self.fingerprint
+        atomic_write_json(self.manifest_file, self.manifest)
+
+    def result_file(self, key: str) -> Path:
+        """Path of the checkpoint JSON for a paper."""
+        return self.json_dir / f"{key}.json"
+
+    def is_done(self, key: str, input_hash: Optional[str] = None) -> bool:
+        """
+        True if the paper completed under the current fingerprint and its JSON exists.
+
+        Args:
+            input_hash: If given, the paper must also have completed with this
+                per-paper input (compute_input_hash)
+        """
+        entry = self.manifest['papers'].get(key)
+        return (
+            entry is not None
+            and entry.get('status') == 'done'
+            and entry.get('fingerprint') == self.fingerprint
+            and (input_hash is None or entry.get('input_hash') == input_hash)
+            and self.result_file(key).exists()
+        )
+
+    def load_result(self, key: str) -> Optional[Dict]:
+        """Load a paper's checkpointed result."""
+        try:
+            with open(self.result_file(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Could not read checkpoint for {key}: {e}")
+            return None
+
+    def record_success(self, key: str, result: Dict, input_hash: Optional[str] = None):
+        """Write a paper's result atomically and mark it done in the manifest (with its input hash, if any)."""
+        atomic_write_json(self.result_file(key), result)
+
+        llm_info = result.get('_llm', {})
+        with self._lock:
+            entry = self.manifest['papers'].get(key, {})
+            self.manifest['papers'][key] = {
+                'status': 'done',
+                'attempts': entry.get('attempts', 0) + 1,
+                'api_calls': llm_info.get('attempts', 0),
+                'cached': llm_info.get('cached', False),
+                'usage': llm_info.get('usage', {}),
+                'prompt_hash': llm_info.get('prompt_hash'),
+                'fingerprint': self.fingerprint,
+                **({'input_hash': input_hash} if input_hash is not None else {}),
+                'outcomes': len(result.get('outcomes', []) or []),
+                'truncated': result.get('_truncated', False),
+                'updated': datetime.now().isoformat(timespec='seconds')
+            }
+            self._save_manifest()
+
+    def record_failure(self, key: str, error: str):
+        """Mark a paper as failed in the manifest."""
+        with self._lock:
+            entry = self.manifest['papers'].get(key, {})
+            self.manifest['papers'][key] = {
+                'status': 'failed',
+                'attempts': entry.get('attempts', 0) + 1,
+                'error': error,
+                'fingerprint': self.fingerprint,
+                'updated': datetime.now().isoformat(timespec='seconds')
+            }
+            self._save_manifest()
+
+    def completed_results(self, keys: Optional[Iterable[str]] = None,
+                          input_hashes: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """
+        Load every completed result from the checkpoint files.
+
+        Args:
+            keys: Restrict to these keys, in this order (default: all done papers, sorted)
+            input_hashes: Per-paper input hashes the results must have been built from
+
+        Returns:
+            List of extraction results
+        """
+        input_hashes = input_hashes or {}
+        if keys is None:
+            keys = sorted(k for k in self.manifest['papers'] if self.is_done(k, input_hashes.get(k)))
+
+        results = []
+        for key in keys:
+            if self.is_done(key, input_hashes.get(key)):
+                result = self.load_result(key)
+                if result is not None:
+                    results.append(result)
+        return results
+
+    def summary(self) -> Dict[str, int]:
+        """Count papers per status."""
+        counts: Dict[str, int] = {}
+        for entry in self.manifest['papers'].values():
+            status = entry.get('status', 'unknown')
+            counts[status] = counts.get(status, 0) + 1
+        return counts
@@ -0,0 +1,309 @@
+"""
+Corpus Preprocessor - One parallel pass that prepares every paper.
+Parses each TEI into the document cache, writes table JSON and text files
+(also packed into a memory-mapped corpus store), updates the full-text index
+and records per-paper statistics and input content hashes, redoing only
+papers whose inputs changed.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .corpus_store import CorpusStore, text_files
+from .doc_cache import DocumentCache
+from .paragraph_table_detector import detect_paragraph_tables
+from .table_extractor import extract_tables, save_tables
+from .text_index import TextIndex
+from .token_ledger import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Bump when the artifacts or statistics written per paper change
+PREPROCESS_VERSION = 1
+
+MANIFEST_NAME = "corpus_manifest.json"
+STORE_DIR_NAME = "corpus_store"  # Packed text/ (see CorpusStore)
+
+# Page objects of a PDF, for page counts without PyMuPDF
+_PDF_PAGE_PATTERN = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+
+def file_signature(path: Optional[Path]) -> Optional[Dict]:
+    """Size and mtime of an input file (None if it does not exist)."""
+    if path is None or not path.exists():
+        return None
+    stat = path.stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def pdf_page_count(pdf_file: Path) -> Optional[int]:
+    """Page count via PyMuPDF when installed, else by counting /Type /Page objects."""
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        fitz = None
+    if fitz is not None:
+        try:
+            with fitz.open(pdf_file) as pdf_document:
+                return pdf_document.page_count
+        except Exception as e:
+            logger.warning(f"PyMuPDF could not open {pdf_file.name}: {e}")
+    pages = len(_PDF_PAGE_PATTERN.findall(pdf_file.read_bytes()))
+    return pages or None
+
+
+def paper_inputs(key: str, tei_dir: Path, text_dir: Optional[Path], pdf_dir: Optional[Path]) -> Dict[str, Optional[Path]]:
+    """The TEI, GROBID text and PDF files of one paper (missing ones are None)."""
+    inputs = {'tei': tei_dir / f"{key}.tei.xml", 'text': None, 'pdf': None}
+    if text_dir is not None and (text_dir / f"{key}.txt").exists():
+        inputs['text'] = text_dir / f"{key}.txt"
+    if pdf_dir is not None and (pdf_dir / f"{key}.pdf").exists():
+        inputs['pdf'] = pdf_dir / f"{key}.pdf"
+    return inputs
+
+
+def is_current(entry: Optional[Dict], inputs: Dict[str, Optional[Path]], output_dir: Path,
+               write_text: bool = True) -> bool:
+    """
+    True if a manifest entry was made from exactly these inputs and its outputs are still there.
+
+    Files whose size and mtime match are taken as unchanged; otherwise the
+    content hash decides (touched-but-identical files are not redone).
+    """
+    if not entry or entry.get('version') != PREPROCESS_VERSION or entry.get('error'):
+        return False
+    key = entry['key']
+    if write_text and not (entry.get('text_written') and (output_dir / "text" / f"{key}.txt").exists()):
+        return False
+    if entry['stats'].get('tables') and not (output_dir / "tables" / f"{key}_table_1.json").exists():
+        return False
+    recorded = entry.get('inputs', {})
+    for name, path in inputs.items():
+        previous = recorded.get(name)
+        if (path is None) != (previous is None):
+            return False
+        if path is None:
+            continue
+        signature = file_signature(path)
+        if signature == previous['signature']:
+            continue
+        if file_hash(path) != previous['sha256']:
+            return False
+        previous['signature'] = signature  # Touched but identical: skip the hash next time
+    return True
+
+
+# ----------------------------------------------------------------------
+# Worker (one paper)
+# ----------------------------------------------------------------------
+
+_worker_cache: Optional[DocumentCache] = None
+_worker_index: Optional[TextIndex] = None
+
+
+def _init_worker(cache_dir: Optional[str], index_path: Optional[str]):
+    global _worker_cache, _worker_index
+    _worker_cache = DocumentCache(Path(cache_dir) if cache_dir else None, max_entries=4)
+    _worker_index = TextIndex(Path(index_path)) if index_path else None
+
+
+def preprocess_paper(key: str, inputs: Dict[str, Optional[str]], output_dir: str, write_text: bool = True) -> Dict:
+    """
+    Build every artifact of one paper (runs in a worker process).
+
+    Returns:
+        Manifest entry: key, version, inputs (signature and sha256 of each),
+        stats, seconds (per step and total) and error
+    """
+    start = time.perf_counter()
+    entry = {'key': key, 'version': PREPROCESS_VERSION, 'inputs': {}, 'stats': {}, 'seconds': {},
+             'text_written': write_text, 'error': None}
+    timings = entry['seconds']
+    try:
+        step = time.perf_counter()
+        for name, path in inputs.items():
+            entry['inputs'][name] = None if path is None else {
+                'path': path,
+                'signature': file_signature(Path(path)),
+                'sha256': file_hash(Path(path))
+            }
+        timings['hash'] = time.perf_counter() - step
+
+        tei_file = Path(inputs['tei'])
+        cache = _worker_cache or DocumentCache()
+
+        step = time.perf_counter()
+        document = cache.get_document(tei_file)
+        tei_text = cache.get_text(tei_file)
+        timings['parse'] = time.perf_counter() - step
+
+        step = time.perf_counter()
+        tables = extract_tables(document, key, tei_text)
+        save_tables(tables, Path(output_dir) / "tables", key)
+        full_text = document.full_text()
+        if write_text:
+            text_dir = Path(output_dir) / "text"
+            text_dir.mkdir(parents=True, exist_ok=True)
+            (text_dir / f"{key}.txt").write_text(full_text, encoding='utf-8')
+        timings['tables'] = time.perf_counter() - step
+
+        step = time.perf_counter()
+        paragraph_tables = detect_paragraph_tables(document)
+        timings['paragraph_tables'] = time.perf_counter() - step
+
+        if _worker_index is not None:
+            step = time.perf_counter()
+            _worker_index.update_file(tei_file)
+            timings['index'] = time.perf_counter() - step
+
+        step = time.perf_counter()
+        grobid_text = Path(inputs['text']).read_text(encoding='utf-8') if inputs.get('text') else None
+        pages = pdf_page_count(Path(inputs['pdf'])) if inputs.get('pdf') else None
+        timings['stats'] = time.perf_counter() - step
+
+        entry['stats'] = {
+            'title': document.title,
+            'year': document.year,
+            'tei_chars': len(tei_text),
+            'tei_tokens_est': estimate_tokens(tei_text),
+            'full_text_chars': len(full_text),
+            'full_text_tokens_est': estimate_tokens(full_text),
+            'grobid_text_chars': len(grobid_text) if grobid_text is not None else None,
+            'sections': len(document.sections),
+            'tables': len(tables),
+            'numbered_tables': sum(1 for t in tables if t['numbered']),
+            'tables_with_rows': sum(1 for t in tables if t['n_rows']),
+            'paragraph_tables': sum(1 for c in paragraph_tables if c['status'] == 'table'),
+            'uncertain_paragraphs': sum(1 for c in paragraph_tables if c['status'] == 'uncertain'),
+            'figures': len(document.figures) - len(document.tables),
+            'references': len(document.references),
+            'pages': pages
+        }
+    except Exception as e:
+        entry['error'] = str(e)
+    timings['total'] = time.perf_counter() - start
+    entry['seconds'] = {name: round(seconds, 4) for name, seconds in timings.items()}
+    return entry
+
+
+# ----------------------------------------------------------------------
+# Corpus
+# ----------------------------------------------------------------------
+
+def load_manifest(output_dir: Path) -> Dict[str, Dict]:
+    manifest_file = Path(output_dir) / MANIFEST_NAME
+    if not manifest_file.exists():
+        return {}
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('papers', {})
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Ignoring unreadable manifest {manifest_file}: {e}")
+        return {}
+
+
+def save_manifest(output_dir: Path, papers: Dict[str, Dict]):
+    """Write the manifest atomically (papers sorted by key)."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_file = output_dir / MANIFEST_NAME
+    tmp_file = manifest_file.with_suffix('.json.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({'version': PREPROCESS_VERSION, 'papers': dict(sorted(papers.items()))},
+                  f, indent=2, ensure_ascii=False)
+    os.replace(tmp_file, manifest_file)
+
+
+def preprocess_corpus(
+    keys: List[str],
+    tei_dir: Path,
+    output_dir: Path,
+    text_dir: Optional[Path] = None,
+    pdf_dir: Optional[Path] = None,
+    workers: Optional[int] = None,
+    cache_dir: Optional[Path] = None,
+    index_path: Optional[Path] = None,
+    write_text: bool = True,
+    force: bool = False,
+    progress: Optional[Callable[[int, int, Dict], None]] = None
+) -> Dict[str, Dict]:
+    """
+    Preprocess many papers in parallel, skipping those whose inputs are unchanged.
+
+    Args:
+        keys: Paper keys ({key}.tei.xml in tei_dir)
+        tei_dir: GROBID TEI directory
+        output_dir: Receives tables/, text/ and the manifest
+        text_dir: GROBID text directory (for statistics; optional)
+        pdf_dir: PDF directory (for page counts; optional)
+        workers: Worker processes (default: CPU count)
+        cache_dir: Parsed-document cache directory (None = no disk cache)
+        index_path: Full-text index database (None = do not index)
+        write_text: Write {key}.txt full text for smart_table_filter, and
+            pack text/ into the corpus store (output_dir/corpus_store)
+        force: Redo every paper
+        progress: Called as progress(done, total, entry) after each redone paper
+
+    Returns:
+        Manifest entries of the requested keys; skipped papers keep their
+        previous entry with 'skipped': True
+    """
+    output_dir = Path(output_dir)
+    manifest = load_manifest(output_dir)
+
+    todo, results = [], {}
+    for key in keys:
+        inputs = paper_inputs(key, Path(tei_dir), text_dir, pdf_dir)
+        if not force and is_current(manifest.get(key), inputs, output_dir, write_text):
+            results[key] = {**manifest[key], 'skipped': True}
+        else:
+            todo.append((key, {name: str(path) if path else None for name, path in inputs.items()}))
+
+    logger.info(f"Preprocessing {len(todo)} of {len(keys)} papers ({len(keys) - len(todo)} unchanged)")
+    init_args = (str(cache_dir) if cache_dir else None, str(index_path) if index_path else None)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(todo) or 1))
+
+    def finish(entry: Dict):
+        if entry['error']:
+            logger.error(f"Preprocessing failed for {entry['key']}: {entry['error']}")
+        results[entry['key']] = {**entry, 'skipped': False}
+        manifest[entry['key']] = entry
+        if progress is not None:
+            progress(len([r for r in results.values() if not r['skipped']]), len(todo), entry)
+
+    if workers == 1:
+        _init_worker(*init_args)
+        for key, inputs in todo:
+            finish(preprocess_paper(key, inputs, str(output_dir), write_text))
+    elif todo:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as executor:
+            futures = [executor.submit(preprocess_paper, key, inputs, str(output_dir), write_text)
+                       for key, inputs in todo]
+            for future in as_completed(futures):
+                finish(future.result())
+
+    save_manifest(output_dir, manifest)
+    if index_path is not None:
+        # Unchanged papers may still be missing from (or stale in) the index
+        index = TextIndex(Path(index_path))
+        index.update(Path(tei_dir) / f"{key}.tei.xml" for key, entry in results.items() if entry['skipped'])
+        index.close()
+    if write_text:
+        # Repacked only when a text file changed
+        CorpusStore.open_or_build(text_files(output_dir / "text"), output_dir / STORE_DIR_NAME).close()
+    return {key: results[key] for key in keys}
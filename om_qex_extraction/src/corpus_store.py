@@ -0,0 +1,304 @@
+"""
+Corpus Store - All paper texts packed into one memory-mapped file.
+An offset table per paper and per paragraph (line) gives zero-copy
+memoryview slices for context windows, with no file opens or full-file
+reads per lookup.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Bump when the file layout changes
+STORE_VERSION = 1
+
+BLOB_NAME = "corpus.bin"
+PARAGRAPHS_NAME = "paragraphs.bin"
+INDEX_NAME = "index.json"
+
+# A paragraph is a non-empty line (GROBID text files and TEIDocument.full_text alike)
+_LINE_PATTERN = re.compile(rb'[^\r\n]+')
+
+
+def _signature(path: Path) -> Dict:
+    stat = path.stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def text_files(text_dir: Path) -> Dict[str, Path]:
+    """{key: path} of every {key}.txt in a directory."""
+    return {f.stem: f for f in sorted(Path(text_dir).glob("*.txt"))}
+
+
+class CorpusStore:
+    """
+    Read-only packed corpus.
+
+    Offsets passed to and returned by the store are byte offsets into one
+    paper's UTF-8 text. Slices are memoryviews into the mapped file: decode
+    them with bytes(view).decode() or str(view, 'utf-8'), and release them
+    before close().
+    """
+
+    def __init__(self, store_dir: Path):
+        """
+        Map a store written by build().
+
+        Raises:
+            FileNotFoundError: If the store has not been built
+            ValueError: If it was written by another store version
+        """
+        self.store_dir = Path(store_dir)
+        with open(self.store_dir / INDEX_NAME, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') != STORE_VERSION:
+            raise ValueError(f"Corpus store {self.store_dir} has version {index.get('version')}, "
+                             f"expected {STORE_VERSION}; rebuild it")
+        self.documents: Dict[str, Dict] = index['documents']
+
+        self._handles = []  # Files, maps and views to close/release, in opening order
+        self._blob_map = self._map(self.store_dir / BLOB_NAME)
+        self._blob = self._view(self._blob_map)
+        # (start, end) pairs of absolute blob offsets, two int64 per paragraph
+        self._paragraphs = self._view(self._map(self.store_dir / PARAGRAPHS_NAME)).cast('q')
+        self._handles.append(self._paragraphs)
+
+    def _map(self, path: Path):
+        f = open(path, 'rb')
+        self._handles.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''  # mmap cannot map empty files
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._handles.append(mapped)
+        return mapped
+
+    def _view(self, buffer) -> memoryview:
+        view = memoryview(buffer)
+        self._handles.append(view)
+        return view
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def build(cls, sources: Dict[str, Path], store_dir: Path) -> "CorpusStore":
+        """
+        Pack text files into a new store (replacing any previous one) and open it.
+
+        Args:
+            sources: {key: text file}
+            store_dir: Directory for corpus.bin, paragraphs.bin and index.json
+        """
+        store_dir = Path(store_dir)
+        store_dir.mkdir(parents=True, exist_ok=True)
+
+        paragraphs = array('q')
+        documents = {}
+        blob_file = store_dir / BLOB_NAME
+        tmp_blob = blob_file.with_name(f".{blob_file.name}.tmp")
+        size = 0
+        with open(tmp_blob, 'wb') as blob:
+            # One paper in memory at a time
+            for key in sorted(sources):
+                path = Path(sources[key])
+                data = path.read_bytes()
+                paragraph_start = len(paragraphs) // 2
+                for match in _LINE_PATTERN.finditer(data):
+                    if match.group().strip():
+                        paragraphs.extend((size + match.start(), size + match.end()))
+                blob.write(data)
+                documents[key] = {
+                    'start': size,
+                    'end': size + len(data),
+                    'paragraph_start': paragraph_start,
+                    'paragraph_count': len(paragraphs) // 2 - paragraph_start,
+                    'source': str(path),
+                    **_signature(path),
+                    'sha256': hashlib.sha256(data).hexdigest()
+                }
+                size += len(data)
+
+        # Data files first, index last: a reader never sees an index without its data
+        os.replace(tmp_blob, blob_file)
+        _write_atomic(store_dir / PARAGRAPHS_NAME, paragraphs.tobytes())
+        _write_atomic(store_dir / INDEX_NAME, json.dumps(
+            {'version': STORE_VERSION, 'documents': documents}, indent=1
+        ).encode('utf-8'))
+        logger.info(f"Packed {len(documents)} texts ({size / 1e6:.1f} MB, "
+                    f"{len(paragraphs) // 2} paragraphs) into {store_dir}")
+        return cls(store_dir)
+
+    @staticmethod
+    def is_stale(sources: Dict[str, Path], store_dir: Path) -> bool:
+        """
+        True if the store is missing, has other keys, or a source file changed.
+
+        Size and mtime are compared first; a file that was only touched is
+        checked by content hash.
+        """
+        try:
+            with open(Path(store_dir) / INDEX_NAME, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return True
+        documents = index.get('documents', {})
+        if index.get('version') != STORE_VERSION or set(documents) != set(sources):
+            return True
+        for key, path in sources.items():
+            entry = documents[key]
+            signature = _signature(Path(path))
+            if (signature['size'], signature['mtime_ns']) == (entry['size'], entry['mtime_ns']):
+                continue
+            if hashlib.sha256(Path(path).read_bytes()).hexdigest() != entry['sha256']:
+                return True
+        return False
+
+    @classmethod
+    def open_or_build(cls, sources: Dict[str, Path], store_dir: Path) -> "CorpusStore":
+        """Open the store, repacking it first if any source changed."""
+        if cls.is_stale(sources, store_dir):
+            return cls.build(sources, store_dir)
+        return cls(store_dir)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def keys(self) -> List[str]:
+        return list(self.documents)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.documents
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def document(self, key: str) -> memoryview:
+        """A paper's whole text (zero-copy)."""
+        entry = self.documents[key]
+        return self._blob[entry['start']:entry['end']]
+
+    def text(self, key: str) -> str:
+        """A paper's whole text, decoded."""
+        return str(self.document(key), 'utf-8')
+
+    def size(self, key: str) -> int:
+        """Length of a paper's text in bytes."""
+        entry = self.documents[key]
+        return entry['end'] - entry['start']
+
+    def paragraph_count(self, key: str) -> int:
+        return self.documents[key]['paragraph_count']
+
+    def paragraph_span(self, key: str, index: int) -> tuple:
+        """(start, end) byte offsets of a paragraph within its paper."""
+        entry = self.documents[key]
+        if not 0 <= index < entry['paragraph_count']:
+            raise IndexError(f"{key} has {entry['paragraph_count']} paragraphs, not {index + 1}")
+        row = 2 * (entry['paragraph_start'] + index)
+        return self._paragraphs[row] - entry['start'], self._paragraphs[row + 1] - entry['start']
+
+    def paragraph(self, key: str, index: int) -> memoryview:
+        """One paragraph (zero-copy)."""
+        start, end = self.paragraph_span(key, index)
+        base = self.documents[key]['start']
+        return self._blob[base + start:base + end]
+
+    def paragraph_at(self, key: str, offset: int) -> Optional[int]:
+        """Index of the paragraph containing a byte offset (binary search), or None between paragraphs."""
+        entry = self.documents[key]
+        first = entry['paragraph_start']
+        starts = _Starts(self._paragraphs, first, entry['paragraph_count'])
+        position = bisect_right(starts, entry['start'] + offset) - 1
+        if position < 0:
+            return None
+        _, end = self.paragraph_span(key, position)
+        return position if offset < end else None
+
+    def window(self, key: str, offset: int, before: int = 500, after: int = 500) -> memoryview:
+        """
+        Up to `before` bytes before and `after` bytes after an offset (zero-copy),
+        trimmed so that it never splits a UTF-8 character.
+        """
+        entry = self.documents[key]
+        start = entry['start'] + max(0, offset - before)
+        end = entry['start'] + min(entry['end'] - entry['start'], offset + after)
+        blob = self._blob
+        while start < end and 0x80 <= blob[start] < 0xC0:
+            start += 1
+        while end < entry['end'] and 0x80 <= blob[end] < 0xC0:
+            end -= 1
+        return blob[start:end]
+
+    def find(self, key: str, needle: Union[str, bytes], start: int = 0) -> int:
+        """
+        Byte offset of the first exact (case-sensitive) occurrence of `needle`
+        at or after `start` in a paper, or -1. Searches the mapped file in place.
+        """
+        entry = self.documents[key]
+        if isinstance(needle, str):
+            needle = needle.encode('utf-8')
+        found = self._blob_map.find(needle, entry['start'] + start, entry['end'])
+        return found - entry['start'] if found != -1 else -1
+
+    def find_all(self, key: str, needle: Union[str, bytes]) -> Iterable[int]:
+        """Byte offsets of every occurrence of `needle` in a paper."""
+        offset = self.find(key, needle)
+        while offset != -1:
+            yield offset
+            offset = self.find(key, needle, offset + 1)
+
+    def context(self, key: str, needle: Union[str, bytes], chars: int = 500) -> Optional[str]:
+        """Decoded text around the first occurrence of `needle` (None if absent)."""
+        offset = self.find(key, needle)
+        if offset == -1:
+            return None
+        length = len(needle.encode('utf-8') if isinstance(needle, str) else needle)
+        return str(self.window(key, offset, before=chars, after=length + chars), 'utf-8')
+
+    def close(self):
+        """Unmap the store (memoryviews handed out must have been released)."""
+        for handle in reversed(self._handles):
+            if isinstance(handle, memoryview):
+                handle.release()
+            else:
+                handle.close()
+        self._handles = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Starts:
+    """Paragraph start offsets of one paper as a sequence, for bisect (no copy)."""
+
+    def __init__(self, pairs: memoryview, first: int, count: int):
+        self.pairs = pairs
+        self.first = first
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> int:
+        return self.pairs[2 * (self.first + index)]
@@ -0,0 +1,186 @@
+"""
+Document Cache - Parsed TEI documents shared by every pipeline stage.
+Pickled TEIDocuments on disk, keyed by file path and content hash, with a
+bounded in-process LRU in front.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .tei_document import TEIDocument
+
+logger = logging.getLogger(__name__)
+
+# Bump when TEIDocument's fields or parsing rules change
+CACHE_VERSION = 4
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class DocumentCache:
+    """
+    Parse each TEI file at most once across stages, phases and runs.
+
+    Lookups check the in-process LRU first (valid while the file's size and
+    mtime are unchanged), then the on-disk pickle (valid while the content
+    hash matches), and only then parse the XML.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_entries: int = 64):
+        """
+        Args:
+            cache_dir: Directory for pickled documents (None = in-process only)
+            max_entries: Size of the in-process LRU (documents plus raw texts)
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max(1, max_entries)
+
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'parses': 0}
+
+    @classmethod
+    def from_config(cls, config: Dict, base_dir: Path) -> Optional["DocumentCache"]:
+        """
+        Build the cache from the `doc_cache` config section.
+
+        Args:
+            config: Full pipeline config
+            base_dir: Directory that a relative cache path is resolved against
+
+        Returns:
+            DocumentCache, or None when disabled
+        """
+        cache_config = config.get('doc_cache', {}) or {}
+        if not cache_config.get('enabled', True):
+            return None
+        cache_dir = Path(cache_config.get('path', 'om_qex_extraction/outputs/cache/documents'))
+        if not cache_dir.is_absolute():
+            cache_dir = Path(base_dir) / cache_dir
+        return cls(cache_dir, max_entries=cache_config.get('memory_entries', 64))
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def get_document(self, tei_file: Path) -> TEIDocument:
+        """
+        Parsed document for a TEI file. The same object is returned to every
+        caller: treat it as read-only (TEIParser.from_document's getters
+        return copies).
+
+        Raises:
+            ValueError: If the file cannot be parsed
+        """
+        path = Path(tei_file).resolve()
+        signature = self._signature(path)
+        cached = self._memory_get((str(path), 'document'), signature)
+        if cached is not None:
+            return cached
+
+        data = path.read_bytes()
+        digest = content_hash(data)
+        document = self._disk_get(path, digest)
+        if document is None:
+            document = TEIDocument.from_bytes(data, path)
+            with self._lock:
+                self.stats['parses'] += 1
+            self._disk_put(path, digest, document)
+
+        self._memory_put((str(path), 'document'), signature, document)
+        return document
+
+    def get_text(self, tei_file: Path) -> str:
+        """Raw XML text of a TEI file (in-process LRU only; reading is cheap, re-reading per phase is not needed)."""
+        path = Path(tei_file).resolve()
+        signature = self._signature(path)
+        cached = self._memory_get((str(path), 'text'), signature)
+        if cached is not None:
+            return cached
+
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        self._memory_put((str(path), 'text'), signature, text)
+        return text
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+    # ------------------------------------------------------------------
+    # In-process LRU
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _signature(path: Path) -> Tuple[int, int]:
+        stat = path.stat()
+        return stat.st_size, stat.st_mtime_ns
+
+    def _memory_get(self, key: Tuple[str, str], signature: Tuple[int, int]):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None or entry[0] != signature:
+                return None
+            self._memory.move_to_end(key)
+            self.stats['memory_hits'] += 1
+            return entry[1]
+
+    def _memory_put(self, key: Tuple[str, str], signature: Tuple[int, int], value):
+        with self._lock:
+            self._memory[key] = (signature, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # On-disk pickles
+    # ------------------------------------------------------------------
+
+    def _disk_file(self, path: Path) -> Path:
+        """One pickle per source path; the content hash inside decides validity."""
+        path_hash = hashlib.sha256(str(path).encode('utf-8')).hexdigest()[:24]
+        return self.cache_dir / f"{path.name.split('.')[0]}_{path_hash}.pkl"
+
+    def _disk_get(self, path: Path, digest: str) -> Optional[TEIDocument]:
+        if self.cache_dir is None:
+            return None
+        cache_file = self._disk_file(path)
+        if not cache_file.exists():
+            return None
+        try:
+            with open(cache_file, 'rb') as f:
+                payload = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Unreadable document cache entry {cache_file.name}: {e}")
+            return None
+        if payload.get('version') != CACHE_VERSION or payload.get('content_hash') != digest:
+            return None  # TEI file or parser changed - re-parse and overwrite
+        with self._lock:
+            self.stats['disk_hits'] += 1
+        return payload['document']
+
+    def _disk_put(self, path: Path, digest: str, document: TEIDocument):
+        if self.cache_dir is None:
+            return
+        cache_file = self._disk_file(path)
+        payload = {'version': CACHE_VERSION, 'source': str(path), 'content_hash': digest, 'document': document}
+        fd, tmp_name = tempfile.mkstemp(dir=str(self.cache_dir), prefix=f".{cache_file.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_name, cache_file)
+        except OSError as e:
+            logger.warning(f"Could not write document cache entry {cache_file.name}: {e}")
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
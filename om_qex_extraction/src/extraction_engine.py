@@ -3,19 +3,38 @@ Extraction Engine - LLM-based data extraction from research papers.
 Uses OpenRouter API to extract structured data from TEI XML papers.
 """
 
+import hashlib
 import json
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Callable, Dict, Optional, List
 import yaml
 from openai import OpenAI
 
 from .tei_parser import TEIParser
+from .doc_cache import DocumentCache
+from .llm_cache import LLMResponseCache, make_cache_key
+from .checkpoint import RunCheckpoint, atomic_write_json, compute_fingerprint, compute_input_hash
+from .rate_limiter import RateLimiter
+from .streaming import OutcomeStreamParser
+from .token_ledger import TokenLedger, estimate_tokens, usage_to_dict
+from .llm_client import LLMCaller, InvalidResponseError
+from .llm_json import LLMJSONError, parse_llm_json
+from .mock_llm import MockLLMClient
 from .models import ExtractionRecord, PublicationInfo, InterventionInfo, GeneralInfo
 from .models import MethodInfo, OutcomeInfo, TreatmentVariableInfo, EstimateInfo, EstimateData
 
 
+# Map-reduce chunk budgets (estimated tokens)
+MIN_CHUNK_TOKENS = 2000
+CHUNK_MARGIN_TOKENS = 1000  # Headroom for the estimate's error and prompt joins
+
+# Answers that lose to any real answer when chunk extractions are merged
+EMPTY_ANSWERS = {'not mentioned', 'not reported', 'not specified', 'unknown', 'n/a', 'na', 'none'}
+
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -27,19 +46,45 @@ logger = logging.getLogger(__name__)
 class ExtractionEngine:
     """LLM-based extraction engine using OpenRouter."""
     
-    def __init__(self, config_path: Path, mode: str = "qex"):
+    def __init__(self, config_path: Path, mode: str = "qex", use_cache: bool = True,
+                 refresh_cache: bool = False, rate_limiter: Optional[RateLimiter] = None,
+                 ledger: Optional[TokenLedger] = None, llm: Optional[LLMCaller] = None,
+                 doc_cache: Optional[DocumentCache] = None,
+                 on_outcome: Optional[Callable[[Optional[str], Dict], None]] = None):
         """
         Initialize the extraction engine with configuration.
         
         Args:
             config_path: Path to config.yaml
             mode: Extraction mode - "om" for outcome mapping or "qex" for quantitative extraction
+            use_cache: Consult the persistent LLM response cache (if enabled in config)
+            refresh_cache: Ignore cached responses and overwrite them with fresh API calls
+            rate_limiter: Shared rate limiter (default: built from config)
+            ledger: Shared token ledger (default: opened from config)
+            llm: Shared LLM caller - retries, circuit breaker, rate limiter and ledger
+                 (default: built from config; overrides rate_limiter and ledger)
+            doc_cache: Shared parsed-document cache (default: opened from config)
+            on_outcome: Called with (paper key, outcome) as each outcome of a streamed
+                        response completes (model.stream); a retried call delivers its
+                        outcomes again, and the returned extraction remains authoritative
         """
         self.config_path = Path(config_path)
         self.mode = mode.lower()
         self.config = self._load_config()
         self.client = self._initialize_client()
         self.prompt_template = self._load_prompt_template(mode=self.mode)
+        self.cache = self._initialize_cache() if use_cache else None
+        self.doc_cache = doc_cache or DocumentCache.from_config(self.config, Path(__file__).parent.parent.parent)
+        self.refresh_cache = refresh_cache
+        self.on_outcome = on_outcome
+        self.llm = llm or LLMCaller.from_config(
+            self.client, self.config,
+            rate_limiter=rate_limiter or build_rate_limiter(self.config),
+            ledger=ledger or self._initialize_ledger()
+        )
+        self.rate_limiter = self.llm.rate_limiter
+        self.ledger = self.llm.ledger
+        self.concurrency = max(1, int(self.config['extraction'].get('concurrency', 1)))
         
         logger.info(f"Initialized ExtractionEngine in {self.mode.upper()} mode with model: {self.config['model']['name']}")
     
@@ -50,6 +95,14 @@ class ExtractionEngine:
         return config
     
     def _initialize_client(self) -> OpenAI:
+        """Initialize the LLM client (OpenRouter, or the offline mock when api.backend is "mock")."""
+        if self.config['api'].get('backend', 'openrouter') == 'mock':
+            mock_config = self.config.get('mock', {}) or {}
+            real_client = self._initialize_openrouter_client() if mock_config.get('mode') == 'record' else None
+            return MockLLMClient.from_config(mock_config, Path(__file__).parent.parent.parent, real_client=real_client)
+        return self._initialize_openrouter_client()
+    
+    def _initialize_openrouter_client(self) -> OpenAI:
         """Initialize OpenAI client for OpenRouter."""
         from openai import Timeout
         
@@ -71,12 +124,55 @@ class ExtractionEngine:
                 write=15.0,     # 15 seconds to send request
                 pool=15.0       # 15 seconds for connection pool
             ),
-            max_retries=5  # More retries for unstable connections
+            max_retries=0  # Retries are handled by LLMCaller (backoff, Retry-After, circuit breaker)
         )
         
         logger.info(f"OpenRouter client initialized with base URL: {base_url}")
         return client
     
+    def _initialize_cache(self) -> Optional[LLMResponseCache]:
+        """Open the persistent LLM response cache, if enabled in config."""
+        cache_config = self.config.get('cache', {})
+        if not cache_config.get('enabled', True):
+            logger.info("LLM response cache disabled in config")
+            return None
+        
+        # Relative paths are resolved against the project root (like other config paths)
+        cache_path = Path(cache_config.get('path', 'om_qex_extraction/outputs/cache/llm_responses.sqlite'))
+        if not cache_path.is_absolute():
+            cache_path = Path(__file__).parent.parent.parent / cache_path
+        
+        return LLMResponseCache(
+            cache_path,
+            max_size_mb=cache_config.get('max_size_mb', 500),
+            max_age_days=cache_config.get('max_age_days', 30)
+        )
+    
+    def _parse_tei(self, tei_file: Path) -> TEIParser:
+        """Parse a TEI file, reusing the cached document when the file is unchanged."""
+        if self.doc_cache is not None:
+            return TEIParser.from_document(self.doc_cache.get_document(tei_file))
+        return TEIParser(tei_file, streaming=True)
+    
+    def _initialize_ledger(self) -> Optional[TokenLedger]:
+        """Open the per-call token ledger, if enabled in config."""
+        ledger_config = self.config.get('ledger', {})
+        if not ledger_config.get('enabled', True):
+            return None
+        
+        ledger_path = Path(ledger_config.get('path', 'om_qex_extraction/outputs/token_ledger.jsonl'))
+        if not ledger_path.is_absolute():
+            ledger_path = Path(__file__).parent.parent.parent / ledger_path
+        
+        return TokenLedger(ledger_path, pipeline="v1")
+    
+    def _record_call(self, key: Optional[str], phase: Optional[str], estimated_tokens: int,
+                     usage: Dict, latency: float, status: str, cached: bool = False):
+        """Append one LLM call to the token ledger (no-op when the ledger is disabled)."""
+        if self.ledger is not None:
+            self.ledger.record(key, phase or self.mode, self.config['model']['name'], estimated_tokens,
+                               usage, latency, status, cached)
+    
     def _load_prompt_template(self, mode: str = "qex") -> str:
         """
         Load the extraction prompt template.
@@ -109,18 +205,24 @@ class ExtractionEngine:
         
         # Parse TEI file
         try:
-            parser = TEIParser(tei_file)
-            paper_text = parser.get_full_text(include_abstract=True)
+            parser = self._parse_tei(tei_file)
+            chunks = self._map_reduce_chunks(parser, self.prompt_template)
+            paper_text, compaction = (None, None) if chunks else self._get_paper_text(parser)
         except Exception as e:
             logger.error(f"Failed to parse TEI file {tei_file.name}: {e}")
             return None
         
-        # Create prompt
-        prompt = self.prompt_template.replace("{paper_text}", paper_text)
+        def build_prompt(text: str) -> str:
+            return self.prompt_template.replace("{paper_text}", text)
         
         # Call LLM
         try:
-            extraction = self._call_llm(prompt)
+            if chunks:
+                extraction = self._extract_map_reduce(chunks, build_prompt, key=paper_key(tei_file), phase=self.mode)
+            else:
+                extraction = self._call_llm(build_prompt(paper_text), key=paper_key(tei_file), phase=self.mode)
+            if compaction:
+                extraction['_compaction'] = compaction
             
             # Merge with metadata if provided
             if paper_metadata:
@@ -151,14 +253,6 @@ class ExtractionEngine:
         """
         logger.info(f"Processing with OM guidance: {tei_file.name}")
         
-        # Parse TEI file
-        try:
-            parser = TEIParser(tei_file)
-            paper_text = parser.get_full_text(include_abstract=True)
-        except Exception as e:
-            logger.error(f"Failed to parse TEI file {tei_file.name}: {e}")
-            return None
-        
         # Load focused prompt template if available, otherwise use standard
         focused_prompt_path = Path(__file__).parent.parent / "prompts" / "qex_focused_prompt.txt"
         if focused_prompt_path.exists():
@@ -184,20 +278,36 @@ class ExtractionEngine:
             om_guidance += "Extract ALL of these outcomes with complete statistical details.\n"
             
             # Insert guidance before the paper text
-            prompt = template.replace("{paper_text}", om_guidance + "\n\n# PAPER TEXT\n\n{paper_text}")
-            prompt = prompt.replace("{paper_text}", paper_text)
+            template = template.replace("{paper_text}", om_guidance + "\n\n# PAPER TEXT\n\n{paper_text}")
             
             logger.info(f"Created focused prompt with OM guidance ({len(om_outcomes)} outcomes)")
-            logger.debug(f"Prompt length: {len(prompt)} characters")
         else:
             # No OM guidance - use standard extraction
             logger.info("No OM outcomes provided, using standard extraction")
-            prompt = template.replace("{paper_text}", paper_text)
+        
+        def build_prompt(text: str) -> str:
+            return template.replace("{paper_text}", text)
+        
+        # Parse TEI file
+        try:
+            parser = self._parse_tei(tei_file)
+            chunks = self._map_reduce_chunks(parser, template)
+            paper_text, compaction = (None, None) if chunks else self._get_paper_text(parser)
+        except Exception as e:
+            logger.error(f"Failed to parse TEI file {tei_file.name}: {e}")
+            return None
         
         # Call LLM
         try:
             logger.info(f"Calling LLM with focused prompt...")
-            extraction = self._call_llm(prompt)
+            if chunks:
+                extraction = self._extract_map_reduce(chunks, build_prompt, key=paper_key(tei_file), phase="qex_guided")
+            else:
+                prompt = build_prompt(paper_text)
+                logger.debug(f"Prompt length: {len(prompt)} characters")
+                extraction = self._call_llm(prompt, key=paper_key(tei_file), phase="qex_guided")
+            if compaction:
+                extraction['_compaction'] = compaction
             
             # Merge with metadata if provided
             if paper_metadata:
@@ -210,154 +320,345 @@ class ExtractionEngine:
             logger.error(f"Extraction failed for {tei_file.name}: {e}")
             return None
     
-    def _call_llm(self, prompt: str, retry_count: int = 0) -> Dict:
+    def _get_paper_text(self, parser: TEIParser):
+        """
+        Paper text for the prompt, compacted to the configured token budget if enabled.
+        
+        Returns:
+            (paper_text, compaction_summary) - the summary is None when compaction is off
+            or the paper already fits the budget
+        """
+        compaction_config = self.config.get('compaction', {})
+        if not compaction_config.get('enabled', False):
+            return parser.get_full_text(include_abstract=True), None
+        
+        compacted = parser.get_compacted_text(compaction_config.get('token_budget', 60000), include_abstract=True)
+        report = compacted['report']
+        if not report['removed_tokens']:
+            return compacted['text'], None
+        
+        logger.info(f"✂️  Compacted paper text: ~{report['original_tokens']:,} → ~{report['compacted_tokens']:,} tokens "
+                    f"({len(report['sections_condensed'])} sections condensed, "
+                    f"{len(report['sections_dropped'])} dropped of {report['sections_total']})")
+        logger.debug(f"Dropped sections: {report['sections_dropped']}")
+        summary = {k: report[k] for k in ('token_budget', 'original_tokens', 'compacted_tokens', 'removed_tokens')}
+        summary['sections_condensed'] = len(report['sections_condensed'])
+        summary['sections_dropped'] = len(report['sections_dropped'])
+        return compacted['text'], summary
+    
+    def _map_reduce_chunks(self, parser: TEIParser, template: str) -> Optional[List[Dict]]:
+        """
+        Section-aligned chunks of a long paper, when map-reduce extraction is enabled.
+        
+        The chunk budget is map_reduce.chunk_tokens, lowered if needed so that
+        template + abstract + chunk + max_tokens fit model.context_window.
+        
+        Returns:
+            Chunks (see TEIParser.get_text_chunks), or None to extract the paper in one call
+        """
+        map_reduce_config = self.config.get('map_reduce', {}) or {}
+        if not map_reduce_config.get('enabled', False):
+            return None
+        
+        model_config = self.config['model']
+        budget = int(map_reduce_config.get('chunk_tokens', 25000))
+        context_window = model_config.get('context_window')
+        if context_window:
+            overhead = (estimate_tokens(template) + estimate_tokens(parser.get_abstract())
+                        + model_config['max_tokens'] + CHUNK_MARGIN_TOKENS)
+            budget = max(MIN_CHUNK_TOKENS, min(budget, context_window - overhead))
+        
+        if estimate_tokens(parser.get_body_text()) <= budget:
+            return None
+        chunks = parser.get_text_chunks(budget, include_abstract=True)
+        return chunks if len(chunks) > 1 else None
+    
+    def _extract_map_reduce(self, chunks: List[Dict], build_prompt: Callable[[str], str],
+                            key: Optional[str] = None, phase: Optional[str] = None) -> Dict:
+        """
+        Extract every chunk concurrently (map), then merge the results (reduce).
+        
+        A chunk that still fails after the LLM caller's retries fails the paper;
+        chunks that succeeded stay in the response cache for the rerun.
+        
+        Returns:
+            Merged extraction (see merge_extractions) with '_llm' totals and a
+            '_map_reduce' summary
+        """
+        map_reduce_config = self.config.get('map_reduce', {}) or {}
+        workers = max(1, min(int(map_reduce_config.get('concurrency', 4)), len(chunks)))
+        logger.info(f"🧩 Map-reduce: {len(chunks)} chunks (~{max(c['tokens'] for c in chunks):,} tokens max), "
+                    f"{workers} at a time")
+        
+        start_time = time.time()
+        
+        def extract_chunk(chunk: Dict) -> Dict:
+            extraction = self._call_llm(build_prompt(chunk['text']), key=key, phase=phase)
+            logger.info(f"  Chunk {chunk['index'] + 1}/{len(chunks)}: {len(extraction.get('outcomes', []) or [])} outcomes")
+            return extraction
+        
+        if workers == 1:
+            extractions = [extract_chunk(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                extractions = list(executor.map(extract_chunk, chunks))
+        
+        merged = merge_extractions(extractions)
+        outcomes_found = sum(len(e.get('outcomes', []) or []) for e in extractions)
+        
+        usage: Dict = {}
+        for extraction in extractions:
+            for name, value in extraction['_llm'].get('usage', {}).items():
+                if isinstance(value, (int, float)):
+                    usage[name] = usage.get(name, 0) + value
+        merged['_llm'] = {
+            'attempts': sum(e['_llm']['attempts'] for e in extractions),
+            'usage': usage,
+            'prompt_hash': hashlib.sha256(
+                ''.join(e['_llm']['prompt_hash'] for e in extractions).encode('utf-8')
+            ).hexdigest()[:16],
+            'cached': all(e['_llm']['cached'] for e in extractions)
+        }
+        merged['_map_reduce'] = {
+            'chunks': len(chunks),
+            'chunk_tokens': [c['tokens'] for c in chunks],
+            'chunk_sections': [c['sections'] for c in chunks],
+            'outcomes_found': outcomes_found,
+            'duplicates_removed': outcomes_found - len(merged.get('outcomes', [])),
+            'seconds': round(time.time() - start_time, 2)
+        }
+        logger.info(f"🧩 Reduced {outcomes_found} chunk outcomes to {len(merged.get('outcomes', []))} "
+                    f"({merged['_map_reduce']['seconds']:.1f}s)")
+        return merged
+    
+    def _call_llm(self, prompt: str, key: Optional[str] = None, phase: Optional[str] = None) -> Dict:
         """
         Call LLM via OpenRouter API with robust error handling.
         
+        Retries, backoff and circuit breaking are handled by the shared
+        LLMCaller; each attempt is one API call plus parsing of its response.
+        
         Args:
             prompt: Complete prompt including template and paper text
-            retry_count: Current retry attempt
+            key: Paper key (recorded in the token ledger)
+            phase: Extraction phase (recorded in the token ledger, default: mode)
         
         Returns:
             Extracted data as dictionary
         """
-        max_retries = self.config['extraction']['max_retries']
-        retry_delay = self.config['extraction']['retry_delay']
+        model_config = self.config['model']
         
-        try:
-            logger.debug(f"Calling LLM API (attempt {retry_count + 1})...")
-            
-            response = self.client.chat.completions.create(
-                model=self.config['model']['name'],
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=self.config['model']['temperature'],
-                max_tokens=self.config['model']['max_tokens'],
-                top_p=self.config['model']['top_p']
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+        estimated_tokens = estimate_tokens(prompt)
+        cache_key = None
+        if self.cache is not None:
+            cache_key = make_cache_key(
+                model_config['name'], prompt,
+                model_config['temperature'], model_config['top_p'], model_config['max_tokens']
             )
+            if not self.refresh_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"✓ Cache hit ({len(cached.get('outcomes', []))} outcomes), skipping API call")
+                    cached['_llm'] = {'attempts': 0, 'usage': {}, 'prompt_hash': prompt_hash, 'cached': True}
+                    self._record_call(key, phase, estimated_tokens, {}, 0.0, "ok", cached=True)
+                    return cached
+        
+        logger.info(f"Prompt size: ~{estimated_tokens:,} tokens (estimated)")
+        context_window = model_config.get('context_window')
+        if context_window and estimated_tokens + model_config['max_tokens'] > context_window:
+            logger.warning(f"⚠️  Estimated prompt ({estimated_tokens:,}) + max_tokens "
+                           f"exceeds the {context_window:,}-token context window")
+        
+        attempts = 0
+        
+        def attempt():
+            nonlocal attempts
+            attempts += 1
+            logger.debug(f"Calling LLM API (attempt {attempts})...")
             
-            logger.info("✓ API call successful, parsing response...")
+            # Reserve the estimated prompt plus the maximum completion
+            self.rate_limiter.acquire(estimated_tokens + model_config['max_tokens'])
             
-            # Extract JSON from response
-            content = response.choices[0].message.content
-            if content is None:
-                logger.error("Response content is None - API returned empty response")
-                raise ValueError("Empty response from API")
-            
-            response_text = content.strip()
-            logger.debug(f"Response length: {len(response_text)} characters")
-            
-            if not response_text:
-                logger.error("Response text is empty after stripping")
-                raise ValueError("Empty response text")
-            
-            # Handle markdown code blocks - look for ```json and extract content
-            if "```json" in response_text:
-                # Extract JSON from markdown code block
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                if json_end > json_start:
-                    response_text = response_text[json_start:json_end].strip()
-                    logger.debug("Extracted JSON from markdown code block")
-            elif "```" in response_text:
-                # Generic code block
-                json_start = response_text.find("```") + 3
-                json_end = response_text.find("```", json_start)
-                if json_end > json_start:
-                    response_text = response_text[json_start:json_end].strip()
-                    logger.debug("Extracted content from generic code block")
-            
-            # If response doesn't start with { or [, try to find the JSON
-            if not response_text.startswith(("{", "[")):
-                # Look for first { or [
-                json_start = min(
-                    response_text.find("{") if "{" in response_text else len(response_text),
-                    response_text.find("[") if "[" in response_text else len(response_text)
-                )
-                if json_start < len(response_text):
-                    logger.debug(f"Found JSON starting at character {json_start}")
-                    response_text = response_text[json_start:]
+            start_time = time.time()
+            try:
+                content, finish_reason, response_usage, streamed_outcomes = self._request_completion(
+                    prompt, model_config, key=key)
+            except Exception:
+                self._record_call(key, phase, estimated_tokens, {}, time.time() - start_time, "error")
+                raise
+            usage = usage_to_dict(response_usage)
+            self._record_call(key, phase, estimated_tokens, usage, time.time() - start_time,
+                              "truncated" if finish_reason == 'length' else "ok")
             
-            logger.info("✓ Parsing JSON...")
-            # Parse JSON
-            extracted_data = json.loads(response_text)
-            logger.info(f"✓ Successfully parsed JSON with {len(extracted_data.get('outcomes', []))} outcomes")
+            logger.info("✓ API call successful, parsing response...")
+            extracted_data = self._parse_response(content, finish_reason, model_config, streamed_outcomes)
             
             # Log token usage
-            if hasattr(response, 'usage'):
-                logger.info(f"Tokens used: {response.usage.total_tokens}")
-            
-            return extracted_data
+            if response_usage is not None:
+                logger.info(f"Tokens used: {usage['total_tokens']} "
+                            f"(prompt {usage['prompt_tokens']}, estimated {estimated_tokens})")
+            return extracted_data, usage
+        
+        extracted_data, usage = self.llm.call(attempt, description=f"{key or 'LLM call'} ({phase or self.mode})")
+        
+        # Only complete responses are cached; a truncated one is requested again on the next run
+        if self.cache is not None and not extracted_data.get('_truncated'):
+            self.cache.put(cache_key, model_config['name'], extracted_data)
+        
+        # Call metadata (kept out of the cache; recorded in checkpoints)
+        extracted_data['_llm'] = {
+            'attempts': attempts,
+            'usage': usage,
+            'prompt_hash': prompt_hash,
+            'cached': False
+        }
+        
+        return extracted_data
+    
+    def _parse_response(self, content: Optional[str], finish_reason: Optional[str], model_config: Dict,
+                        streamed_outcomes: Optional[List[Dict]] = None) -> Dict:
+        """
+        Parse the JSON document from a response.
+        
+        Empty or malformed responses raise retryable errors; a response cut off
+        at max_tokens keeps its complete outcomes instead. Those come from
+        parse_llm_json, or - when the cut-off document cannot be repaired - from
+        the outcomes the stream parser completed (streamed_outcomes).
+        """
+        if content is None or not content.strip():
+            logger.error("Response content is empty - API returned empty response")
+            raise InvalidResponseError("Empty response from API")
+        
+        logger.debug(f"Response length: {len(content)} characters")
+        
+        logger.info("✓ Parsing JSON...")
+        try:
+            parsed = parse_llm_json(content)
+        except LLMJSONError as e:
+            if finish_reason == 'length' and streamed_outcomes:
+                logger.warning(f"⚠️  Response truncated and unrepairable ({e.msg}) - "
+                               f"kept {len(streamed_outcomes)} streamed outcomes")
+                return {'outcomes': list(streamed_outcomes), '_truncated': True}
+            logger.error(f"JSON parsing error: {e.msg}")
+            logger.error(f"Response text (first 1000 chars): {content[:1000]}")
+            logger.error(f"Response text (last 200 chars): {content[-200:]}")
+            raise
         
-        except KeyboardInterrupt:
-            # KeyboardInterrupt during socket read is actually a network timeout
-            logger.error(f"Network timeout/interruption during response reading")
+        extracted_data = parsed.data
+        if parsed.repairs:
+            logger.debug(f"Recovered JSON from response ({', '.join(parsed.repairs)})")
+        
+        if parsed.truncated:
+            # Cut off (normally at max_tokens): keep the outcomes that completed instead of retrying
+            if not extracted_data.get('outcomes'):
+                raise ValueError(
+                    f"Response truncated ({finish_reason}, max_tokens {model_config['max_tokens']}) "
+                    f"before any outcome completed"
+                )
+            extracted_data['_truncated'] = True
+            logger.warning(f"⚠️  Response truncated - kept {len(extracted_data.get('outcomes', []))} complete outcomes")
+        logger.info(f"✓ Successfully parsed JSON with {len(extracted_data.get('outcomes', []))} outcomes")
+        
+        return extracted_data
+    
+    def _request_completion(self, prompt: str, model_config: Dict, key: Optional[str] = None):
+        """
+        Send one chat completion request.
+        
+        With model.stream enabled the response is streamed: outcomes are parsed
+        incrementally as they arrive and passed to on_outcome, and a max_tokens
+        cut-off is detected from the final chunk's finish_reason (the API reports
+        it only there).
+        
+        Returns:
+            (content, finish_reason, usage, streamed outcomes - None when not streaming)
+        """
+        request = dict(
+            model=model_config['name'],
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            temperature=model_config['temperature'],
+            max_tokens=model_config['max_tokens'],
+            top_p=model_config['top_p']
+        )
+        
+        if not model_config.get('stream', False):
+            response = self.client.chat.completions.create(**request)
+            choice = response.choices[0]
+            return choice.message.content, choice.finish_reason, getattr(response, 'usage', None), None
+        
+        start_time = time.time()
+        stream = self.client.chat.completions.create(**request, stream=True,
+                                                     stream_options={"include_usage": True})
+        
+        stream_parser = OutcomeStreamParser()
+        parts = []
+        finish_reason = None
+        usage = None
+        
+        for chunk in stream:
+            if getattr(chunk, 'usage', None) is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
             
-            if retry_count < max_retries:
-                wait_time = retry_delay * (retry_count + 1) * 2  # Longer backoff for network issues
-                logger.info(f"Network issue detected. Retrying after {wait_time}s... (attempt {retry_count + 1}/{max_retries})")
-                time.sleep(wait_time)
-                return self._call_llm(prompt, retry_count + 1)
-            else:
-                logger.error(f"Max retries reached after network timeouts")
-                raise Exception("Network connection unstable - max retries exceeded") from None
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}")
-            if 'response_text' in locals():
-                logger.error(f"Response text (first 1000 chars): {response_text[:1000]}")
-                logger.error(f"Response text (last 200 chars): {response_text[-200:]}")
-            else:
-                logger.error("Response text was not set - empty response from API")
+            choice = chunk.choices[0]
+            delta = choice.delta.content if choice.delta is not None else None
+            if delta:
+                parts.append(delta)
+                for outcome in stream_parser.feed(delta):
+                    if len(stream_parser.outcomes) == 1:
+                        logger.info(f"✓ First outcome received after {time.time() - start_time:.1f}s")
+                    logger.debug(f"  Outcome {len(stream_parser.outcomes)}: "
+                                 f"{outcome.get('outcome_name') or outcome.get('outcome_category')}")
+                    if self.on_outcome is not None:
+                        self.on_outcome(key, outcome)
             
-            if retry_count < max_retries:
-                logger.info(f"Retrying... (attempt {retry_count + 1}/{max_retries})")
-                time.sleep(retry_delay)
-                return self._call_llm(prompt, retry_count + 1)
-            else:
-                raise
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+                if finish_reason == 'length':
+                    logger.warning(f"Stream stopped at max_tokens with {len(stream_parser.outcomes)} complete outcomes")
         
-        except Exception as e:
-            logger.error(f"LLM API call failed: {type(e).__name__}: {e}")
-            
-            # Check if it's a timeout or connection error  
-            error_type = type(e).__name__
-            error_msg = str(e).lower()
-            is_retryable = any(x in error_type.lower() for x in ['timeout', 'connection', 'http', 'network']) or \
-                          any(x in error_msg for x in ['timeout', 'connection', 'timed out', 'network'])
-            
-            if retry_count < max_retries and is_retryable:
-                wait_time = retry_delay * (retry_count + 1)  # Exponential backoff
-                logger.info(f"Retrying after {wait_time}s... (attempt {retry_count + 1}/{max_retries})")
-                time.sleep(wait_time)
-                return self._call_llm(prompt, retry_count + 1)
-            else:
-                raise
+        logger.debug(f"Stream finished in {time.time() - start_time:.1f}s ({finish_reason})")
+        content = ''.join(parts) if parts else None
+        return content, finish_reason, usage, stream_parser.outcomes
     
-    def extract_batch(self, tei_files: List[Path], metadata_map: Optional[Dict] = None) -> List[Dict]:
+    def extract_batch(self, tei_files: List[Path], metadata_map: Optional[Dict] = None,
+                      concurrency: Optional[int] = None, checkpoint: Optional[RunCheckpoint] = None,
+                      resume: bool = False) -> List[Dict]:
         """
         Extract data from multiple TEI files.
         
+        Papers are processed concurrently by a bounded worker pool. Results keep
+        the input order and a failure on one paper never affects the others.
+        
         Args:
             tei_files: List of TEI file paths
             metadata_map: Dict mapping Key -> metadata dict
+            concurrency: Number of worker threads (default: extraction.concurrency from config)
+            checkpoint: Write each paper's result as soon as it completes
+            resume: Reuse checkpointed results for papers already done under the same fingerprint
         
         Returns:
             List of extraction results
         """
-        results = []
-        
-        for i, tei_file in enumerate(tei_files, 1):
+        def extract_one(index: int, tei_file: Path) -> Optional[Dict]:
+            key = paper_key(tei_file)
+            
+            if resume and checkpoint is not None and checkpoint.is_done(key):
+                logger.info(f"⏭️  Paper {index}/{len(tei_files)}: {key} already extracted, loading checkpoint")
+                return checkpoint.load_result(key)
+            
             logger.info(f"\n{'='*60}")
-            logger.info(f"Paper {i}/{len(tei_files)}: {tei_file.name}")
+            logger.info(f"Paper {index}/{len(tei_files)}: {tei_file.name}")
             logger.info(f"{'='*60}")
             
             # Get metadata for this paper
-            key = tei_file.stem  # Filename without extension
             metadata = metadata_map.get(key) if metadata_map else None
             
             # Extract
@@ -366,12 +667,16 @@ class ExtractionEngine:
             if result:
                 result['_key'] = key  # Add key for tracking
                 result['_tei_file'] = str(tei_file)
-                results.append(result)
+                if checkpoint is not None:
+                    checkpoint.record_success(key, result)
             else:
                 logger.warning(f"⚠️  Skipping {tei_file.name} due to extraction failure")
+                if checkpoint is not None:
+                    checkpoint.record_failure(key, "extraction failed")
             
-            # Small delay to avoid rate limits
-            time.sleep(0.5)
+            return result
+        
+        results = [r for r in self._run_concurrently(extract_one, tei_files, concurrency) if r]
         
         logger.info(f"\n{'='*60}")
         logger.info(f"Extraction complete: {len(results)}/{len(tei_files)} successful")
@@ -379,6 +684,110 @@ class ExtractionEngine:
         
         return results
     
+    def extract_batch_with_om_guidance(self, tei_files: List[Path], metadata_map: Optional[Dict] = None,
+                                       om_results: Optional[List[Dict]] = None,
+                                       concurrency: Optional[int] = None,
+                                       checkpoint: Optional[RunCheckpoint] = None,
+                                       resume: bool = False) -> List[Dict]:
+        """
+        Run guided QEX extraction (stage 2) over multiple TEI files concurrently.
+        
+        Args:
+            tei_files: List of TEI file paths
+            metadata_map: Dict mapping Key -> metadata dict
+            om_results: Stage 1 (OM) results, matched to papers by their '_key'
+            concurrency: Number of worker threads (default: extraction.concurrency from config)
+            checkpoint: Write each paper's result as soon as it completes
+            resume: Reuse checkpointed results for papers already done under the same
+                fingerprint and with the same OM outcomes
+        
+        Returns:
+            List of extraction results, in input order
+        """
+        om_by_key = {r.get('_key'): r for r in (om_results or [])}
+        
+        def extract_one(index: int, tei_file: Path) -> Optional[Dict]:
+            key = paper_key(tei_file)
+            om_outcomes = om_by_key.get(key, {}).get('outcomes', [])
+            # A QEX result is stale once the OM outcomes that guided it change
+            om_hash = compute_input_hash(om_outcomes)
+            
+            if resume and checkpoint is not None and checkpoint.is_done(key, om_hash):
+                logger.info(f"⏭️  Paper {index}/{len(tei_files)}: {key} already extracted, loading checkpoint")
+                return checkpoint.load_result(key)
+            
+            logger.info(f"\n{'='*60}")
+            logger.info(f"Paper {index}/{len(tei_files)}: {tei_file.name}")
+            logger.info(f"{'='*60}")
+            
+            metadata = metadata_map.get(key) if metadata_map else None
+            
+            # OM outcomes as guidance
+            logger.info(f"OM found {len(om_outcomes)} outcomes - using as guidance for QEX")
+            
+            result = self.extract_with_om_guidance(tei_file, metadata, om_outcomes)
+            
+            if result:
+                result['_key'] = key
+                result['_tei_file'] = str(tei_file)
+                result['_om_outcome_count'] = len(om_outcomes)  # Track how many OM found
+                if checkpoint is not None:
+                    checkpoint.record_success(key, result, input_hash=om_hash)
+            else:
+                logger.warning(f"⚠️  QEX extraction failed for {tei_file.name}")
+                if checkpoint is not None:
+                    checkpoint.record_failure(key, "guided extraction failed")
+            
+            return result
+        
+        return [r for r in self._run_concurrently(extract_one, tei_files, concurrency) if r]
+    
+    def _run_concurrently(self, func: Callable[[int, Path], Optional[Dict]], tei_files: List[Path],
+                          concurrency: Optional[int] = None) -> List[Optional[Dict]]:
+        """
+        Apply func(index, tei_file) to every file using a bounded thread pool.
+        
+        Exceptions are caught per paper and turned into None, so one failure
+        cannot abort the batch. The returned list is in input order.
+        """
+        concurrency = max(1, concurrency or self.concurrency)
+        
+        def guarded(index: int, tei_file: Path) -> Optional[Dict]:
+            try:
+                return func(index, tei_file)
+            except Exception as e:
+                logger.error(f"Unexpected error processing {tei_file.name}: {type(e).__name__}: {e}")
+                return None
+        
+        if concurrency == 1 or len(tei_files) <= 1:
+            return [guarded(i, f) for i, f in enumerate(tei_files, 1)]
+        
+        logger.info(f"Processing {len(tei_files)} papers with {concurrency} concurrent workers")
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(guarded, range(1, len(tei_files) + 1), tei_files))
+    
+    def open_checkpoint(self, output_dir: Path, guided: bool = False) -> RunCheckpoint:
+        """
+        Open the run checkpoint for an output directory.
+        
+        Args:
+            output_dir: Directory that will hold json/ and run_manifest.json
+            guided: Fingerprint the OM-guided QEX prompt instead of the standard template
+        """
+        template = self.prompt_template
+        if guided:
+            focused_prompt_path = Path(__file__).parent.parent / "prompts" / "qex_focused_prompt.txt"
+            if focused_prompt_path.exists():
+                template = focused_prompt_path.read_text(encoding='utf-8')
+        
+        extra = {}
+        for section in ('compaction', 'map_reduce'):
+            section_config = self.config.get(section, {}) or {}
+            if section_config.get('enabled', False):
+                extra[section] = section_config
+        fingerprint = compute_fingerprint(self.config['model'], template, self.mode, extra=extra)
+        return RunCheckpoint(output_dir, fingerprint)
+    
     def save_results(self, results: List[Dict], output_dir: Path):
         """
         Save extraction results as JSON and CSV.
@@ -398,10 +807,7 @@ class ExtractionEngine:
         
         for result in results:
             key = result.get('_key', 'unknown')
-            json_file = json_dir / f"{key}.json"
-            
-            with open(json_file, 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2, ensure_ascii=False)
+            atomic_write_json(json_dir / f"{key}.json", result)
         
         logger.info(f"✅ Saved {len(results)} JSON files to {json_dir}")
         
@@ -505,6 +911,79 @@ class ExtractionEngine:
         logger.info(f"✅ Saved summary to {summary_file}")
 
 
+def _is_empty(value) -> bool:
+    if value is None or value == '' or value == [] or value == {}:
+        return True
+    return isinstance(value, str) and value.strip().lower() in EMPTY_ANSWERS
+
+
+def _first_answer(values: List):
+    """First informative value; dicts (e.g. graduation_components) are merged per key."""
+    dicts = [v for v in values if isinstance(v, dict)]
+    if dicts and len(dicts) == len([v for v in values if v is not None]):
+        keys = list(dict.fromkeys(k for d in dicts for k in d))
+        return {k: _first_answer([d.get(k) for d in dicts]) for k in keys}
+    for value in values:
+        if not _is_empty(value):
+            return value
+    return next((v for v in values if v is not None), None)
+
+
+def outcome_identity(outcome: Dict) -> tuple:
+    """Deduplication key of an outcome: its name and location, normalized."""
+    name = outcome.get('outcome_name') or outcome.get('outcome_category') or ''
+    location = outcome.get('text_position') or outcome.get('location') or ''
+    return (' '.join(str(name).lower().split()), ' '.join(str(location).lower().split()))
+
+
+def merge_extractions(extractions: List[Dict]) -> Dict:
+    """
+    Reduce the extractions of one paper's chunks into a single extraction.
+    
+    Paper-level fields take the first informative answer in chunk order
+    ("Not mentioned" and empty values lose to any real answer). Outcomes are
+    concatenated in chunk order; outcomes with the same name and location are
+    merged, the first one's fields winning and missing ones filled in.
+    """
+    merged: Dict = {}
+    fields = list(dict.fromkeys(k for e in extractions for k in e if k != 'outcomes' and not k.startswith('_')))
+    for field in fields:
+        merged[field] = _first_answer([e.get(field) for e in extractions])
+    
+    outcomes: Dict[tuple, Dict] = {}
+    for extraction in extractions:
+        for outcome in extraction.get('outcomes', []) or []:
+            identity = outcome_identity(outcome)
+            if identity == ('', ''):
+                identity = ('', str(len(outcomes)))  # Nothing to compare on: keep it
+            if identity not in outcomes:
+                outcomes[identity] = dict(outcome)
+                continue
+            existing = outcomes[identity]
+            for name, value in outcome.items():
+                if _is_empty(existing.get(name)) and not _is_empty(value):
+                    existing[name] = value
+    merged['outcomes'] = list(outcomes.values())
+    
+    if any(e.get('_truncated') for e in extractions):
+        merged['_truncated'] = True
+    return merged
+
+
+def paper_key(tei_file: Path) -> str:
+    """Paper key from a TEI filename (e.g. 'PHRKN65M.tei.xml' -> 'PHRKN65M')."""
+    return Path(tei_file).name.replace('.tei.xml', '')
+
+
+def build_rate_limiter(config: Dict) -> RateLimiter:
+    """Create a rate limiter from the extraction section of the config."""
+    extraction_config = config.get('extraction', {})
+    return RateLimiter(
+        requests_per_minute=extraction_config.get('requests_per_minute'),
+        tokens_per_minute=extraction_config.get('tokens_per_minute')
+    )
+
+
 def load_metadata_from_master(master_file: Path) -> Dict:
     """
     Load metadata from master CSV file.
@@ -0,0 +1,168 @@
+"""
+LLM Response Cache - Persistent content-addressed cache for LLM extractions.
+Stores parsed responses in SQLite, keyed by a hash of the full request.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(model: str, prompt: str, temperature: float, top_p: float, max_tokens: int) -> str:
+    """
+    Build a content-addressed cache key for an LLM request.
+
+    Any change to the model, the full prompt text or the generation
+    parameters produces a different key.
+
+    Returns:
+        SHA-256 hex digest
+    """
+    payload = json.dumps({
+        'model': model,
+        'prompt': prompt,
+        'temperature': temperature,
+        'top_p': top_p,
+        'max_tokens': max_tokens
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """Disk-backed cache of parsed LLM responses with size and age based eviction."""
+
+    # Run eviction every N writes (eviction is also run on open)
+    EVICT_EVERY = 50
+
+    def __init__(self, db_path: Path, max_size_mb: float = 500, max_age_days: float = 30):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            db_path: Path to SQLite database file
+            max_size_mb: Evict least recently used entries above this total size
+            max_age_days: Evict entries older than this many days
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age_seconds = max_age_days * 24 * 3600
+
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        self._conn.commit()
+
+        evicted = self.evict()
+        logger.info(f"LLM response cache opened: {self.db_path} ({evicted} stale entries evicted)")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a cached response.
+
+        Returns:
+            A fresh copy of the parsed response, or None on a miss or expired entry
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            response, created_at = row
+            if now - created_at > self.max_age_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+
+        return json.loads(response)
+
+    def put(self, key: str, model: str, response: Dict):
+        """Store a successfully parsed response."""
+        payload = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, model, payload, len(payload.encode('utf-8')), now, now)
+            )
+            self._conn.commit()
+            self._writes += 1
+            run_eviction = self._writes % self.EVICT_EVERY == 0
+
+        if run_eviction:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Remove expired entries, then least recently used entries until
+        the cache fits within its size limit.
+
+        Returns:
+            Number of entries removed
+        """
+        removed = 0
+        with self._lock:
+            cutoff = time.time() - self.max_age_seconds
+            removed += self._conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,)).rowcount
+
+            total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total_size > self.max_size_bytes:
+                rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used ASC").fetchall()
+                stale_keys = []
+                for key, size in rows:
+                    if total_size <= self.max_size_bytes:
+                        break
+                    stale_keys.append((key,))
+                    total_size -= size
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+                removed += len(stale_keys)
+
+            self._conn.commit()
+
+        if removed:
+            logger.info(f"Evicted {removed} entries from LLM response cache")
+        return removed
+
+    def stats(self) -> Dict:
+        """Return entry count, total size and hit count."""
+        with self._lock:
+            entries, size, hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM responses"
+            ).fetchone()
+        return {'entries': entries, 'size_bytes': size, 'hits': hits}
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,319 @@
+"""
+LLM Client - Shared retry, backoff and circuit breaking for every LLM call.
+Used by the V1 ExtractionEngine and by all V2 phases.
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, TypeVar
+
+from .rate_limiter import RateLimiter
+from .token_ledger import TokenLedger
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+# Retry policy per error class:
+#   max_retries - retries after the first attempt (0 = fail immediately)
+#   base_delay  - seconds before the first retry; doubles on each further retry
+#   outage      - failures count towards opening the circuit breaker
+DEFAULT_POLICIES = {
+    'rate_limit': {'max_retries': 6, 'base_delay': 5.0, 'outage': False},
+    'server': {'max_retries': 3, 'base_delay': 2.0, 'outage': True},
+    'timeout': {'max_retries': 3, 'base_delay': 4.0, 'outage': True},
+    'connection': {'max_retries': 3, 'base_delay': 4.0, 'outage': True},
+    'invalid_response': {'max_retries': 2, 'base_delay': 1.0, 'outage': False},
+    'client': {'max_retries': 0, 'base_delay': 0.0, 'outage': False},
+    'fatal': {'max_retries': 0, 'base_delay': 0.0, 'outage': False},
+}
+
+
+class InvalidResponseError(ValueError):
+    """The API answered, but the response was empty or unusable (retryable)."""
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the API while the circuit breaker is open."""
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Map an exception to a retry policy class.
+
+    Returns:
+        One of 'rate_limit', 'server', 'timeout', 'connection',
+        'invalid_response', 'client' or 'fatal'
+    """
+    if isinstance(error, (InvalidResponseError, json.JSONDecodeError)):
+        return 'invalid_response'
+
+    status = getattr(error, 'status_code', None)
+    if isinstance(status, int):
+        if status == 429:
+            return 'rate_limit'
+        if status == 408:
+            return 'timeout'
+        if status >= 500:
+            return 'server'
+        return 'client'
+
+    # Check timeouts first: APITimeoutError is a subclass of APIConnectionError
+    error_type = type(error).__name__.lower()
+    if isinstance(error, TimeoutError) or 'timeout' in error_type:
+        return 'timeout'
+    if isinstance(error, ConnectionError) or any(x in error_type for x in ['connection', 'protocol', 'network']):
+        return 'connection'
+
+    error_msg = str(error).lower()
+    if 'timed out' in error_msg or 'timeout' in error_msg:
+        return 'timeout'
+    if 'connection' in error_msg or 'network' in error_msg:
+        return 'connection'
+
+    return 'fatal'
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Read the server's Retry-After hint (seconds or HTTP date) from an API error, if any."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Stops calling a provider that keeps failing.
+
+    After `failure_threshold` consecutive outage-class failures the circuit
+    opens and calls fail fast for `reset_timeout` seconds. Then one probe
+    call is let through: success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half_open'."""
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may be made now."""
+        if not self.failure_threshold:
+            return
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            if remaining > 0:
+                raise CircuitOpenError(f"Circuit open after repeated provider failures - retry in {remaining:.0f}s")
+            if self._probe_in_flight:
+                raise CircuitOpenError("Circuit half-open - waiting for the probe call to finish")
+            self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Circuit closed - provider is responding again")
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self, outage: bool):
+        """Count a failed call; only outage-class failures can open the circuit."""
+        with self._lock:
+            self._probe_in_flight = False
+            if not outage:
+                return
+            self._failures += 1
+            if self.failure_threshold and (self._opened_at is not None or self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                logger.error(f"🔌 Circuit opened after {self._failures} consecutive provider failures - "
+                             f"failing fast for {self.reset_timeout:.0f}s")
+
+
+class LLMCaller:
+    """Iterative retry loop with exponential backoff, jitter, Retry-After and a circuit breaker."""
+
+    def __init__(self, client=None, policies: Optional[Dict[str, Dict]] = None, max_delay: float = 60.0,
+                 circuit_breaker: Optional[CircuitBreaker] = None, rate_limiter: Optional[RateLimiter] = None,
+                 ledger: Optional[TokenLedger] = None, sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            client: OpenAI-compatible client (needed for complete())
+            policies: Per-error-class overrides of DEFAULT_POLICIES
+            max_delay: Upper bound on a single backoff delay in seconds
+            circuit_breaker: Shared breaker (default: 5 failures, 60s cool-down)
+            rate_limiter: Shared rate limiter (default: unlimited)
+            ledger: Token ledger for complete() calls
+            sleep: Sleep function (injectable for tests)
+        """
+        self.client = client
+        self.policies = {name: dict(policy) for name, policy in DEFAULT_POLICIES.items()}
+        for name, overrides in (policies or {}).items():
+            self.policies.setdefault(name, dict(DEFAULT_POLICIES['fatal'])).update(overrides or {})
+        self.max_delay = max_delay
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.ledger = ledger
+        self._sleep = sleep
+
+    @classmethod
+    def from_config(cls, client, config: Dict, rate_limiter: Optional[RateLimiter] = None,
+                    ledger: Optional[TokenLedger] = None) -> "LLMCaller":
+        """
+        Build a caller from the `retry` config section.
+
+        extraction.max_retries / retry_delay still apply to the server, timeout
+        and connection classes when `retry` does not override them.
+        """
+        retry_config = config.get('retry', {}) or {}
+        extraction_config = config.get('extraction', {}) or {}
+
+        policies: Dict[str, Dict] = {}
+        for name in ('server', 'timeout', 'connection'):
+            legacy = {}
+            if 'max_retries' in extraction_config:
+                legacy['max_retries'] = extraction_config['max_retries']
+            if 'retry_delay' in extraction_config:
+                legacy['base_delay'] = extraction_config['retry_delay']
+            policies[name] = legacy
+        for name, overrides in (retry_config.get('policies', {}) or {}).items():
+            policies.setdefault(name, {}).update(overrides or {})
+
+        breaker_config = retry_config.get('circuit_breaker', {}) or {}
+        return cls(
+            client,
+            policies=policies,
+            max_delay=retry_config.get('max_delay', 60.0),
+            circuit_breaker=CircuitBreaker(
+                failure_threshold=breaker_config.get('failure_threshold', 5),
+                reset_timeout=breaker_config.get('reset_timeout', 60.0)
+            ),
+            rate_limiter=rate_limiter,
+            ledger=ledger
+        )
+
+    def backoff_delay(self, error_class: str, retry_number: int, error: Optional[BaseException] = None) -> float:
+        """
+        Seconds to wait before retry `retry_number` (1-based).
+
+        Exponential in the retry number with "equal jitter" (50-100% of the
+        computed delay), so concurrent workers do not retry in lockstep.
+        A larger Retry-After from the server always wins.
+        """
+        base_delay = float(self.policies[error_class].get('base_delay', 0.0))
+        delay = min(self.max_delay, base_delay * (2 ** (retry_number - 1)))
+        delay *= random.uniform(0.5, 1.0)
+
+        if error is not None:
+            retry_after = retry_after_seconds(error)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+        return delay
+
+    def call(self, request: Callable[[], T], description: str = "LLM call") -> T:
+        """
+        Run request() until it succeeds or its error class runs out of retries.
+
+        Args:
+            request: Performs one attempt (API call plus any response parsing)
+            description: Label for log messages
+
+        Returns:
+            Whatever request() returns
+        """
+        retries = 0
+        while True:
+            self.circuit_breaker.before_call()
+            try:
+                result = request()
+            except Exception as e:
+                error_class = classify_error(e)
+                policy = self.policies.get(error_class, DEFAULT_POLICIES['fatal'])
+                self.circuit_breaker.record_failure(policy.get('outage', False))
+
+                if retries >= policy.get('max_retries', 0):
+                    if policy.get('max_retries', 0):
+                        logger.error(f"{description}: giving up after {retries + 1} attempts ({error_class}: {e})")
+                    raise
+
+                retries += 1
+                delay = self.backoff_delay(error_class, retries, e)
+                logger.warning(f"{description}: {error_class} error ({type(e).__name__}: {e}) - "
+                               f"retry {retries}/{policy['max_retries']} in {delay:.1f}s")
+                self._sleep(delay)
+                continue
+
+            self.circuit_breaker.record_success()
+            return result
+
+    def complete(self, key: Optional[str] = None, phase: str = "", estimated_tokens: int = 0, **request):
+        """
+        chat.completions.create with rate limiting, retries and ledger entries.
+
+        Args:
+            key: Paper key (ledger)
+            phase: Pipeline phase (ledger)
+            estimated_tokens: Pre-flight prompt estimate (rate limiter and ledger)
+            **request: Arguments for client.chat.completions.create
+
+        Returns:
+            The API response
+        """
+        model = request.get('model', '')
+
+        def attempt():
+            self.rate_limiter.acquire(estimated_tokens + (request.get('max_tokens') or 0))
+            start_time = time.time()
+            try:
+                response = self.client.chat.completions.create(**request)
+            except Exception:
+                if self.ledger is not None:
+                    self.ledger.record(key, phase, model, estimated_tokens, None, time.time() - start_time, "error")
+                raise
+            if self.ledger is not None:
+                self.ledger.record_response(response, key, phase, model, estimated_tokens, time.time() - start_time)
+            if not getattr(response, 'choices', None):
+                raise InvalidResponseError("API returned no choices")
+            return response
+
+        return self.call(attempt, description=f"{key} {phase}".strip() or "LLM call")
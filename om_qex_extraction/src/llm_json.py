@@ -0,0 +1,216 @@
+"""
+LLM JSON - One tolerant parser for JSON documents in LLM responses.
+Handles markdown fences, prose around the JSON, trailing commas and
+responses truncated at max_tokens.
+"""
+
+import json
+import re
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+
+# Complete strings, bare quotes (an unterminated string) and structural characters
+_TOKEN_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"|"|[{}\[\],]', re.DOTALL)
+
+_FENCE_PATTERN = re.compile(r'```[A-Za-z0-9_-]*[ \t]*\n?')
+
+CLOSERS = {'{': '}', '[': ']'}
+
+# Candidate start positions tried before giving up
+MAX_CANDIDATES = 8
+
+
+class LLMJSONError(json.JSONDecodeError):
+    """No JSON document could be recovered from the response."""
+
+
+class ParsedJSON(NamedTuple):
+    """Parsed document and how it was recovered."""
+    data: Any
+    truncated: bool = False
+    repairs: Tuple[str, ...] = ()
+
+
+def parse_llm_json(text: Optional[str], expect: Optional[type] = dict,
+                   repair_truncated: bool = True) -> ParsedJSON:
+    """
+    Parse the JSON document in an LLM response.
+
+    Tries, in order: the whole response; the content of the first markdown
+    fence; then a string-aware balanced-bracket scan from each candidate
+    opening bracket (skipping prose before and after the JSON). Once a
+    scanned document fails to parse, the brackets nested inside it are not
+    tried: a fragment of a broken response is not returned. Trailing
+    commas are removed, and a document cut off mid-way is closed after its
+    last complete element (partial elements of the outermost array are
+    dropped).
+
+    Args:
+        text: Raw response text
+        expect: Required type of the document (dict, list, or None for any)
+        repair_truncated: Close truncated documents instead of failing
+
+    Returns:
+        ParsedJSON(data, truncated, repairs)
+
+    Raises:
+        LLMJSONError: If no document of the expected type can be recovered
+    """
+    if not text or not text.strip():
+        raise LLMJSONError("Empty response", text or "", 0)
+
+    stripped = text.strip()
+
+    # Fast path: the response is exactly one JSON document
+    if stripped[0] in '{[':
+        try:
+            data = json.loads(stripped)
+            if _matches(data, expect):
+                return ParsedJSON(data)
+        except json.JSONDecodeError:
+            pass
+
+    repairs: List[str] = []
+    region = stripped
+    fence = _FENCE_PATTERN.search(stripped)
+    if fence is not None:
+        end = stripped.find('```', fence.end())
+        content = stripped[fence.end():end] if end != -1 else stripped[fence.end():]
+        if '{' in content or '[' in content:
+            region = content
+            repairs.append('fence')
+
+    openers = '{' if expect is dict else '[' if expect is list else '{['
+    starts = _first_positions(region, openers, MAX_CANDIDATES)
+
+    last_error = "No JSON object found"
+    scanned_to = 0
+    for start in starts:
+        if start < scanned_to:
+            # Inside a document that failed to parse: a nested value is not the response
+            break
+        parsed, scanned_to = _parse_from(region, start, expect, repair_truncated)
+        if isinstance(parsed, ParsedJSON):
+            prefix_repairs = ['prefix'] if region[:start].strip() else []
+            return ParsedJSON(parsed.data, parsed.truncated, tuple(repairs + prefix_repairs) + parsed.repairs)
+        last_error = parsed
+
+    raise LLMJSONError(f"Could not parse JSON from response: {last_error}", text, 0)
+
+
+def _matches(data: Any, expect: Optional[type]) -> bool:
+    return expect is None or isinstance(data, expect)
+
+
+def _first_positions(text: str, chars: str, limit: int) -> List[int]:
+    """Positions of the first `limit` occurrences of any of `chars`, without scanning the whole text."""
+    positions = []
+    pattern = re.compile('[' + re.escape(chars) + ']')
+    for match in pattern.finditer(text):
+        positions.append(match.start())
+        if len(positions) >= limit:
+            break
+    return positions
+
+
+def _parse_from(text: str, start: int, expect: Optional[type], repair_truncated: bool) -> Tuple[Any, int]:
+    """
+    Scan one document starting at `start` and parse it.
+
+    Returns:
+        (ParsedJSON on success, otherwise an error message; end of the scanned region)
+    """
+    stack: List[str] = []
+    trailing_commas: List[int] = []
+    last_comma: Optional[int] = None   # Position of a comma not yet followed by a value
+    safe_end: Optional[int] = None     # Last point where the document can be cut and closed
+    safe_closers = ""
+    end: Optional[int] = None
+
+    for match in _TOKEN_PATTERN.finditer(text, start):
+        token = match.group()
+        pos = match.start()
+
+        if token == '"':
+            break  # Unterminated string: the response was cut off inside it
+
+        if token[0] == '"':
+            last_comma = None
+            continue
+
+        if token in '{[':
+            last_comma = None
+            stack.append(token)
+            if _is_cut_level(stack):
+                safe_end, safe_closers = pos + 1, _closers(stack)
+        elif token in '}]':
+            if not stack or CLOSERS[stack[-1]] != token:
+                return f"Mismatched '{token}' at position {pos}", pos + 1
+            if last_comma is not None and not text[last_comma + 1:pos].strip():
+                trailing_commas.append(last_comma)
+            last_comma = None
+            stack.pop()
+            if not stack:
+                end = pos + 1
+                break
+            if _is_cut_level(stack):
+                safe_end, safe_closers = pos + 1, _closers(stack)
+        else:  # ','
+            if _is_cut_level(stack):
+                safe_end, safe_closers = pos, _closers(stack)
+            last_comma = pos
+
+    repairs: List[str] = []
+    truncated = False
+    if end is not None:
+        document = _remove_positions(text, start, end, trailing_commas)
+    elif repair_truncated and safe_end is not None:
+        document = _remove_positions(text, start, safe_end, [c for c in trailing_commas if c < safe_end])
+        document = document.rstrip().rstrip(',') + safe_closers
+        truncated = True
+        repairs.append('truncated')
+    else:
+        return "Unterminated JSON document", len(text)
+    scanned_to = end if end is not None else len(text)
+
+    if trailing_commas:
+        repairs.append('trailing_commas')
+
+    try:
+        data = json.loads(document)
+    except json.JSONDecodeError as e:
+        return str(e), scanned_to
+
+    if not _matches(data, expect):
+        return f"Expected {expect.__name__}, got {type(data).__name__}", scanned_to
+    return ParsedJSON(data, truncated, tuple(repairs)), scanned_to
+
+
+def _is_cut_level(stack: List[str]) -> bool:
+    """
+    True if the document may be cut at the current depth.
+
+    Allowed: inside objects on the path from the root, and directly inside
+    the outermost array. Cutting deeper would keep a partial array element.
+    """
+    arrays = stack.count('[')
+    if arrays == 0:
+        return True
+    return arrays == 1 and stack[-1] == '['
+
+
+def _closers(stack: List[str]) -> str:
+    return ''.join(CLOSERS[b] for b in reversed(stack))
+
+
+def _remove_positions(text: str, start: int, end: int, positions: List[int]) -> str:
+    """text[start:end] without the characters at `positions`."""
+    if not positions:
+        return text[start:end]
+    parts = []
+    previous = start
+    for position in positions:
+        parts.append(text[previous:position])
+        previous = position + 1
+    parts.append(text[previous:end])
+    return ''.join(parts)
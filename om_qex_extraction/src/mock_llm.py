@@ -0,0 +1,435 @@
+"""
+Mock LLM Backend - Offline stand-in for the OpenAI-compatible client.
+Replays recorded responses (cassettes keyed by request hash) or synthesizes
+schema-valid responses with configurable latency, errors and truncation.
+"""
+
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+from .checkpoint import atomic_write_json
+from .token_ledger import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class MockAPIError(Exception):
+    """Simulated HTTP error (status_code and Retry-After header like openai.APIStatusError)."""
+
+    def __init__(self, message: str, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class CassetteMissError(LookupError):
+    """Replay mode found no recorded response for a request."""
+
+
+def request_hash(model: str, messages: List[Dict]) -> str:
+    """Cassette key: hash of the model and the full message list (including any images)."""
+    payload = json.dumps({'model': model, 'messages': messages}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def _prompt_text(messages: List[Dict]) -> str:
+    """Concatenated text parts of all messages."""
+    parts = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(p.get('text', '') for p in content if p.get('type') == 'text')
+    return '\n'.join(parts)
+
+
+def _image_count(messages: List[Dict]) -> int:
+    return sum(
+        1 for message in messages if isinstance(message.get('content'), list)
+        for part in message['content'] if part.get('type') == 'image_url'
+    )
+
+
+class MockLLMClient:
+    """
+    Drop-in replacement for OpenAI(...) exposing client.chat.completions.create.
+
+    Modes:
+        synthesize - generate a plausible response for the prompt's schema
+        replay     - return recorded responses; misses synthesize or fail (on_miss)
+        record     - forward to a real client and save each response as a cassette
+    """
+
+    def __init__(self, mode: str = "synthesize", cassette_dir: Optional[Path] = None,
+                 real_client=None, on_miss: str = "error", latency_ms: float = 0.0,
+                 latency_jitter: float = 0.25, ms_per_output_token: float = 0.0,
+                 error_rate: float = 0.0, rate_limit_share: float = 0.5, timeout_rate: float = 0.0,
+                 truncation_rate: float = 0.0, outcomes_range=(3, 12), seed: int = 0):
+        """
+        Args:
+            mode: "synthesize", "replay" or "record"
+            cassette_dir: Directory of recorded responses (replay/record)
+            real_client: Client used in record mode
+            on_miss: Replay miss behaviour - "error" or "synthesize"
+            latency_ms: Base latency per request (time to first token)
+            latency_jitter: Relative latency jitter (0.25 = +/-25%)
+            ms_per_output_token: Additional latency per completion token
+            error_rate: Probability of a simulated HTTP error (429 or 500)
+            rate_limit_share: Fraction of simulated errors that are 429s
+            timeout_rate: Probability of a simulated timeout
+            truncation_rate: Probability of cutting the response (finish_reason "length")
+            outcomes_range: (min, max) outcomes per synthesized response
+            seed: Seed; behaviour is deterministic per (seed, request, attempt)
+        """
+        if mode not in ('synthesize', 'replay', 'record'):
+            raise ValueError(f"Unknown mock mode: {mode}")
+        if mode == 'record' and (real_client is None or cassette_dir is None):
+            raise ValueError("Record mode needs a real client and a cassette directory")
+
+        self.mode = mode
+        self.cassette_dir = Path(cassette_dir) if cassette_dir else None
+        if mode == 'record':
+            self.cassette_dir.mkdir(parents=True, exist_ok=True)
+        self.real_client = real_client
+        self.on_miss = on_miss
+        self.latency_ms = latency_ms
+        self.latency_jitter = latency_jitter
+        self.ms_per_output_token = ms_per_output_token
+        self.error_rate = error_rate
+        self.rate_limit_share = rate_limit_share
+        self.timeout_rate = timeout_rate
+        self.truncation_rate = truncation_rate
+        self.outcomes_range = tuple(outcomes_range)
+        self.seed = seed
+
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'timeouts': 0, 'truncated': 0, 'replayed': 0, 'recorded': 0}
+
+        # Same attribute path as the OpenAI client
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    @classmethod
+    def from_config(cls, mock_config: Dict, base_dir: Path, real_client=None) -> "MockLLMClient":
+        """
+        Build a mock client from the `mock` config section.
+
+        Args:
+            mock_config: The `mock` section
+            base_dir: Directory that relative cassette paths are resolved against
+            real_client: Real client for record mode
+        """
+        cassette_dir = mock_config.get('cassette_dir', 'om_qex_extraction/outputs/cassettes')
+        cassette_dir = Path(cassette_dir)
+        if not cassette_dir.is_absolute():
+            cassette_dir = Path(base_dir) / cassette_dir
+
+        client = cls(
+            mode=mock_config.get('mode', 'synthesize'),
+            cassette_dir=cassette_dir,
+            real_client=real_client,
+            on_miss=mock_config.get('on_miss', 'error'),
+            latency_ms=mock_config.get('latency_ms', 0.0),
+            latency_jitter=mock_config.get('latency_jitter', 0.25),
+            ms_per_output_token=mock_config.get('ms_per_output_token', 0.0),
+            error_rate=mock_config.get('error_rate', 0.0),
+            rate_limit_share=mock_config.get('rate_limit_share', 0.5),
+            timeout_rate=mock_config.get('timeout_rate', 0.0),
+            truncation_rate=mock_config.get('truncation_rate', 0.0),
+            outcomes_range=mock_config.get('outcomes_range', (3, 12)),
+            seed=mock_config.get('seed', 0)
+        )
+        logger.info(f"Using mock LLM backend ({client.mode} mode, cassettes: {cassette_dir})")
+        return client
+
+    # ------------------------------------------------------------------
+    # chat.completions.create
+    # ------------------------------------------------------------------
+
+    def create(self, model: str = "mock", messages: Optional[List[Dict]] = None, max_tokens: Optional[int] = None,
+               stream: bool = False, stream_options: Optional[Dict] = None, **kwargs):
+        """Mimic client.chat.completions.create (non-streaming and streaming)."""
+        messages = messages or []
+        key = request_hash(model, messages)
+
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+            self.stats['requests'] += 1
+        rng = random.Random(f"{self.seed}:{key}:{attempt}")
+
+        prompt = _prompt_text(messages)
+        if self.mode == 'record':
+            record = self._record(key, model, messages, max_tokens, **kwargs)
+        else:
+            record = self._load_cassette(key) if self.mode == 'replay' else None
+            if record is None:
+                if self.mode == 'replay' and self.on_miss != 'synthesize':
+                    raise CassetteMissError(f"No cassette for request {key} in {self.cassette_dir}")
+                record = self._synthesize(prompt, rng)
+            self._inject_faults(rng)
+
+        content = record['content']
+        finish_reason = record.get('finish_reason', 'stop')
+        if self.mode != 'record':
+            content, finish_reason = self._maybe_truncate(content, finish_reason, max_tokens, rng)
+
+        usage = SimpleNamespace(
+            prompt_tokens=record.get('usage', {}).get('prompt_tokens') or estimate_tokens(prompt) + 1500 * _image_count(messages),
+            completion_tokens=record.get('usage', {}).get('completion_tokens') or estimate_tokens(content)
+        )
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+
+        latency = 0.0 if self.mode == 'record' else self._latency(usage.completion_tokens, rng)
+        if stream:
+            include_usage = bool((stream_options or {}).get('include_usage'))
+            return self._stream(model, content, finish_reason, usage if include_usage else None, latency)
+
+        time.sleep(latency)
+        return SimpleNamespace(
+            id=f"mock-{key[:12]}-{attempt}",
+            model=model,
+            choices=[SimpleNamespace(index=0, message=SimpleNamespace(role="assistant", content=content),
+                                     finish_reason=finish_reason)],
+            usage=usage
+        )
+
+    def _stream(self, model: str, content: str, finish_reason: str, usage, latency: float) -> Iterator:
+        """Yield content in small chunks, spreading the latency over them."""
+        chunk_size = 40
+        pieces = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)] or [""]
+        delay = latency / (len(pieces) + 1)
+        time.sleep(delay)
+        for piece in pieces:
+            time.sleep(delay)
+            yield SimpleNamespace(model=model, usage=None, choices=[
+                SimpleNamespace(index=0, delta=SimpleNamespace(content=piece), finish_reason=None)
+            ])
+        yield SimpleNamespace(model=model, usage=None, choices=[
+            SimpleNamespace(index=0, delta=SimpleNamespace(content=None), finish_reason=finish_reason)
+        ])
+        if usage is not None:
+            yield SimpleNamespace(model=model, usage=usage, choices=[])
+
+    # ------------------------------------------------------------------
+    # Faults and timing
+    # ------------------------------------------------------------------
+
+    def _inject_faults(self, rng: random.Random):
+        """Raise a simulated HTTP error or timeout according to the configured rates."""
+        draw = rng.random()
+        if draw < self.error_rate:
+            with self._lock:
+                self.stats['errors'] += 1
+            if rng.random() < self.rate_limit_share:
+                raise MockAPIError("Mock rate limit exceeded", 429, retry_after=round(rng.uniform(0.0, 1.0), 2))
+            raise MockAPIError("Mock provider error", 500)
+        if draw < self.error_rate + self.timeout_rate:
+            with self._lock:
+                self.stats['timeouts'] += 1
+            time.sleep(self.latency_ms / 1000.0)
+            raise TimeoutError("Mock request timed out")
+
+    def _maybe_truncate(self, content: str, finish_reason: str, max_tokens: Optional[int], rng: random.Random):
+        """Cut the response at max_tokens, or at random with probability truncation_rate."""
+        cut = None
+        if max_tokens and estimate_tokens(content) > max_tokens:
+            cut = int(len(content) * max_tokens / max(1, estimate_tokens(content)))
+        elif rng.random() < self.truncation_rate:
+            cut = int(len(content) * rng.uniform(0.3, 0.9))
+
+        if cut is None:
+            return content, finish_reason
+        with self._lock:
+            self.stats['truncated'] += 1
+        return content[:cut], 'length'
+
+    def _latency(self, completion_tokens: int, rng: random.Random) -> float:
+        base = self.latency_ms + self.ms_per_output_token * completion_tokens
+        jitter = 1.0 + rng.uniform(-self.latency_jitter, self.latency_jitter)
+        return max(0.0, base * jitter / 1000.0)
+
+    # ------------------------------------------------------------------
+    # Cassettes
+    # ------------------------------------------------------------------
+
+    def _cassette_file(self, key: str) -> Path:
+        return self.cassette_dir / f"{key}.json"
+
+    def _load_cassette(self, key: str) -> Optional[Dict]:
+        if self.cassette_dir is None or not self._cassette_file(key).exists():
+            return None
+        with open(self._cassette_file(key), 'r', encoding='utf-8') as f:
+            record = json.load(f)
+        with self._lock:
+            self.stats['replayed'] += 1
+        return record
+
+    def _record(self, key: str, model: str, messages: List[Dict], max_tokens: Optional[int], **kwargs) -> Dict:
+        """Forward the request to the real client and save the response."""
+        response = self.real_client.chat.completions.create(model=model, messages=messages,
+                                                            max_tokens=max_tokens, **kwargs)
+        choice = response.choices[0]
+        usage = getattr(response, 'usage', None)
+        record = {
+            'model': model,
+            'content': choice.message.content or "",
+            'finish_reason': choice.finish_reason,
+            'usage': {
+                'prompt_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+                'completion_tokens': getattr(usage, 'completion_tokens', 0) or 0
+            },
+            'recorded': datetime.now().isoformat(timespec='seconds')
+        }
+        atomic_write_json(self._cassette_file(key), record)
+        with self._lock:
+            self.stats['recorded'] += 1
+        return record
+
+    # ------------------------------------------------------------------
+    # Synthesis
+    # ------------------------------------------------------------------
+
+    def _synthesize(self, prompt: str, rng: random.Random) -> Dict:
+        """Build a response matching the schema the prompt asks for."""
+        if '"results_tables"' in prompt:
+            document = self._synthesize_vision(prompt, rng)
+        elif '"tables_classified"' in prompt:
+            document = self._synthesize_filtering(prompt, rng)
+        elif '"tables_extracted"' in prompt:
+            document = self._synthesize_table_extraction(prompt, rng)
+        elif '"tables_found"' in prompt:
+            document = self._synthesize_discovery(prompt, rng)
+        elif '"outcome_group"' in prompt:
+            document = {'study_id': None, 'outcomes': [self._om_outcome(i, rng) for i in range(self._n_outcomes(rng))]}
+        else:
+            document = self._synthesize_qex(rng)
+
+        return {'content': "```json\n" + json.dumps(document, indent=2) + "\n```", 'finish_reason': 'stop'}
+
+    def _n_outcomes(self, rng: random.Random) -> int:
+        low, high = self.outcomes_range
+        return rng.randint(low, high)
+
+    @staticmethod
+    def _table_numbers(prompt: str, pattern: str, after: str = "", limit: int = 12) -> List[str]:
+        """Unique table numbers matching `pattern`, skipping the template text before `after`."""
+        start = prompt.find(after) if after else -1
+        numbers = []
+        for match in re.finditer(pattern, prompt[max(start, 0):]):
+            if match.group(1) not in numbers:
+                numbers.append(match.group(1))
+            if len(numbers) >= limit:
+                break
+        return numbers
+
+    def _om_outcome(self, i: int, rng: random.Random) -> Dict:
+        table = rng.randint(2, 12)
+        estimate = round(rng.uniform(-0.5, 1.5), 3)
+        return {
+            'outcome_group': rng.choice(['Assets', 'Financial Inclusion', 'Expenditure/Consumption', 'Income', 'Poverty']),
+            'outcome_category': f"Mock outcome {i + 1}",
+            'location': f"Table {table}; Row: Treatment",
+            'literal_text': f"Treatment | {estimate}** ({round(abs(estimate) / 2.5, 3)})",
+            'text_position': f"Table {table}, Row 'Treatment'"
+        }
+
+    def _qex_outcome(self, i: int, rng: random.Random) -> Dict:
+        outcome = self._om_outcome(i, rng)
+        effect = round(rng.uniform(-0.5, 1.5), 3)
+        return {
+            'outcome_name': outcome['outcome_category'],
+            'outcome_description': f"Synthesized {outcome['outcome_group'].lower()} outcome",
+            'effect_size': effect,
+            'p_value': round(rng.uniform(0.001, 0.2), 3),
+            'standard_error': round(abs(effect) / 2.5, 3),
+            'literal_text': outcome['literal_text'],
+            'text_position': outcome['text_position']
+        }
+
+    def _synthesize_qex(self, rng: random.Random) -> Dict:
+        components = ['consumption_support', 'healthcare', 'assets', 'skills_training', 'savings', 'coaching',
+                      'social_empowerment']
+        return {
+            'study_id': None,
+            'program_name': "Mock Graduation Programme",
+            'country': rng.choice(['Malawi', 'Ethiopia', 'Peru', 'Bangladesh']),
+            'year_intervention_started': rng.randint(2005, 2020),
+            'evaluation_design': "Randomized Controlled Trial",
+            'sample_size_treatment': rng.randint(100, 2000),
+            'sample_size_control': rng.randint(100, 2000),
+            'graduation_components': {c: rng.choice(['Yes', 'No', 'Not mentioned']) for c in components},
+            'outcomes': [self._qex_outcome(i, rng) for i in range(self._n_outcomes(rng))]
+        }
+
+    def _synthesize_discovery(self, prompt: str, rng: random.Random) -> Dict:
+        numbers = self._table_numbers(prompt, r'(?:Table|Cuadro|Tabla)\s+([A-Z]?\d+)', after='<TEI') or ['1', '2']
+        tables = [{
+            'table_number': n,
+            'title': f"Mock table {n}",
+            'location': f"figure tab_{i}",
+            'xml_id': f"tab_{i}",
+            'has_structure': True,
+            'confidence': round(rng.uniform(0.7, 1.0), 2)
+        } for i, n in enumerate(numbers)]
+        return {
+            'tables_found': tables,
+            'total_tables_found': len(tables),
+            'table_numbers': numbers,
+            'warnings': [],
+            'summary': {'structured_tables': len(tables), 'paragraph_tables': 0, 'text_references_only': 0}
+        }
+
+    def _synthesize_filtering(self, prompt: str, rng: random.Random) -> Dict:
+        # Cross-paper batches give each table a "paper" ahead of its table_number
+        start = max(prompt.find('Tables to classify'), 0)
+        tables = list(dict.fromkeys(re.findall(r'"paper":\s*"([^"]+)",\s*"table_number":\s*"([^"]+)"',
+                                               prompt[start:])))
+        if not tables:
+            numbers = self._table_numbers(prompt, r'"table_number":\s*"([^"]+)"', after='Tables to classify', limit=100)
+            tables = [(None, n) for n in numbers]
+        classified = []
+        for paper, n in tables:
+            table = {'paper': paper} if paper is not None else {}
+            classified.append({
+                **table,
+                'table_number': n,
+                'classification': 'RESULTS' if rng.random() < 0.6 else 'DESCRIPTIVE',
+                'confidence': round(rng.uniform(0.6, 1.0), 2),
+                'reasoning': "Synthesized classification"
+            })
+        return {'tables_classified': classified}
+
+    def _synthesize_table_extraction(self, prompt: str, rng: random.Random) -> Dict:
+        numbers = self._table_numbers(prompt, r'- Table ([^:\n]+):', after='RESULTS tables to extract', limit=100) or ['1']
+        outcomes = []
+        tables = []
+        for n in numbers:
+            count = rng.randint(1, max(1, self.outcomes_range[1] // 2))
+            tables.append({'table_number': n, 'extraction_success': True, 'outcomes_found': count})
+            for i in range(count):
+                outcome = self._qex_outcome(i, rng)
+                outcome.update({'table_number': n, 'treatment_arm': "Treatment", 'subgroup': None,
+                                'confidence_interval': None, 'sample_size': None})
+                outcomes.append(outcome)
+        return {'tables_extracted': tables, 'outcomes': outcomes, 'total_outcomes_extracted': len(outcomes)}
+
+    def _synthesize_vision(self, prompt: str, rng: random.Random) -> Dict:
+        match = re.search(r'TABLES TO EXTRACT:\s*(.+)', prompt)
+        numbers = [n.strip() for n in match.group(1).split(',')] if match else []
+        return {'results_tables': [{
+            'table_number': n,
+            'page_number': rng.randint(1, 40),
+            'outcomes': [self._qex_outcome(i, rng) for i in range(rng.randint(1, 4))]
+        } for n in numbers if n]}
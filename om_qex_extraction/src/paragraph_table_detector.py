@@ -0,0 +1,234 @@
+"""
+Paragraph Table Detector - Tables that GROBID flattened into <p> text.
+Scores paragraphs on numeric-token density, parenthesized standard errors,
+significance stars and "Table N"/"Cuadro N" anchors, and rebuilds an
+approximate row/column structure, without an LLM call.
+"""
+
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+from .tei_document import TEIDocument
+
+# "Table 6:", "Annex Table A.5 cont.:", "Cuadro 3.", "TABLE III Impacts" (upper-case numerals) at
+# the start of a paragraph. The number must be followed by punctuation or a capital, so prose
+# like "Table 6 looks at the first period" is not a caption.
+ANCHOR_PATTERN = re.compile(
+    r'^\W{0,3}(?:(?:annex|appendix|anexo|supplementary)\s+)?(?:table|tabla|cuadro|tab\.)\s*'
+    r'([A-Z]?\.?\d+(?:\s*\.\s*\d+)*[a-z]?|(?-i:[IVXL]+))\b'
+    r'(?:\s*\((?:cont\.?|continued)\)|\s+cont\.?)?\s*(?:[:.|\-–](?!\d)\s*|(?=(?-i:[A-Z(\d]))|$)',
+    re.IGNORECASE
+)
+# Any mention of a numbered table (used to spot lists of tables)
+MENTION_PATTERN = re.compile(r'\b(?:table|tabla|cuadro)\s+([A-Z]?\d+(?:\.\d+)*)', re.IGNORECASE)
+
+_NUMBER = r'[-−–+]?[(\[]?[-−–+]?(?:\d[\d,]*\.?\d*|\.\d+)[)\]]?\**%?[,;]?'
+NUMBER_TOKEN = re.compile(f'^{_NUMBER}$')
+# The same tokens found in one scan of the text (whitespace-delimited, like str.split)
+NUMBER_TOKENS_IN_TEXT = re.compile(f'(?<!\\S){_NUMBER}(?!\\S)')
+SE_TOKEN = re.compile(r'^[(\[][-−–]?(?:\d[\d,]*)?\.\d+[)\]]\**[,;]?$')
+STAR_TOKEN = re.compile(r'\d\*{1,3}[)\]]?[,;]?$')
+COLUMN_HEADER_TOKEN = re.compile(r'^\(\d{1,2}\)$')
+
+# Function words: frequent in prose, rare inside tables
+STOPWORDS = frozenset(
+    'the of and to in is that we for this with as on are was were be by from which it not than '
+    'de la el los las en y que del por se con para una un'.split()
+)
+
+MIN_TOKENS = 8
+DEFAULT_HIGH_CONFIDENCE = 0.6
+DEFAULT_LOW_CONFIDENCE = 0.35
+
+
+def score_paragraph(text: str) -> Dict:
+    """
+    Likelihood that a paragraph is a flattened table.
+
+    Returns:
+        Dict with score (0-1) and the signals behind it
+    """
+    tokens = text.split()
+    if len(tokens) < MIN_TOKENS:
+        return {'score': 0.0, 'signals': {'tokens': len(tokens)}}
+
+    anchor = ANCHOR_PATTERN.match(text)
+    numbers = NUMBER_TOKENS_IN_TEXT.findall(text)
+    if not numbers and not anchor:
+        return {'score': 0.0, 'signals': {'tokens': len(tokens), 'numeric_density': 0.0}}
+
+    # Standard errors, starred coefficients and "(1)" headers are all numeric tokens
+    standard_errors = sum(1 for t in numbers if SE_TOKEN.match(t))
+    stars = sum(1 for t in numbers if STAR_TOKEN.search(t))
+    column_headers = sum(1 for t in numbers if COLUMN_HEADER_TOKEN.match(t))
+    stopword_ratio = sum(1 for t in text.lower().split() if t in STOPWORDS) / len(tokens)
+    mentions = set(MENTION_PATTERN.findall(text))
+    density = len(numbers) / len(tokens)
+
+    score = (0.5 * min(1.0, density / 0.35)
+             + 0.15 * min(1.0, standard_errors / 4)
+             + 0.15 * min(1.0, stars / 4)
+             + 0.1 * min(1.0, column_headers / 3)
+             + (0.25 if anchor else 0.0)
+             - max(0.0, stopword_ratio - 0.1))
+    if len(mentions) >= 3 and density < 0.5:
+        score -= 0.5  # A list of tables, not a table
+
+    return {
+        'score': round(max(0.0, min(1.0, score)), 3),
+        'signals': {
+            'tokens': len(tokens),
+            'numeric_density': round(density, 3),
+            'standard_errors': standard_errors,
+            'stars': stars,
+            'column_headers': column_headers,
+            'stopword_ratio': round(stopword_ratio, 3),
+            'anchor': anchor.group(1) if anchor else None,
+            'table_mentions': len(mentions)
+        }
+    }
+
+
+def rebuild_columns(text: str) -> Dict:
+    """
+    Approximate structure of a flattened table.
+
+    Words start a row label and numbers fill it: "Project 0.263*** (0.05)
+    4,408*** (512) Lump-sum ..." becomes rows of label, coefficients and
+    standard errors. Column count is the most common number of
+    coefficients per row (or the number of "(1) (2) ..." headers if larger).
+
+    Returns:
+        Dict with title, column_headers, rows and n_columns
+    """
+    anchor = ANCHOR_PATTERN.match(text)
+    tokens = text[anchor.end():].split() if anchor else text.split()
+
+    title = []
+    while tokens and len(title) < 15 and not NUMBER_TOKEN.match(tokens[0]) \
+            and not COLUMN_HEADER_TOKEN.match(tokens[0]):
+        title.append(tokens.pop(0))
+
+    column_headers = []
+    rows = []
+    label, values, errors = [], [], []
+    for token in tokens:
+        if COLUMN_HEADER_TOKEN.match(token) and not values:
+            column_headers.append(token)
+        elif SE_TOKEN.match(token):
+            errors.append(token)
+        elif NUMBER_TOKEN.match(token):
+            values.append(token)
+        else:
+            if values or errors:
+                rows.append({'label': ' '.join(label), 'values': values, 'standard_errors': errors})
+                label, values, errors = [], [], []
+            label.append(token)
+    if label or values or errors:
+        rows.append({'label': ' '.join(label), 'values': values, 'standard_errors': errors})
+
+    counts = Counter(len(r['values']) for r in rows if r['values'])
+    n_columns = max(counts.most_common(1)[0][0] if counts else 0, len(column_headers))
+    return {
+        'title': ' '.join(title).strip(' :.-|'),
+        'column_headers': column_headers,
+        'rows': rows,
+        'n_columns': n_columns
+    }
+
+
+def is_regular(structure: Dict) -> bool:
+    """At least three value rows, most of them as wide as the table (a real grid, not stray numbers)."""
+    value_rows = [r for r in structure['rows'] if r['values']]
+    if len(value_rows) < 3 or structure['n_columns'] < 2:
+        return False
+    full = sum(1 for r in value_rows if len(r['values']) == structure['n_columns'])
+    return full / len(value_rows) >= 0.5
+
+
+def detect_paragraph_tables(
+    document: TEIDocument,
+    high_confidence: float = DEFAULT_HIGH_CONFIDENCE,
+    low_confidence: float = DEFAULT_LOW_CONFIDENCE
+) -> List[Dict]:
+    """
+    Paragraph-embedded table candidates of a parsed TEI document.
+
+    Paragraphs inside top-level <figure> elements are skipped (they belong to
+    the structured table). A caption paragraph ("Table 6: Impact on savings")
+    lends its number and title to the numeric paragraph after it, and a
+    numeric paragraph directly after a numbered candidate continues it.
+
+    Args:
+        document: Parsed TEI document
+        high_confidence: Score at or above which a numbered candidate counts as a table
+            (candidates opening with their own caption count at any kept score)
+        low_confidence: Score below which a paragraph is dropped
+
+    Returns:
+        Candidates with xml_id, section_index, paragraph_index, table_number,
+        title, confidence, status ('table' or 'uncertain'), continuation,
+        signals and structure
+    """
+    candidates = []
+    for section in document.sections:
+        if section['tag'] == 'figure':
+            continue
+        pending_caption: Optional[Dict] = None
+        previous: Optional[Dict] = None
+        paragraph_ids = section.get('paragraph_ids') or [''] * len(section['paragraphs'])
+        for index, (text, xml_id) in enumerate(zip(section['paragraphs'], paragraph_ids)):
+            scored = score_paragraph(text)
+            anchor = ANCHOR_PATTERN.match(text)
+
+            if scored['score'] < low_confidence:
+                # A bare caption may introduce the next paragraph's numbers
+                pending_caption = {'number': anchor.group(1), 'title': text[anchor.end():].strip()} \
+                    if anchor and len(text.split()) <= 30 else None
+                previous = None
+                continue
+
+            structure = rebuild_columns(text)
+            confidence = scored['score']
+            if is_regular(structure):
+                confidence = min(1.0, confidence + 0.15)
+
+            number = re.sub(r'\s+', '', anchor.group(1)) if anchor else None
+            title = structure['title']
+            continuation = False
+            if number is None and pending_caption is not None:
+                number = re.sub(r'\s+', '', pending_caption['number'])
+                title = pending_caption['title'] or title
+            elif number is None and previous is not None and previous['table_number']:
+                number = previous['table_number']
+                title = previous['title']
+                continuation = True
+            pending_caption = None
+
+            candidate = {
+                'xml_id': xml_id or None,
+                'section_index': section['index'],
+                'paragraph_index': index,
+                'table_number': number,
+                'title': title[:150],
+                'confidence': round(confidence, 3),
+                'status': 'table' if number and (confidence >= high_confidence or anchor) else 'uncertain',
+                'continuation': continuation,
+                'signals': scored['signals'],
+                'structure': structure
+            }
+            candidates.append(candidate)
+            previous = candidate
+    return candidates
+
+
+def table_mentions(document: TEIDocument) -> Dict[str, int]:
+    """Table numbers mentioned in the body text (outside figures), with the first section mentioning each."""
+    mentioned = {}
+    for section in document.sections:
+        if section['tag'] == 'figure':
+            continue
+        for number in MENTION_PATTERN.findall(section['text']):
+            mentioned.setdefault(number, section['index'])
+    return mentioned
@@ -0,0 +1,94 @@
+"""
+Rate Limiter - Token-bucket limiter for LLM API calls.
+Shared across worker threads to cap requests/minute and tokens/minute.
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Thread-safe token-bucket limiter for requests per minute and tokens per minute."""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        """
+        Initialize the limiter. A limit of None (or 0) disables that bucket.
+
+        Args:
+            requests_per_minute: Maximum API requests per minute
+            tokens_per_minute: Maximum (estimated) tokens per minute
+        """
+        self.requests_per_minute = requests_per_minute or None
+        self.tokens_per_minute = tokens_per_minute or None
+
+        # Buckets start full so the first burst is not delayed
+        self._request_allowance = float(self.requests_per_minute or 0)
+        self._token_allowance = float(self.tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """True if at least one limit is configured."""
+        return bool(self.requests_per_minute or self.tokens_per_minute)
+
+    def _refill(self):
+        """Top up both buckets for the time elapsed since the last refill (lock must be held)."""
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+
+        if self.requests_per_minute:
+            self._request_allowance = min(
+                float(self.requests_per_minute),
+                self._request_allowance + elapsed * self.requests_per_minute / 60.0
+            )
+        if self.tokens_per_minute:
+            self._token_allowance = min(
+                float(self.tokens_per_minute),
+                self._token_allowance + elapsed * self.tokens_per_minute / 60.0
+            )
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until one request carrying `tokens` tokens may be sent.
+
+        Args:
+            tokens: Estimated tokens for the request (prompt + completion)
+
+        Returns:
+            Total seconds spent waiting
+        """
+        if not self.enabled:
+            return 0.0
+
+        # A single request larger than the whole bucket would never fit
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+
+                wait_time = 0.0
+                if self.requests_per_minute and self._request_allowance < 1:
+                    wait_time = max(wait_time, (1 - self._request_allowance) * 60.0 / self.requests_per_minute)
+                if self.tokens_per_minute and self._token_allowance < tokens:
+                    wait_time = max(wait_time, (tokens - self._token_allowance) * 60.0 / self.tokens_per_minute)
+
+                if wait_time <= 0:
+                    if self.requests_per_minute:
+                        self._request_allowance -= 1
+                    if self.tokens_per_minute:
+                        self._token_allowance -= tokens
+                    if waited > 0:
+                        logger.debug(f"Rate limiter released request after {waited:.1f}s")
+                    return waited
+
+            time.sleep(wait_time)
+            waited += wait_time
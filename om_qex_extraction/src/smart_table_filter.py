@@ -9,8 +9,14 @@ Uses three signals:
 
 import re
 import json
+from bisect import bisect_left
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Dict, Optional, Tuple
+
+from .table_extractor import TABLE_REFERENCE_PATTERN
+
+if TYPE_CHECKING:
+    from .corpus_store import CorpusStore
 
 
 # Keywords for identifying results tables
@@ -19,20 +25,20 @@ RESULT_KEYWORDS = [
     'impact', 'effect', 'estimate', 'result', 'outcome', 'coefficient',
     'treatment', 'intervention', 'program',
     
-    # Statistical terms
-    'regression', 'ols', 'fixed effect', 'difference-in-difference', 'did',
-    'iv', 'instrumental variable', 'rct', 'randomized',
+    # Statistical terms (acronyms in capitals are matched case-sensitively)
+    'regression', 'OLS', 'fixed effect', 'difference-in-difference', 'DID', 'DiD',
+    'IV', 'instrumental variable', 'RCT', 'randomized',
     
     # Quasi-experimental methods
-    'rdd', 'regression discontinuity', 'propensity score', 'psm', 'matching',
-    'synthetic control', 'interrupted time series', 'its',
+    'RDD', 'regression discontinuity', 'propensity score', 'PSM', 'matching',
+    'synthetic control', 'interrupted time series', 'ITS',
     'difference in differences', 'difindif', 'panel data',
     
     # Model types
     'model', 'models', 'specification', 'estimation',
     'logit', 'probit', 'tobit', 'poisson', 'negative binomial',
-    'fixed effects', 'random effects', 'gls', 'gmm',
-    '2sls', 'two stage', 'control function',
+    'fixed effects', 'random effects', 'GLS', 'GMM',
+    '2SLS', 'two stage', 'control function',
     
     # Randomized trials
     'randomized controlled trial', 'randomized control trial',
@@ -67,6 +73,102 @@ STATISTICAL_HEADERS = [
     '(1)', '(2)', '(3)', '(4)', '(5)', '(6)', '(7)', '(8)'
 ]
 
+FIGURE_KEYWORDS = ['figure', 'fig.', 'fig', 'chart', 'graph', 'diagram', 'plot']
+
+# Keywords this short must be whole words ('b', 'se', 'ci', 'sig'); longer
+# ones are word prefixes, so 'impact' also matches 'impacts'
+_WHOLE_WORD_MAX_LENGTH = 3
+
+
+class KeywordMatcher:
+    """
+    A keyword list compiled once into a single regex.
+    
+    Keywords are merged into a prefix trie, so each text position is tried
+    against one branch per character rather than against every keyword.
+    Matches respect word boundaries: a keyword never matches inside a word
+    ('did' in 'candidate', 'graph' in 'paragraph'), short keywords must be
+    whole words, runs of symbols must be whole runs ('*' does not match
+    '***'), and keywords written with capitals (acronyms such as 'ITS')
+    are matched case-sensitively.
+    """
+    
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = list(dict.fromkeys(k.strip() for k in keywords if k.strip()))
+        # Case-sensitive keywords by their exact text, the rest lowercased
+        self._canonical = {k if k != k.lower() else k.lower(): k for k in self.keywords}
+        
+        groups: Dict[Tuple[bool, str], List[str]] = {}
+        for keyword in self.keywords:
+            case_sensitive = keyword != keyword.lower()
+            groups.setdefault((case_sensitive, self._left_boundary(keyword)), []).append(keyword)
+        
+        alternatives = []
+        for (case_sensitive, left), members in groups.items():
+            trie = self._trie_pattern({k: self._right_boundary(k) for k in members})
+            alternatives.append(f"{left}(?-i:{trie})" if case_sensitive else f"{left}(?:{trie})")
+        self.pattern = re.compile('|'.join(alternatives) or r'(?!)', re.IGNORECASE)
+    
+    @staticmethod
+    def _left_boundary(keyword: str) -> str:
+        if keyword[0].isalnum():
+            return r'(?<![^\W_])'
+        if len(set(keyword)) == 1:
+            return f"(?<!{re.escape(keyword[0])})"
+        return ''
+    
+    @staticmethod
+    def _right_boundary(keyword: str) -> str:
+        if keyword[-1].isalnum():
+            return r'(?![^\W_])' if len(keyword) <= _WHOLE_WORD_MAX_LENGTH else ''
+        if len(set(keyword)) == 1:
+            return f"(?!{re.escape(keyword[-1])})"
+        return ''
+    
+    @classmethod
+    def _trie_pattern(cls, keywords: Dict[str, str]) -> str:
+        """Regex for {keyword: right boundary}, longest alternatives first."""
+        trie: Dict = {}
+        for keyword, boundary in keywords.items():
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = boundary  # Terminal
+        return cls._node_pattern(trie)
+    
+    @classmethod
+    def _node_pattern(cls, node: Dict) -> str:
+        branches = [re.escape(char) + cls._node_pattern(child)
+                    for char, child in sorted(node.items()) if char != '']
+        if '' in node:
+            branches.append(node[''])  # Ending here comes after every longer match
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+    
+    def finditer(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        """(keyword, start, end) of every hit, in one pass over the text."""
+        for match in self.pattern.finditer(text or ''):
+            found = match.group()
+            yield self._canonical.get(found) or self._canonical[found.lower()], match.start(), match.end()
+    
+    def hits(self, text: str) -> List[Tuple[str, int, int]]:
+        return list(self.finditer(text))
+    
+    def first(self, text: str) -> Optional[str]:
+        """First keyword found in the text, or None."""
+        return next((keyword for keyword, _, _ in self.finditer(text)), None)
+    
+    def count(self, text: str) -> int:
+        """Number of distinct keywords found in the text."""
+        return len({keyword for keyword, _, _ in self.finditer(text)})
+
+
+RESULT_MATCHER = KeywordMatcher(RESULT_KEYWORDS)
+DESCRIPTIVE_MATCHER = KeywordMatcher(DESCRIPTIVE_KEYWORDS)
+STATISTICAL_MATCHER = KeywordMatcher(STATISTICAL_HEADERS)
+FIGURE_MATCHER = KeywordMatcher(FIGURE_KEYWORDS)
+
 
 def score_table_caption(caption: str) -> Tuple[float, str]:
     """
@@ -78,21 +180,18 @@ def score_table_caption(caption: str) -> Tuple[float, str]:
     if not caption:
         return (0.5, "No caption")
     
-    caption_lower = caption.lower()
-    
     # CRITICAL: Filter out figures/charts (they are NOT tables)
-    figure_keywords = ['figure', 'fig.', 'fig ', 'chart', 'graph', 'diagram', 'plot']
-    for keyword in figure_keywords:
-        if keyword in caption_lower:
-            return (-999, f"FIGURE/CHART detected: '{keyword}' - NOT A TABLE")
+    keyword = FIGURE_MATCHER.first(caption)
+    if keyword:
+        return (-999, f"FIGURE/CHART detected: '{keyword}' - NOT A TABLE")
     
     # Strong negative signals
-    for keyword in DESCRIPTIVE_KEYWORDS:
-        if keyword in caption_lower:
-            return (0.1, f"Descriptive keyword: '{keyword}'")
+    keyword = DESCRIPTIVE_MATCHER.first(caption)
+    if keyword:
+        return (0.1, f"Descriptive keyword: '{keyword}'")
     
     # Positive signals
-    result_matches = sum(1 for kw in RESULT_KEYWORDS if kw in caption_lower)
+    result_matches = RESULT_MATCHER.count(caption)
     
     if result_matches >= 2:
         return (0.9, f"Strong result indicators ({result_matches} keywords)")
@@ -113,13 +212,10 @@ def score_table_headers(rows: List[Dict]) -> Tuple[float, str]:
         return (0.5, "Insufficient rows")
     
     # Get first 3 rows (usually contain headers)
-    header_text = ""
-    for row in rows[:3]:
-        for cell in row.get('cells', []):
-            header_text += " " + cell.get('text', '').lower()
+    header_text = " ".join(cell.get('text', '') for row in rows[:3] for cell in row.get('cells', []))
     
     # Count statistical indicators
-    stat_matches = sum(1 for indicator in STATISTICAL_HEADERS if indicator in header_text)
+    stat_matches = STATISTICAL_MATCHER.count(header_text)
     
     # Check for numbered columns (1), (2), etc.
     numbered_cols = len(re.findall(r'\(\d+\)', header_text))
@@ -132,56 +228,110 @@ def score_table_headers(rows: List[Dict]) -> Tuple[float, str]:
         return (0.3, "No statistical indicators")
 
 
-def find_table_references_in_text(text: str, table_number: int) -> Tuple[float, str]:
+# Characters of text on each side of a table reference that are checked for result keywords
+REFERENCE_CONTEXT_CHARS = 500
+
+
+class TableReferences:
+    """
+    Every "Table N" / "Tab. N" / "Cuadro N" reference in a paper, found in one pass.
+    
+    References are bucketed by normalized table number ("10" is never a
+    reference to table 1). Their context windows are merged and swept once
+    for result keywords, so each character near a reference is scanned
+    once per paper and scoring any number of tables costs no further scans.
+    """
+    
+    def __init__(self, text: str, context_chars: int = REFERENCE_CONTEXT_CHARS):
+        self.text = text or ''
+        self.context_chars = context_chars
+        
+        found = []
+        for match in TABLE_REFERENCE_PATTERN.finditer(self.text):
+            start = max(0, match.start() - context_chars)
+            end = min(len(self.text), match.end() + context_chars)
+            found.append((self.normalize(match.group(1)), start, end))
+        
+        # Windows come in text order: sweep each run of overlapping ones once
+        keyword_starts = []
+        sweep_start = sweep_end = 0
+        for _, start, end in found + [(None, len(self.text) + 1, 0)]:
+            if start > sweep_end:
+                if sweep_end > sweep_start:
+                    keyword_starts.extend(match.start() for match in
+                                          RESULT_MATCHER.pattern.finditer(self.text, sweep_start, sweep_end))
+                sweep_start = start
+            sweep_end = max(sweep_end, end)
+        
+        # {table number: [(window start, window end, result keyword in window)]}
+        self.references: Dict[str, List[Tuple[int, int, bool]]] = {}
+        for number, start, end in found:
+            index = bisect_left(keyword_starts, start)
+            near_results = index < len(keyword_starts) and keyword_starts[index] < end
+            self.references.setdefault(number, []).append((start, end, near_results))
+    
+    @staticmethod
+    def normalize(table_number) -> str:
+        return re.sub(r'\s+', '', str(table_number)).upper()
+    
+    def windows(self, table_number) -> List[Tuple[int, int]]:
+        """(start, end) of the context window around each reference to a table."""
+        return [(start, end) for start, end, _ in self.references.get(self.normalize(table_number), [])]
+    
+    def contexts(self, table_number) -> List[str]:
+        return [self.text[start:end] for start, end in self.windows(table_number)]
+    
+    def score(self, table_number) -> Tuple[float, str]:
+        """
+        Check if a table is referenced near outcome/result keywords.
+        
+        Returns:
+            (score, reason) - score from 0-1, reason for classification
+        """
+        if not self.text:
+            return (0.5, "No text available")
+        
+        references = self.references.get(self.normalize(table_number), [])
+        if not references:
+            return (0.5, f"Table {table_number} not referenced in text")
+        
+        # Check if any reference is near result keywords
+        result_nearby = sum(1 for _, _, near_results in references if near_results)
+        
+        if result_nearby >= len(references) * 0.5:  # Majority of refs near results
+            return (0.8, f"{result_nearby}/{len(references)} references near result keywords")
+        elif result_nearby > 0:
+            return (0.6, f"{result_nearby}/{len(references)} references near result keywords")
+        else:
+            return (0.4, "Table referenced but not near result keywords")
+
+
+def find_table_references_in_text(
+    text: str,
+    table_number,
+    references: Optional[TableReferences] = None
+) -> Tuple[float, str]:
     """
     Check if table is referenced near outcome/result keywords in text.
     
+    Args:
+        text: Full paper text
+        table_number: Table number ("3", "A2", "1.1")
+        references: The paper's TableReferences (scanned here if not given;
+            pass one when scoring several tables of the same paper)
+    
     Returns:
         (score, reason) - score from 0-1, reason for classification
     """
-    if not text:
-        return (0.5, "No text available")
-    
-    text_lower = text.lower()
-    
-    # Find all references to this table
-    patterns = [
-        f'table {table_number}',
-        f'table{table_number}',
-        f'tab. {table_number}',
-        f'tab {table_number}'
-    ]
-    
-    references = []
-    for pattern in patterns:
-        for match in re.finditer(pattern, text_lower):
-            # Get context (500 chars before and after)
-            start = max(0, match.start() - 500)
-            end = min(len(text_lower), match.end() + 500)
-            context = text_lower[start:end]
-            references.append(context)
-    
-    if not references:
-        return (0.5, f"Table {table_number} not referenced in text")
-    
-    # Check if any reference is near result keywords
-    result_nearby = 0
-    for context in references:
-        nearby_keywords = sum(1 for kw in RESULT_KEYWORDS if kw in context)
-        if nearby_keywords > 0:
-            result_nearby += 1
-    
-    if result_nearby >= len(references) * 0.5:  # Majority of refs near results
-        return (0.8, f"{result_nearby}/{len(references)} references near result keywords")
-    elif result_nearby > 0:
-        return (0.6, f"{result_nearby}/{len(references)} references near result keywords")
-    else:
-        return (0.4, "Table referenced but not near result keywords")
+    if references is None:
+        references = TableReferences(text)
+    return references.score(table_number)
 
 
 def classify_table(
     table_json: Dict,
-    full_text: Optional[str] = None
+    full_text: Optional[str] = None,
+    references: Optional[TableReferences] = None
 ) -> Tuple[bool, float, Dict[str, Tuple[float, str]]]:
     """
     Classify a table as results vs descriptive.
@@ -189,6 +339,7 @@ def classify_table(
     Args:
         table_json: Table JSON with caption, rows, table_number
         full_text: Full paper text (optional, for context analysis)
+        references: TableReferences of full_text, shared by all tables of the paper
     
     Returns:
         (is_results_table, confidence_score, signal_details)
@@ -213,7 +364,7 @@ def classify_table(
     
     # Add text context if available
     if full_text:
-        text_score, text_reason = find_table_references_in_text(full_text, table_number)
+        text_score, text_reason = find_table_references_in_text(full_text, table_number, references)
         signals['text_context'] = (text_score, text_reason)
         
         # Weighted average (text context is less reliable)
@@ -233,7 +384,8 @@ def filter_results_tables(
     tables_dir: Path,
     text_dir: Path,
     key: str,
-    verbose: bool = False
+    verbose: bool = False,
+    store: Optional["CorpusStore"] = None
 ) -> List[Dict]:
     """
     Load all tables for a paper and filter to results tables only.
@@ -243,18 +395,23 @@ def filter_results_tables(
         text_dir: Directory containing full text files
         key: Paper key (e.g., 'PHRKN65M')
         verbose: Print classification details
+        store: Packed corpus of the text files (read instead of text_dir when it has the key)
     
     Returns:
         List of classified tables with metadata
     """
     # Load full text
-    text_file = text_dir / f"{key}.txt"
     full_text = None
-    if text_file.exists():
-        full_text = text_file.read_text(encoding='utf-8')
+    if store is not None and key in store:
+        full_text = store.text(key)
+    else:
+        text_file = text_dir / f"{key}.txt"
+        if text_file.exists():
+            full_text = text_file.read_text(encoding='utf-8')
     
     # Find all tables for this paper
     table_files = sorted(tables_dir.glob(f"{key}_table_*.json"))
+    references = TableReferences(full_text) if full_text else None
     
     results_tables = []
     
@@ -262,7 +419,7 @@ def filter_results_tables(
         with open(table_file, 'r', encoding='utf-8') as f:
             table_json = json.load(f)
         
-        is_results, score, signals = classify_table(table_json, full_text)
+        is_results, score, signals = classify_table(table_json, full_text, references)
         
         table_info = {
             'file': table_file.name,
@@ -0,0 +1,208 @@
+"""
+Span Map - Character spans of TEIParser text back to their TEI elements.
+Every emitted paragraph, head, caption and table cell is a segment; offsets
+resolve to segments by binary search, and extracted outcomes (literal_text,
+text_position) resolve to the span they were taken from.
+
+Offset, xml:id and table row lookups use indexes built once per map
+(O(log n) or O(1)); locating a literal_text is a search of the text, linear
+in the paper's length.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional
+
+# "Table 10, Row 'Total consumption'", "Table A2, row: Savings, Column (3)"
+_POSITION_TABLE = re.compile(r'\b(?:table|tabla|cuadro)\s*([A-Z]?\d+(?:\.\d+)*)', re.IGNORECASE)
+_POSITION_ROW = re.compile(r'\brow\s*:?\s*(?:[\'"“‘]([^\'"”’]+)[\'"”’]|([^,;]+))', re.IGNORECASE)
+_POSITION_COLUMN = re.compile(r'\bcol(?:umn)?\s*:?\s*\(?(\d+)\)?', re.IGNORECASE)
+_LITERAL_SEPARATOR = re.compile(r'[\s|]+')
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+class SpanMap:
+    """
+    Text plus the element behind each of its segments.
+
+    Segments are added in text order and never overlap; the characters
+    between them (joins, "ABSTRACT:" / "FULL TEXT:" markers) belong to no
+    element.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.elements: List[Dict] = []
+        self._parts: List[str] = []
+        self._length = 0
+        # Built on first use: xml:id -> first segment, and per table number the row labels and cells
+        self._ids: Optional[Dict[str, int]] = None
+        self._tables: Optional[Dict[str, Dict]] = None
+
+    # ------------------------------------------------------------------
+    # Building (used by TEIParser)
+    # ------------------------------------------------------------------
+
+    def emit(self, text: str, element: Optional[Dict] = None):
+        """Append text; with an element, the text becomes that element's segment."""
+        if element is not None and text:
+            self.starts.append(self._length)
+            self.ends.append(self._length + len(text))
+            self.elements.append(element)
+        self._parts.append(text)
+        self._length += len(text)
+
+    def finish(self) -> "SpanMap":
+        self.text = ''.join(self._parts)
+        self._parts = []
+        self._ids = self._tables = None
+        return self
+
+    def _build_index(self):
+        """xml:id and table indexes, in one pass over the segments."""
+        self._ids = {}
+        self._tables = {}
+        for index, element in enumerate(self.elements):
+            xml_id = element.get('xml_id')
+            if xml_id:
+                self._ids.setdefault(xml_id, index)
+            if element['kind'] != 'cell' or element.get('table_number') is None:
+                continue
+            table = self._tables.setdefault(str(element['table_number']), {'labels': {}, 'cells': {}})
+            table['cells'][(element['figure_id'], element['row'], element['col'])] = index
+            if element['col'] == 0:
+                label = _normalize(self.text[self.starts[index]:self.ends[index]])
+                table['labels'].setdefault(label, index)  # First row with this label
+        for table in self._tables.values():
+            # (label, segment) sorted by label, for prefix lookups by binary search
+            table['sorted'] = sorted(table['labels'].items())
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def segment(self, index: int) -> Dict:
+        """Element of a segment plus its start/end offsets and text."""
+        return {
+            **self.elements[index],
+            'start': self.starts[index],
+            'end': self.ends[index],
+            'text': self.text[self.starts[index]:self.ends[index]]
+        }
+
+    def element_at(self, offset: int) -> Optional[Dict]:
+        """Segment containing a character offset (binary search), or None for joins and markers."""
+        index = bisect_right(self.starts, offset) - 1
+        if index < 0 or offset >= self.ends[index]:
+            return None
+        return self.segment(index)
+
+    def elements_between(self, start: int, end: int) -> List[Dict]:
+        """Segments overlapping [start, end), in text order."""
+        first = max(0, bisect_right(self.starts, start) - 1)
+        last = bisect_right(self.starts, max(start, end - 1))
+        return [self.segment(i) for i in range(first, last) if self.ends[i] > start]
+
+    def find_element(self, xml_id: str) -> Optional[Dict]:
+        """First segment of an element with this xml:id (dictionary lookup)."""
+        if self._ids is None:
+            self._build_index()
+        index = self._ids.get(xml_id)
+        return self.segment(index) if index is not None else None
+
+    def locate(self, literal: str) -> Optional[Dict]:
+        """
+        Span of a literal text: an exact match first, then a match that
+        ignores case and treats runs of whitespace and "|" cell separators
+        as equal (so "Treatment | 0.26** (0.05)" matches across table cells).
+        Both are searches of the whole text (linear in its length).
+
+        Returns:
+            Dict with start, end and match ('exact' or 'flexible'), or None
+        """
+        literal = (literal or '').strip()
+        if not literal:
+            return None
+        start = self.text.find(literal)
+        if start != -1:
+            return {'start': start, 'end': start + len(literal), 'match': 'exact'}
+        tokens = [t for t in _LITERAL_SEPARATOR.split(literal) if t]
+        if not tokens:
+            return None
+        pattern = re.compile(r'[\s|]+'.join(re.escape(t) for t in tokens), re.IGNORECASE)
+        match = pattern.search(self.text)
+        if match:
+            return {'start': match.start(), 'end': match.end(), 'match': 'flexible'}
+        return None
+
+    def table_cell(self, table_number: str, row_label: str, column: Optional[int] = None) -> Optional[Dict]:
+        """
+        Cell of a table row whose label (first cell) matches `row_label`:
+        the given column, else the label cell itself. The label is matched
+        exactly, else as a prefix (first such row in the text), by lookups
+        in the table's row-label index.
+        """
+        if self._tables is None:
+            self._build_index()
+        table = self._tables.get(str(table_number))
+        if table is None:
+            return None
+
+        label = _normalize(row_label)
+        label_index = table['labels'].get(label)
+        if label_index is None:
+            ordered = table['sorted']
+            position = bisect_left(ordered, (label,))
+            candidates = []
+            while position < len(ordered) and ordered[position][0].startswith(label):
+                candidates.append(ordered[position][1])
+                position += 1
+            if not candidates:
+                return None
+            label_index = min(candidates)
+        if column is not None:
+            element = self.elements[label_index]
+            index = table['cells'].get((element['figure_id'], element['row'], column))
+            if index is not None:
+                return self.segment(index)
+        return self.segment(label_index)
+
+    def resolve(self, outcome: Dict) -> Optional[Dict]:
+        """
+        Where an extracted outcome came from.
+
+        literal_text is located in the text first; failing that,
+        text_position ("Table 10, Row 'Total consumption'") is resolved to
+        the named table row (and column, if given).
+
+        Returns:
+            Dict with start, end, method ('literal_exact', 'literal_flexible'
+            or 'text_position') and elements (the segments in the span), or None
+        """
+        found = self.locate(str(outcome.get('literal_text') or ''))
+        if found is not None:
+            return {
+                'start': found['start'],
+                'end': found['end'],
+                'method': f"literal_{found['match']}",
+                'elements': self.elements_between(found['start'], found['end'])
+            }
+
+        position = str(outcome.get('text_position') or '')
+        table = _POSITION_TABLE.search(position)
+        row = _POSITION_ROW.search(position)
+        if table and row:
+            column = _POSITION_COLUMN.search(position)
+            cell = self.table_cell(table.group(1), (row.group(1) or row.group(2)).strip(),
+                                   int(column.group(1)) if column else None)
+            if cell is not None:
+                return {'start': cell['start'], 'end': cell['end'], 'method': 'text_position', 'elements': [cell]}
+        return None
@@ -0,0 +1,123 @@
+"""
+Incremental JSON parsing for streamed LLM responses.
+Yields each complete element of the "outcomes" array as soon as it arrives.
+Truncated responses are repaired by llm_json.parse_llm_json.
+"""
+
+import json
+import re
+from typing import Dict, List, Optional
+
+
+class OutcomeStreamParser:
+    """
+    Single-pass, string-aware scanner over a growing JSON response.
+
+    Text is fed chunk by chunk; the parser tracks bracket depth and string
+    state, so each character is examined exactly once regardless of how
+    many chunks arrive.
+    """
+
+    def __init__(self, field: str = "outcomes"):
+        """
+        Args:
+            field: Name of the array whose elements should be yielded
+        """
+        self.field = field
+        self._field_pattern = re.compile(r'"' + re.escape(field) + r'"\s*:\s*$')
+
+        self.outcomes: List[Dict] = []
+
+        self._chunks: List[str] = []
+        self._joined = ""
+        self._pos = 0                  # Number of characters scanned
+        self._doc_start: Optional[int] = None
+        self._stack: List[str] = []    # Open brackets
+        self._in_string = False
+        self._escape = False
+
+        self._array_depth: Optional[int] = None   # Stack depth inside the target array
+        self._element_start: Optional[int] = None
+        self._array_done = False
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """
+        Add text and return any outcome objects completed by it.
+
+        Args:
+            chunk: Next piece of the response text
+
+        Returns:
+            Newly completed outcome dictionaries (possibly empty)
+        """
+        self._chunks.append(chunk)
+        completed = []
+        offset = self._pos
+
+        for i, ch in enumerate(chunk):
+            pos = offset + i
+
+            if self._doc_start is None:
+                # Skip markdown fences or prose before the JSON document
+                if ch == '{':
+                    self._doc_start = pos
+                    self._stack.append(ch)
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                if (ch == '[' and len(self._stack) == 1 and self._array_depth is None and not self._array_done
+                        and self._field_pattern.search(self.buffer, max(self._doc_start, pos - len(self.field) - 64), pos)):
+                    self._stack.append(ch)
+                    self._array_depth = len(self._stack)
+                    continue
+                if ch == '{' and self._array_depth is not None and len(self._stack) == self._array_depth:
+                    self._element_start = pos
+                self._stack.append(ch)
+            elif ch in '}]':
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                depth = len(self._stack)
+
+                if self._array_depth is not None:
+                    if ch == '}' and depth == self._array_depth and self._element_start is not None:
+                        element = self._decode(self.buffer[self._element_start:pos + 1])
+                        if element is not None:
+                            self.outcomes.append(element)
+                            completed.append(element)
+                        self._element_start = None
+                    elif ch == ']' and depth == self._array_depth - 1:
+                        self._array_depth = None
+                        self._array_done = True
+
+        self._pos = offset + len(chunk)
+        return completed
+
+    @property
+    def buffer(self) -> str:
+        """All text fed so far (joined lazily, so feeding many small chunks stays linear)."""
+        if len(self._chunks) > 1:
+            self._joined = ''.join(self._chunks)
+            self._chunks = [self._joined]
+        elif self._chunks:
+            self._joined = self._chunks[0]
+        return self._joined
+
+    @staticmethod
+    def _decode(text: str) -> Optional[Dict]:
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        return value if isinstance(value, dict) else None
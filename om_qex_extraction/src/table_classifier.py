@@ -0,0 +1,595 @@
+"""
+Table Classifier - smart_table_filter at corpus scale.
+Every table becomes one row of a NumPy feature matrix (signal scores,
+keyword hits, numbered columns, star density, numeric cells, reference
+counts); the whole matrix is scored in one operation with weights loaded
+from JSON, so the classifier can be retuned without code changes.
+Logistic weights are fitted on the table labels saved by V2 Phase 2.
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .smart_table_filter import (
+    DESCRIPTIVE_MATCHER, RESULT_MATCHER, STATISTICAL_MATCHER,
+    TableReferences, score_table_caption, score_table_headers
+)
+from .table_extractor import extract_tables
+from .tei_document import TEIDocument
+
+if TYPE_CHECKING:
+    from .corpus_store import CorpusStore
+    from .doc_cache import DocumentCache
+
+# Feature matrix columns, in order. text_score is NaN when the paper has no text
+FEATURES = [
+    'caption_score',             # score_table_caption (0 for figures)
+    'header_score',              # score_table_headers
+    'text_score',                # TableReferences.score
+    'is_figure',
+    'caption_result_hits',       # Distinct result keywords in the caption
+    'caption_descriptive_hits',  # Distinct descriptive keywords in the caption
+    'header_stat_hits',          # Distinct statistical indicators in the first 3 rows
+    'numbered_columns',          # "(1)", "(2)", ... header cells
+    'star_density',              # Share of non-empty cells with significance stars
+    'numeric_ratio',             # Share of non-empty cells that are numbers
+    'n_rows',
+    'n_cols',
+    'references',                # References to the table in the text
+    'references_near_results'    # ... with a result keyword in their context window
+]
+
+# smart_table_filter.classify_table: 0.4/0.4/0.2 weighted average, threshold 0.55
+DEFAULT_WEIGHTS = {
+    'kind': 'weighted',
+    'weights': {'caption_score': 0.4, 'header_score': 0.4, 'text_score': 0.2},
+    'bias': 0.0,
+    'threshold': 0.55
+}
+
+# Scores within this of the threshold count as reaching it (float summation order)
+_THRESHOLD_TOLERANCE = 1e-9
+
+_NUMBERED_COLUMN = re.compile(r'\(\d+\)')
+_NUMERIC_CELL = re.compile(r'[-+−–]?[$€£]?[(\[]?[-+−–]?(?:\d[\d,]*)?\.?\d+[)\]]?%?\**[a-c]?\**')
+
+
+def _flatten_cells(table_json: Dict) -> List[str]:
+    """Non-empty cell texts of a table (grid if present, else rows)."""
+    grid = table_json.get('cells')
+    if grid:
+        texts = [cell for row in grid for cell in row]
+    else:
+        texts = [cell.get('text', '') for row in table_json.get('rows', []) for cell in row.get('cells', [])]
+    return [text.strip() for text in texts if text and text.strip()]
+
+
+def table_features(
+    table_json: Dict,
+    references: Optional[TableReferences] = None
+) -> Dict[str, float]:
+    """
+    Feature values of one table (one row of the feature matrix).
+
+    Args:
+        table_json: Table JSON with caption, rows, table_number
+        references: TableReferences of the paper's full text (None: no text)
+    """
+    caption = table_json.get('caption', '')
+    rows = table_json.get('rows', [])
+    table_number = table_json.get('table_number', 0)
+
+    caption_score, _ = score_table_caption(caption)
+    is_figure = caption_score == -999
+    header_score, _ = score_table_headers(rows)
+    header_cells = [cell.get('text', '').strip() for row in rows[:3] for cell in row.get('cells', [])]
+
+    cells = _flatten_cells(table_json)
+    n_cells = len(cells)
+
+    if references is not None and references.text:
+        text_score, _ = references.score(table_number)
+        table_references = references.references.get(references.normalize(table_number), [])
+    else:
+        text_score, table_references = float('nan'), []
+
+    return {
+        'caption_score': 0.0 if is_figure else caption_score,
+        'header_score': header_score,
+        'text_score': text_score,
+        'is_figure': float(is_figure),
+        'caption_result_hits': RESULT_MATCHER.count(caption),
+        'caption_descriptive_hits': DESCRIPTIVE_MATCHER.count(caption),
+        'header_stat_hits': STATISTICAL_MATCHER.count(' '.join(header_cells)),
+        'numbered_columns': sum(1 for text in header_cells if _NUMBERED_COLUMN.fullmatch(text)),
+        'star_density': sum(1 for text in cells if '*' in text) / n_cells if n_cells else 0.0,
+        'numeric_ratio': sum(1 for text in cells if _NUMERIC_CELL.fullmatch(text)) / n_cells if n_cells else 0.0,
+        'n_rows': table_json.get('n_rows', len(rows)),
+        'n_cols': table_json.get('n_cols', max((len(row.get('cells', [])) for row in rows), default=0)),
+        'references': len(table_references),
+        'references_near_results': sum(1 for _, _, near_results in table_references if near_results)
+    }
+
+
+def feature_matrix(
+    papers: Iterable[Tuple[str, List[Dict], Optional[str]]]
+) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Feature matrix of every table in a corpus.
+
+    Args:
+        papers: (key, table JSONs, full text or None) per paper, e.g. from load_corpus_tables()
+
+    Returns:
+        (matrix of shape (tables, len(FEATURES)), DataFrame identifying each row:
+        key, table_number, table_index, caption)
+    """
+    values = []
+    index = []
+    for key, tables, full_text in papers:
+        references = TableReferences(full_text) if full_text else None
+        for table in tables:
+            features = table_features(table, references)
+            values.append([features[name] for name in FEATURES])
+            index.append({
+                'key': key,
+                'table_number': table.get('table_number'),
+                'table_index': table.get('table_index'),
+                'caption': table.get('caption', '')
+            })
+    matrix = np.array(values, dtype=float).reshape(len(values), len(FEATURES))
+    return matrix, pd.DataFrame(index, columns=['key', 'table_number', 'table_index', 'caption'])
+
+
+class TableClassifier:
+    """
+    Scores a feature matrix with weights from JSON.
+
+    Weight files:
+        {"kind": "weighted", "weights": {feature: weight}, "bias": 0.0, "threshold": 0.55}
+            Weighted average of the features present in each row (a NaN
+            feature's weight is left out, as classify_table does without text)
+        {"kind": "logistic", "weights": {...}, "bias": b, "threshold": t,
+         "mean": {feature: m}, "scale": {feature: s}}
+            sigmoid(bias + sum(weight * (x - mean) / scale)); NaN features
+            count as the mean
+
+    Features missing from "weights" get weight 0. Figures are never results.
+    """
+
+    KINDS = ('weighted', 'logistic')
+
+    def __init__(self, model: Optional[Dict] = None):
+        """
+        Raises:
+            ValueError: If the kind or a feature name is unknown
+        """
+        self.model = dict(model or DEFAULT_WEIGHTS)
+        self.kind = self.model.get('kind', 'weighted')
+        if self.kind not in self.KINDS:
+            raise ValueError(f"Unknown classifier kind '{self.kind}' (expected one of {', '.join(self.KINDS)})")
+        unknown = set(self.model.get('weights', {})) - set(FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown features in classifier weights: {', '.join(sorted(unknown))}")
+
+        self.weights = self._vector(self.model.get('weights', {}), 0.0)
+        self.mean = self._vector(self.model.get('mean', {}), 0.0)
+        self.scale = self._vector(self.model.get('scale', {}), 1.0)
+        self.scale[self.scale == 0] = 1.0
+        self.bias = float(self.model.get('bias', 0.0))
+        self.threshold = float(self.model.get('threshold', 0.5 if self.kind == 'logistic' else 0.55))
+
+    @staticmethod
+    def _vector(values: Dict[str, float], default: float) -> np.ndarray:
+        return np.array([float(values.get(name, default)) for name in FEATURES])
+
+    @classmethod
+    def load(cls, path: Optional[Path]) -> "TableClassifier":
+        """Classifier from a weights JSON file (None: DEFAULT_WEIGHTS)."""
+        if path is None:
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.model, f, indent=2)
+
+    def score(self, matrix: np.ndarray) -> np.ndarray:
+        """
+        Score of every row of a feature matrix (figures score 0). For
+        "logistic" models this is the probability of a results table.
+        """
+        matrix = np.asarray(matrix, dtype=float).reshape(-1, len(FEATURES))
+        present = ~np.isnan(matrix)
+        if self.kind == 'weighted':
+            numerator = np.where(present, matrix, 0.0) @ self.weights
+            denominator = present @ self.weights
+            scores = np.divide(numerator, denominator, out=np.zeros(len(matrix)), where=denominator != 0)
+            scores += self.bias
+        else:
+            standardized = np.where(present, (matrix - self.mean) / self.scale, 0.0)
+            scores = 1.0 / (1.0 + np.exp(-(standardized @ self.weights + self.bias)))
+        scores[matrix[:, FEATURES.index('is_figure')] > 0] = 0.0
+        return scores
+
+    def decide(self, scores: np.ndarray) -> np.ndarray:
+        """True for scores at or above the threshold (results tables)."""
+        return np.asarray(scores) >= self.threshold - _THRESHOLD_TOLERANCE
+
+    def predict(self, matrix: np.ndarray) -> np.ndarray:
+        """True for rows classified as results tables."""
+        return self.decide(self.score(matrix))
+
+    def classify(self, matrix: np.ndarray, index: pd.DataFrame) -> pd.DataFrame:
+        """
+        Decisions plus signal breakdown: the index columns, is_results,
+        score and one column per feature.
+        """
+        scores = self.score(matrix)
+        frame = index.reset_index(drop=True).copy()
+        frame['is_results'] = self.decide(scores)
+        frame['score'] = scores
+        return pd.concat([frame, pd.DataFrame(matrix, columns=FEATURES)], axis=1)
+
+    def score_tables(self, tables: List[Dict], full_text: Optional[str] = None) -> np.ndarray:
+        """Scores of one paper's tables, in order (full_text: the paper's text, for reference features)."""
+        references = TableReferences(full_text) if full_text else None
+        matrix = np.array([[features[name] for name in FEATURES]
+                           for features in (table_features(table, references) for table in tables)], dtype=float)
+        return self.score(matrix.reshape(len(tables), len(FEATURES)))
+
+
+def load_corpus_tables(
+    tables_dir: Path,
+    text_dir: Optional[Path] = None,
+    keys: Optional[Iterable[str]] = None,
+    store: Optional["CorpusStore"] = None
+) -> Iterator[Tuple[str, List[Dict], Optional[str]]]:
+    """
+    (key, table JSONs, full text or None) for every paper with tables, one paper at a time.
+
+    Args:
+        tables_dir: Directory of {key}_table_N.json files
+        text_dir: Directory of {key}.txt full texts (optional)
+        keys: Papers to load (default: every paper in tables_dir)
+        store: Packed corpus of the text files (read instead of text_dir when it has the key)
+    """
+    files: Dict[str, List[Path]] = {}
+    for table_file in sorted(Path(tables_dir).glob("*_table_*.json")):
+        files.setdefault(table_file.name.rsplit('_table_', 1)[0], []).append(table_file)
+    wanted = set(keys) if keys is not None else None
+
+    for key, table_files in files.items():
+        if wanted is not None and key not in wanted:
+            continue
+        tables = []
+        # {key}_table_N.json in N order (sorted() puts table_10 before table_2)
+        for table_file in sorted(table_files, key=lambda f: int(re.sub(r'\D', '', f.stem.rsplit('_', 1)[1]) or 0)):
+            with open(table_file, 'r', encoding='utf-8') as f:
+                tables.append(json.load(f))
+
+        full_text = None
+        if store is not None and key in store:
+            full_text = store.text(key)
+        elif text_dir is not None and (Path(text_dir) / f"{key}.txt").exists():
+            full_text = (Path(text_dir) / f"{key}.txt").read_text(encoding='utf-8')
+        yield key, tables, full_text
+
+
+def load_tei_tables(
+    tei_files: Iterable[Path],
+    doc_cache: Optional["DocumentCache"] = None
+) -> Iterator[Tuple[str, List[Dict], Optional[str]]]:
+    """
+    (key, table JSONs, full text) of TEI files, extracted on the fly
+    (the same tables and text extract_tables.py writes).
+    """
+    for tei_file in tei_files:
+        tei_file = Path(tei_file)
+        key = tei_file.name.replace('.tei.xml', '')
+        document = doc_cache.get_document(tei_file) if doc_cache is not None else TEIDocument.from_file(tei_file)
+        yield key, extract_tables(document, key), document.full_text()
+
+
+def classify_tables(
+    papers: Iterable[Tuple[str, List[Dict], Optional[str]]],
+    classifier: Optional[TableClassifier] = None
+) -> pd.DataFrame:
+    """
+    Classify every table of a corpus as results vs descriptive in one batch.
+
+    Args:
+        papers: (key, table JSONs, full text or None) per paper
+        classifier: Weights to score with (default: classify_table's)
+
+    Returns:
+        DataFrame with one row per table (see TableClassifier.classify)
+    """
+    matrix, index = feature_matrix(papers)
+    return (classifier or TableClassifier()).classify(matrix, index)
+
+
+# ----------------------------------------------------------------------
+# Training on Phase 2 labels
+# ----------------------------------------------------------------------
+
+def load_phase2_labels(phase2_dirs: Iterable[Path]) -> Dict[str, Dict[str, bool]]:
+    """
+    Table labels saved by V2 Phase 2 ({key}_phase2.json).
+
+    Returns:
+        {key: {normalized table number: True for RESULTS, False for DESCRIPTIVE}};
+        a later directory overrides an earlier one for the same paper
+    """
+    labels = {}
+    for phase2_dir in phase2_dirs:
+        for result_file in sorted(Path(phase2_dir).glob("*_phase2.json")):
+            with open(result_file, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            key = result.get('_key') or result_file.name.replace('_phase2.json', '')
+            paper = {}
+            for table in result.get('tables_classified', []):
+                classification = str(table.get('classification', '')).upper()
+                if classification in ('RESULTS', 'DESCRIPTIVE') and table.get('table_number') is not None:
+                    paper[TableReferences.normalize(table['table_number'])] = classification == 'RESULTS'
+            if paper:
+                labels[key] = paper
+    return labels
+
+
+def phase1_tables(tables_found: List[Dict], extracted: List[Dict]) -> List[Dict]:
+    """
+    Table JSON for V2 Phase 1 tables (table_number, title): the GROBID
+    table with the same number when one was extracted (rows, cells, caption),
+    else the Phase 1 title as a caption-only table.
+    """
+    by_number = {}
+    for table in extracted:
+        by_number.setdefault(TableReferences.normalize(table.get('table_number')), table)
+    tables = []
+    for found in tables_found:
+        number = found.get('table_number')
+        table = by_number.get(TableReferences.normalize(number))
+        if table is None:
+            table = {'caption': found.get('title', ''), 'rows': [], 'n_rows': 0, 'n_cols': 0}
+        tables.append({**table, 'table_number': number})
+    return tables
+
+
+def load_phase2_training_papers(
+    phase2_dirs: Iterable[Path],
+    tei_dir: Path,
+    doc_cache: Optional["DocumentCache"] = None
+) -> Tuple[List[Tuple[str, List[Dict], Optional[str]]], Dict[str, Dict[str, bool]]]:
+    """
+    Labelled papers for training: (key, table JSONs, full text) of every
+    paper with Phase 2 labels and a TEI file, plus the labels.
+
+    Tables are the ones Phase 2 classified: the paper's Phase 1 result
+    (phase1/ next to phase2/) when saved, else the labelled table numbers,
+    described by phase1_tables().
+    """
+    phase2_dirs = [Path(d) for d in phase2_dirs]
+    labels = load_phase2_labels(phase2_dirs)
+    papers = []
+    for key in sorted(labels):
+        tei_file = Path(tei_dir) / f"{key}.tei.xml"
+        if not tei_file.exists():
+            continue
+        tables_found = [{'table_number': number} for number in labels[key]]
+        for phase2_dir in reversed(phase2_dirs):
+            phase1_file = phase2_dir.parent / "phase1" / f"{key}_phase1.json"
+            if phase1_file.exists():
+                with open(phase1_file, 'r', encoding='utf-8') as f:
+                    tables_found = json.load(f).get('tables_found', tables_found)
+                break
+        _, extracted, full_text = next(load_tei_tables([tei_file], doc_cache))
+        papers.append((key, phase1_tables(tables_found, extracted), full_text))
+    return papers, labels
+
+
+def match_labels(index: pd.DataFrame, labels: Dict[str, Dict[str, bool]]) -> np.ndarray:
+    """
+    Label of each feature-matrix row: 1.0 (RESULTS), 0.0 (DESCRIPTIVE) or
+    NaN when the paper or table was not labelled.
+    """
+    return np.array([
+        float(labels[key][number]) if key in labels and number in labels[key] else np.nan
+        for key, number in zip(index['key'], index['table_number'].map(TableReferences.normalize))
+    ], dtype=float)
+
+
+def fit_logistic(
+    matrix: np.ndarray,
+    labels: np.ndarray,
+    l2: float = 1.0,
+    max_iter: int = 100,
+    tolerance: float = 1e-8
+) -> Dict:
+    """
+    L2-regularized logistic regression by Newton's method (pure NumPy).
+
+    Features are standardized with the training mean and scale first
+    (missing values count as the mean); the bias is not regularized.
+
+    Returns:
+        A "logistic" TableClassifier model (weights, bias, mean, scale, threshold 0.5)
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    labels = np.asarray(labels, dtype=float)
+    mean = np.nanmean(matrix, axis=0) if len(matrix) else np.zeros(len(FEATURES))
+    mean = np.where(np.isnan(mean), 0.0, mean)
+    scale = np.nanstd(matrix, axis=0) if len(matrix) else np.ones(len(FEATURES))
+    scale = np.where(np.isnan(scale) | (scale == 0), 1.0, scale)
+
+    # Bias is the last column
+    design = np.hstack([np.where(np.isnan(matrix), 0.0, (matrix - mean) / scale), np.ones((len(matrix), 1))])
+    penalty = np.full(design.shape[1], float(l2))
+    penalty[-1] = 0.0
+    coefficients = np.zeros(design.shape[1])
+    for _ in range(max_iter):
+        probabilities = 1.0 / (1.0 + np.exp(-(design @ coefficients)))
+        gradient = design.T @ (probabilities - labels) + penalty * coefficients
+        hessian = (design.T * (probabilities * (1 - probabilities))) @ design + np.diag(penalty) + 1e-9 * np.eye(design.shape[1])
+        step = np.linalg.solve(hessian, gradient)
+        coefficients -= step
+        if np.max(np.abs(step)) < tolerance:
+            break
+
+    return {
+        'kind': 'logistic',
+        'weights': {name: round(float(w), 6) for name, w in zip(FEATURES, coefficients[:-1])},
+        'bias': round(float(coefficients[-1]), 6),
+        'mean': {name: round(float(m), 6) for name, m in zip(FEATURES, mean)},
+        'scale': {name: round(float(s), 6) for name, s in zip(FEATURES, scale)},
+        'threshold': 0.5
+    }
+
+
+def classification_metrics(labels: np.ndarray, scores: np.ndarray, threshold: float,
+                           probabilities: bool = True) -> Dict:
+    """
+    Agreement of scores with labels: accuracy, precision/recall/F1 for
+    RESULTS and, for probabilities, log loss, Brier score and expected
+    calibration error (10 equal-width bins).
+    """
+    labels = np.asarray(labels, dtype=bool)
+    scores = np.asarray(scores, dtype=float)
+    predicted = scores >= threshold - _THRESHOLD_TOLERANCE
+    true_positives = int(np.sum(predicted & labels))
+    precision = true_positives / int(predicted.sum()) if predicted.any() else 0.0
+    recall = true_positives / int(labels.sum()) if labels.any() else 0.0
+    metrics = {
+        'tables': int(len(labels)),
+        'results_tables': int(labels.sum()),
+        'accuracy': round(float(np.mean(predicted == labels)), 4) if len(labels) else 0.0,
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f1': round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0
+    }
+    if probabilities and len(labels):
+        clipped = np.clip(scores, 1e-6, 1 - 1e-6)
+        bins = np.minimum((scores * 10).astype(int), 9)
+        calibration_error = sum(
+            np.sum(bins == b) * abs(np.mean(scores[bins == b]) - np.mean(labels[bins == b]))
+            for b in range(10) if np.any(bins == b)
+        ) / len(labels)
+        metrics.update(
+            log_loss=round(float(-np.mean(labels * np.log(clipped) + (~labels) * np.log(1 - clipped))), 4),
+            brier=round(float(np.mean((scores - labels) ** 2)), 4),
+            calibration_error=round(float(calibration_error), 4)
+        )
+    return metrics
+
+
+def uncertain_band(labels: np.ndarray, scores: np.ndarray, threshold: float,
+                   target_agreement: float = 0.95) -> Dict:
+    """
+    Narrowest score band [low, high) around the threshold such that the
+    tables outside it, decided locally by the threshold, agree with the
+    labels at least `target_agreement` of the time. The cascade in V2
+    Phase 2 sends only the tables inside the band to the LLM.
+
+    Returns:
+        {'uncertain_band': [low, high], 'target_agreement', 'agreement'
+        and 'decided_locally' (share of tables outside the band)}
+    """
+    labels = np.asarray(labels, dtype=bool)
+    scores = np.asarray(scores, dtype=float)
+    order = np.argsort(scores, kind='stable')
+    ranked = scores[order]
+    correct = np.concatenate([[0], np.cumsum((scores >= threshold - _THRESHOLD_TOLERANCE)[order] == labels[order])])
+
+    # Local below: scores < low; local above: scores >= high
+    lows = np.unique(np.append(ranked[ranked < threshold], threshold))
+    highs = np.unique(np.append(ranked[ranked >= threshold], max(1.0, ranked[-1]) + 1e-6))
+    below = np.searchsorted(ranked, lows, 'left')[:, None]
+    above_start = np.searchsorted(ranked, highs, 'left')[None, :]
+    local = below + (len(ranked) - above_start)
+    agreeing = correct[below] + (correct[-1] - correct[above_start])
+    agreement = np.divide(agreeing, local, out=np.ones(local.shape), where=local > 0)
+
+    # Band that leaves the most tables to the local decision at the target agreement
+    feasible = np.where(agreement >= target_agreement, local, -1)
+    i, j = np.unravel_index(np.argmax(feasible), feasible.shape)
+    return {
+        'uncertain_band': [float(lows[i]), float(highs[j])],
+        'target_agreement': target_agreement,
+        'agreement': round(float(agreement[i, j]), 4),
+        'decided_locally': round(float(local[i, j]) / len(ranked), 4) if len(ranked) else 0.0
+    }
+
+
+def train_table_classifier(
+    matrix: np.ndarray,
+    index: pd.DataFrame,
+    labels: np.ndarray,
+    l2: float = 1.0,
+    folds: int = 5,
+    target_agreement: float = 0.95
+) -> Dict:
+    """
+    Fit a logistic model on labelled rows and measure it on held-out papers.
+
+    Papers are split into `folds` groups; each group is scored by a model
+    fitted on the other papers, so no paper's tables are seen in training
+    before they are scored. The saved model is then fitted on all papers.
+
+    Args:
+        matrix: Feature matrix (feature_matrix())
+        index: Row index (feature_matrix()), for the paper keys
+        labels: match_labels() output; NaN rows are left out
+
+    Returns:
+        Model dict with an "uncertain_band" calibrated on the held-out
+        scores (uncertain_band()) and a "training" section: papers, tables,
+        l2 and metrics for held-out papers, the training data and the
+        default weights
+    """
+    labelled = ~np.isnan(labels)
+    matrix, labels = matrix[labelled], labels[labelled]
+    keys = index['key'].to_numpy()[labelled]
+    papers = sorted(set(keys))
+    if len(papers) < 2 or len(set(labels)) < 2:
+        raise ValueError(f"Need labelled tables of both classes from at least 2 papers "
+                         f"(have {len(papers)} papers, {int(labels.sum())}/{len(labels)} RESULTS)")
+
+    folds = max(2, min(folds, len(papers)))
+    fold_of = {key: i % folds for i, key in enumerate(papers)}
+    row_folds = np.array([fold_of[key] for key in keys])
+    held_out = np.zeros(len(labels))
+    for fold in range(folds):
+        test = row_folds == fold
+        train = ~test
+        if len(set(labels[train])) < 2:
+            # One class only: predict its rate
+            held_out[test] = float(np.mean(labels[train]))
+            continue
+        held_out[test] = TableClassifier(fit_logistic(matrix[train], labels[train], l2=l2)).score(matrix[test])
+
+    model = fit_logistic(matrix, labels, l2=l2)
+    classifier = TableClassifier(model)
+    default = TableClassifier()
+    cascade = uncertain_band(labels, held_out, classifier.threshold, target_agreement)
+    model['uncertain_band'] = cascade['uncertain_band']
+    model['training'] = {
+        'papers': len(papers),
+        'tables': int(len(labels)),
+        'l2': l2,
+        'folds': folds,
+        'features': FEATURES,
+        'held_out': classification_metrics(labels, held_out, classifier.threshold),
+        'training': classification_metrics(labels, classifier.score(matrix), classifier.threshold),
+        'default_weights': classification_metrics(labels, default.score(matrix), default.threshold,
+                                                  probabilities=False),
+        'cascade': cascade
+    }
+    return model
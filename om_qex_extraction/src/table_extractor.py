@@ -0,0 +1,243 @@
+"""
+Table Extractor - Deterministic table JSON from GROBID TEI XML.
+Turns every <figure type="table"> into the {key}_table_N.json schema read by
+smart_table_filter (caption, rows, cells, table_number), without an LLM call.
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .doc_cache import DocumentCache
+from .tei_document import TEIDocument
+
+logger = logging.getLogger(__name__)
+
+# "Table 3", "Table 1 .1" (GROBID splits "1.1"), "TABLE A2", "Tab. IV", "Cuadro 2" in a heading or label.
+# Roman numerals must be upper case after a capitalised keyword, so "the table I constructed" is no table
+_NO_LOWERCASE_ROMAN = r'(?!(?-i:[tc])\w*\.?\s*(?-i:[IVXL]+)\b)'
+TABLE_NUMBER_PATTERN = re.compile(
+    r'\b' + _NO_LOWERCASE_ROMAN +
+    r'(?:table|tab\.?|cuadro|tabla)\s*([A-Z]?\d+(?:\s*\.\s*\d+)*|(?-i:[IVXL]+)\b)',
+    re.IGNORECASE
+)
+# The same in running text, where no space may follow the dot: "Table 3. 40 households" is table 3
+TABLE_REFERENCE_PATTERN = re.compile(
+    r'\b' + _NO_LOWERCASE_ROMAN +
+    r'(?:table|tab\.?|cuadro|tabla)\s*([A-Z]?\d+(?:\s*\.\d+)*|(?-i:[IVXL]+)\b)',
+    re.IGNORECASE
+)
+FIGURE_OPEN_PATTERN = re.compile(r'<figure\b[^>]*>')
+XML_ID_PATTERN = re.compile(r'\bxml:id="([^"]+)"')
+
+
+def parse_table_number(head: str, label: str = '') -> Optional[str]:
+    """
+    Table number from a GROBID <head> ("Table 1 .1: ...") or <label> ("7").
+
+    Returns:
+        Normalized number ("1.1", "A2", "7"), or None if neither names one
+    """
+    match = TABLE_NUMBER_PATTERN.search(head or '')
+    if match:
+        return re.sub(r'\s+', '', match.group(1))
+    label = (label or '').strip().rstrip('.:')
+    if label:
+        match = TABLE_NUMBER_PATTERN.search(label)
+        if match:
+            return re.sub(r'\s+', '', match.group(1))
+        if re.fullmatch(r'[A-Z]?\d+(?:\.\d+)*', label):
+            return label
+    return None
+
+
+def figure_offsets(tei_text: str) -> Dict[str, Tuple[int, int]]:
+    """Character offsets (start, end) of each <figure xml:id="..."> element in the raw TEI text."""
+    offsets = {}
+    for match in FIGURE_OPEN_PATTERN.finditer(tei_text):
+        xml_id = XML_ID_PATTERN.search(match.group())
+        if not xml_id:
+            continue
+        end = tei_text.find('</figure>', match.end())
+        offsets[xml_id.group(1)] = (match.start(), end + len('</figure>') if end != -1 else match.end())
+    return offsets
+
+
+def build_grid(rows: List[List[str]], col_spans: List[List[int]]) -> List[List[str]]:
+    """
+    Rectangular cell grid: spanning cells keep their text in the first column
+    they cover and leave the others empty; short rows are padded.
+    """
+    grid = []
+    for texts, spans in zip(rows, col_spans):
+        line = []
+        for text, span in zip(texts, spans):
+            line.append(text)
+            line.extend([''] * (span - 1))
+        grid.append(line)
+    width = max((len(line) for line in grid), default=0)
+    return [line + [''] * (width - len(line)) for line in grid]
+
+
+def table_json(key: str, index: int, figure: Dict, source_file: str,
+               offsets: Optional[Tuple[int, int]] = None) -> Dict:
+    """
+    smart_table_filter table JSON for one <figure type="table">.
+
+    Args:
+        key: Paper key
+        index: 1-based position among the paper's tables (the N in {key}_table_N.json)
+        figure: figure_dict() output
+        source_file: TEI file name
+        offsets: Character span of the <figure> element in the TEI text
+    """
+    number = parse_table_number(figure['head'], figure['label'])
+    rows = figure['rows']
+    col_spans = figure.get('col_spans') or [[1] * len(r) for r in rows]
+    grid = build_grid(rows, col_spans)
+
+    return {
+        'key': key,
+        'table_number': int(number) if number and number.isdigit() else (number or index),
+        'numbered': number is not None,  # False: table_number is the table's position
+        'table_index': index,
+        'xml_id': figure['xml_id'],
+        'caption': f"{figure['head']} {figure['description']}".strip(),
+        'head': figure['head'],
+        'label': figure['label'],
+        'description': figure['description'],
+        'rows': [
+            {
+                'row': r,
+                'cells': [
+                    {'col': c, 'span': span, 'text': text}
+                    for c, (text, span) in enumerate(zip(texts, spans))
+                ]
+            }
+            for r, (texts, spans) in enumerate(zip(rows, col_spans))
+        ],
+        'cells': grid,
+        'n_rows': len(grid),
+        'n_cols': len(grid[0]) if grid else 0,
+        'source': {
+            'file': source_file,
+            'line': figure.get('line'),
+            'char_start': offsets[0] if offsets else None,
+            'char_end': offsets[1] if offsets else None
+        },
+        'extractor': 'grobid_tei'
+    }
+
+
+def extract_tables(document: TEIDocument, key: str, tei_text: Optional[str] = None) -> List[Dict]:
+    """
+    Table JSON for every structured table of a parsed TEI document.
+
+    Args:
+        document: Parsed TEI document
+        key: Paper key
+        tei_text: Raw TEI text, for source character offsets (optional)
+    """
+    offsets = figure_offsets(tei_text) if tei_text else {}
+    source_file = document.path.name if document.path else f"{key}.tei.xml"
+    return [
+        table_json(key, i, figure, source_file, offsets.get(figure['xml_id']))
+        for i, figure in enumerate(document.tables, start=1)
+    ]
+
+
+def save_tables(tables: List[Dict], tables_dir: Path, key: str) -> List[Path]:
+    """Write {key}_table_N.json files, replacing any left from an earlier run of the same paper."""
+    tables_dir.mkdir(parents=True, exist_ok=True)
+    for stale in tables_dir.glob(f"{key}_table_*.json"):
+        stale.unlink()
+
+    paths = []
+    for table in tables:
+        path = tables_dir / f"{key}_table_{table['table_index']}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(table, f, indent=2, ensure_ascii=False)
+        paths.append(path)
+    return paths
+
+
+# ----------------------------------------------------------------------
+# Batch extraction (one process per CPU)
+# ----------------------------------------------------------------------
+
+_worker_cache: Optional[DocumentCache] = None
+
+
+def _init_worker(cache_dir: Optional[str]):
+    global _worker_cache
+    _worker_cache = DocumentCache(Path(cache_dir) if cache_dir else None, max_entries=4)
+
+
+def _extract_paper(tei_file: str, tables_dir: str, text_dir: Optional[str]) -> Dict:
+    """Extract and save one paper's tables (runs in a worker process)."""
+    tei_path = Path(tei_file)
+    key = tei_path.name.replace('.tei.xml', '')
+    start = time.perf_counter()
+    try:
+        cache = _worker_cache or DocumentCache()
+        document = cache.get_document(tei_path)
+        tables = extract_tables(document, key, cache.get_text(tei_path))
+        save_tables(tables, Path(tables_dir), key)
+        if text_dir:
+            Path(text_dir).mkdir(parents=True, exist_ok=True)
+            (Path(text_dir) / f"{key}.txt").write_text(document.full_text(), encoding='utf-8')
+    except Exception as e:
+        return {'key': key, 'tables': 0, 'seconds': time.perf_counter() - start, 'error': str(e)}
+
+    return {
+        'key': key,
+        'tables': len(tables),
+        'numbered': sum(1 for t in tables if t['numbered']),
+        'with_rows': sum(1 for t in tables if t['n_rows']),
+        'seconds': time.perf_counter() - start,
+        'error': None
+    }
+
+
+def extract_corpus(
+    tei_files: List[Path],
+    tables_dir: Path,
+    text_dir: Optional[Path] = None,
+    workers: Optional[int] = None,
+    cache_dir: Optional[Path] = None
+) -> List[Dict]:
+    """
+    Extract the tables of many papers in parallel.
+
+    Args:
+        tei_files: TEI files to process
+        tables_dir: Output directory for {key}_table_N.json
+        text_dir: Output directory for {key}.txt full text (None = skip)
+        workers: Worker processes (default: CPU count)
+        cache_dir: Parsed-document cache directory shared by the workers
+
+    Returns:
+        One summary dict per paper (key, tables, seconds, error), in input order
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tei_files) or 1))
+    args = (str(tables_dir), str(text_dir) if text_dir else None)
+
+    if workers == 1:
+        _init_worker(str(cache_dir) if cache_dir else None)
+        return [_extract_paper(str(f), *args) for f in tei_files]
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(str(cache_dir) if cache_dir else None,)) as executor:
+        futures = {executor.submit(_extract_paper, str(f), *args): f for f in tei_files}
+        for future in as_completed(futures):
+            summary = future.result()
+            if summary['error']:
+                logger.error(f"Table extraction failed for {summary['key']}: {summary['error']}")
+            results[futures[future]] = summary
+    return [results[f] for f in tei_files]
@@ -0,0 +1,152 @@
+"""
+TEI Compaction - GROBID TEI reduced to what the extraction prompts read.
+Keeps the title, abstract, section heads, paragraphs (with their xml:id),
+notes, formulas and figures/tables (type, xml:id, head, label, figDesc and
+one line per table row with " | " between cells). Drops namespaces,
+coordinates, <facsimile>, header boilerplate and the reference list.
+"""
+
+import re
+from typing import Dict, List
+
+from lxml import etree
+from xml.sax.saxutils import escape, quoteattr
+
+from .tei_document import NS, TEI, XML_ID
+from .token_ledger import estimate_tokens
+
+# Prepended to compacted TEI in prompts so the model knows the layout
+FORMAT_NOTE = (
+    "NOTE: The TEI below is compacted: namespaces, coordinates, header boilerplate and the "
+    "reference list are removed, and each table <row> is one line with cells separated by \" | \" "
+    "(a cell spanning several columns is followed by empty cells)."
+)
+
+# Elements whose (inline) text is emitted as one line
+LEAF_TAGS = {'head', 'p', 'label', 'figDesc', 'item', 'formula', 'note'}
+# Elements kept as wrappers around their children
+BLOCK_TAGS = {'text', 'body', 'back', 'front', 'div', 'figure', 'list', 'note', 'abstract'}
+# Elements dropped with everything inside them
+SKIP_TAGS = {'facsimile', 'listBibl', 'graphic', 'surface', 'pb', 'lb', 'fw'}
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _local(elem) -> str:
+    return etree.QName(elem).localname
+
+
+def _text(elem) -> str:
+    """Inline text with whitespace runs collapsed."""
+    return _WHITESPACE.sub(' ', ''.join(elem.itertext())).strip()
+
+
+def _row_line(row) -> str:
+    cells = []
+    for cell in row.iterchildren(TEI + 'cell'):
+        cells.append(escape(_text(cell)))
+        span = cell.get('cols', '1')
+        if span.isdigit() and int(span) > 1:
+            cells.extend([''] * (int(span) - 1))
+    return ' | '.join(cells)
+
+
+class _Compactor:
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def emit(self, line: str):
+        self.lines.append(line)
+
+    def header(self, header):
+        title = header.find('.//tei:titleStmt/tei:title[@type="main"]', NS)
+        if title is not None and _text(title):
+            self.emit(f"<title>{escape(_text(title))}</title>")
+        abstract = header.find('.//tei:abstract', NS)
+        if abstract is not None:
+            self.walk(abstract)
+
+    def walk(self, elem):
+        if not isinstance(elem.tag, str):
+            return  # Comments / processing instructions
+        tag = _local(elem)
+        if tag in SKIP_TAGS:
+            return
+        if tag == 'teiHeader':
+            self.header(elem)
+            return
+        if tag == 'table':
+            rows = [_row_line(row) for row in elem.iter(TEI + 'row')]
+            if any(r.strip(' |') for r in rows):
+                self.emit("<table>")
+                self.lines.extend(f"<row>{r}</row>" for r in rows)
+                self.emit("</table>")
+            return
+
+        has_structure = any(isinstance(c.tag, str) and _local(c) in (LEAF_TAGS | BLOCK_TAGS | {'table'})
+                            for c in elem)
+        if tag in LEAF_TAGS and not (tag in BLOCK_TAGS and has_structure):
+            text = _text(elem)
+            if text:
+                attributes = f" xml:id={quoteattr(elem.get(XML_ID))}" if tag == 'p' and elem.get(XML_ID) else ''
+                self.emit(f"<{tag}{attributes}>{escape(text)}</{tag}>")
+            return
+
+        if tag not in BLOCK_TAGS:
+            # Unknown wrapper (<TEI>, <sourceDesc>, ...): keep its children only
+            for child in elem:
+                self.walk(child)
+            return
+
+        attributes = ''
+        if tag == 'figure':
+            attributes = f" type={quoteattr(elem.get('type') or 'figure')}"
+            if elem.get(XML_ID):
+                attributes += f" xml:id={quoteattr(elem.get(XML_ID))}"
+        start = len(self.lines)
+        self.emit(f"<{tag}{attributes}>")
+        for child in elem:
+            self.walk(child)
+        if len(self.lines) == start + 1:
+            self.lines.pop()  # Nothing kept inside (e.g. the references <div>)
+        else:
+            self.emit(f"</{tag}>")
+
+
+def compact_xml(tei_text: str) -> str:
+    """
+    Compact TEI markup.
+
+    Raises:
+        ValueError: If the XML cannot be parsed
+    """
+    try:
+        root = etree.fromstring(tei_text.encode('utf-8'))
+    except etree.XMLSyntaxError as e:
+        raise ValueError(f"Failed to parse TEI: {e}")
+    compactor = _Compactor()
+    compactor.walk(root)
+    return '\n'.join(compactor.lines)
+
+
+def compact_tei(tei_text: str) -> Dict:
+    """
+    Compact TEI plus how much it shrank.
+
+    Returns:
+        Dict with 'text' and 'report' (original/compact characters and
+        estimated tokens, and the token reduction as a fraction)
+    """
+    text = compact_xml(tei_text)
+    original_tokens = estimate_tokens(tei_text)
+    compact_tokens = estimate_tokens(text)
+    return {
+        'text': text,
+        'report': {
+            'original_chars': len(tei_text),
+            'compact_chars': len(text),
+            'original_tokens': original_tokens,
+            'compact_tokens': compact_tokens,
+            'reduction': round(1 - compact_tokens / original_tokens, 3) if original_tokens else 0.0
+        }
+    }
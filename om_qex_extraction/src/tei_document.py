@@ -0,0 +1,281 @@
+"""
+TEI Document - Single-pass streaming reader for GROBID TEI XML.
+Collects metadata, abstract, body sections, figures/tables and references
+in one lxml.iterparse sweep, clearing elements as soon as they are read.
+"""
+
+import io
+from lxml import etree
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+TEI = '{http://www.tei-c.org/ns/1.0}'
+NS = {'tei': 'http://www.tei-c.org/ns/1.0'}
+XML_ID = '{http://www.w3.org/XML/1998/namespace}id'
+
+# Only these elements produce iterparse events. The header is read in one go
+# at </teiHeader> and body text per top-level section, so paragraphs and the
+# titles, authors and dates of the bibliography never reach Python one by one.
+# <facsimile> (page coordinates, unused) and the sections of <back> are freed
+# as soon as they end rather than with the rest of the document.
+_EVENT_TAGS = [TEI + name for name in (
+    'teiHeader', 'facsimile', 'div', 'figure', 'note', 'body', 'biblStruct', 'back'
+)]
+
+
+def inline_text(elem) -> str:
+    """All text of an element including inline children (<ref>, <hi>, ...)."""
+    if not len(elem):
+        return (elem.text or '').strip()
+    return ''.join(elem.itertext()).strip()
+
+
+def author_dict(author_elem) -> Dict[str, str]:
+    """first_name / last_name / full_name of a TEI <author>."""
+    author = {}
+    forename = author_elem.find('.//tei:forename[@type="first"]', NS)
+    if forename is not None and forename.text:
+        author['first_name'] = forename.text.strip()
+    surname = author_elem.find('.//tei:surname', NS)
+    if surname is not None and surname.text:
+        author['last_name'] = surname.text.strip()
+    if 'first_name' in author and 'last_name' in author:
+        author['full_name'] = f"{author['first_name']} {author['last_name']}"
+    return author
+
+
+def reference_dict(bibl_elem) -> Dict:
+    """title / authors / year of a bibliography <biblStruct> (one walk over its subtree)."""
+    title_elem = date_elem = None
+    surnames = None
+    for elem in bibl_elem.iter(TEI + 'title', TEI + 'author', TEI + 'date'):
+        if elem.tag == TEI + 'author':
+            if surnames is None:
+                surnames = []
+            surname = elem.find('.//tei:surname', NS)
+            if surname is not None and surname.text:
+                surnames.append(surname.text.strip())
+        elif elem.tag == TEI + 'title':
+            if title_elem is None and elem.get('level') == 'a':
+                title_elem = elem
+        elif date_elem is None:
+            date_elem = elem
+
+    ref = {}
+    if title_elem is not None and title_elem.text:
+        ref['title'] = title_elem.text.strip()
+    if surnames is not None:
+        ref['authors'] = surnames
+    if date_elem is not None:
+        year = date_elem.get('when')
+        if year:
+            ref['year'] = year[:4]
+    return ref
+
+
+def figure_dict(figure_elem) -> Dict:
+    """
+    Head, label, description and table rows of a TEI <figure>.
+
+    Returns:
+        Dict with xml_id, type ('table' or 'figure'), head, label,
+        description, rows (list of rows, each a list of cell texts),
+        col_spans (the cells' `cols` attributes, same shape as rows)
+        and line (source line of the <figure> tag)
+    """
+    head = figure_elem.find('tei:head', NS)
+    label = figure_elem.find('tei:label', NS)
+    description = figure_elem.find('tei:figDesc', NS)
+    rows = []
+    col_spans = []
+    for row in figure_elem.iter(TEI + 'row'):
+        cells = list(row.iterchildren(TEI + 'cell'))
+        rows.append([inline_text(cell) for cell in cells])
+        col_spans.append([int(cell.get('cols', 1)) if cell.get('cols', '1').isdigit() else 1 for cell in cells])
+    return {
+        'xml_id': figure_elem.get(XML_ID, ''),
+        'type': figure_elem.get('type') or 'figure',
+        'head': inline_text(head) if head is not None else '',
+        'label': inline_text(label) if label is not None else '',
+        'description': inline_text(description) if description is not None else '',
+        'rows': rows,
+        'col_spans': col_spans,
+        'line': figure_elem.sourceline
+    }
+
+
+def _release(elem):
+    """Free an element that has been read, plus its already-read preceding siblings."""
+    elem.clear(keep_tail=True)
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+class TEIDocument:
+    """
+    Everything the pipeline reads from a TEI file, parsed in one pass.
+
+    Paragraph and heading text includes inline children, so text after a
+    citation or table reference (<ref>) is kept.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else None
+        self.title = ""
+        self.authors: List[Dict[str, str]] = []
+        self.year: Optional[str] = None
+        self.abstract_paragraphs: List[str] = []
+        self.abstract_text = ""  # Abstract text outside <p> (used when there are no paragraphs)
+        self.sections: List[Dict] = []
+        self.figures: List[Dict] = []
+        self.references: List[Dict] = []
+
+    @classmethod
+    def from_file(cls, tei_file: Path) -> "TEIDocument":
+        """
+        Parse a TEI file with iterparse.
+
+        Raises:
+            ValueError: If the file cannot be parsed
+        """
+        document = cls(tei_file)
+        try:
+            document._parse(etree.iterparse(str(tei_file), events=('end',), tag=_EVENT_TAGS))
+        except (OSError, etree.XMLSyntaxError) as e:
+            raise ValueError(f"Failed to parse TEI file {tei_file}: {e}")
+        return document
+
+    @classmethod
+    def from_bytes(cls, data: bytes, path: Optional[Path] = None) -> "TEIDocument":
+        """Parse TEI XML that has already been read (e.g. to hash it)."""
+        document = cls(path)
+        try:
+            document._parse(etree.iterparse(io.BytesIO(data), events=('end',), tag=_EVENT_TAGS))
+        except etree.XMLSyntaxError as e:
+            raise ValueError(f"Failed to parse TEI file {path}: {e}")
+        return document
+
+    def _parse(self, events):
+        for _, elem in events:
+            tag = elem.tag
+            parent = elem.getparent()
+            parent_tag = parent.tag if parent is not None else None
+
+            if parent_tag == TEI + 'body':
+                # Top-level section: <div>, <figure> or <note>
+                if tag == TEI + 'figure':
+                    self.figures.append(figure_dict(elem))
+                self._add_section(elem)
+                _release(elem)
+
+            elif tag == TEI + 'figure':
+                # Nested figure: its head stays in the enclosing section's text
+                self.figures.append(figure_dict(elem))
+
+            elif tag == TEI + 'biblStruct':
+                if parent_tag == TEI + 'listBibl':
+                    ref = reference_dict(elem)
+                    if ref:
+                        self.references.append(ref)
+                    _release(elem)
+
+            elif tag == TEI + 'teiHeader':
+                self._read_header(elem)
+                _release(elem)
+
+            elif tag in (TEI + 'body', TEI + 'back', TEI + 'facsimile') or parent_tag == TEI + 'back':
+                _release(elem)
+
+    def _add_section(self, section):
+        """Paragraphs and heads (with inline text) of a top-level body element."""
+        paragraphs = []
+        paragraph_ids = []
+        paragraph_tags = []
+        for elem in section.iter(TEI + 'p', TEI + 'head'):
+            text = inline_text(elem)
+            if text:
+                paragraphs.append(text)
+                paragraph_ids.append(elem.get(XML_ID, ''))
+                paragraph_tags.append(elem.tag[len(TEI):])
+        head = section.find('tei:head', NS)
+        self.sections.append({
+            'index': len(self.sections),
+            'tag': section.tag[len(TEI):],
+            'xml_id': section.get(XML_ID, ''),
+            'head': inline_text(head) if head is not None else '',
+            'paragraphs': paragraphs,
+            'paragraph_ids': paragraph_ids,  # xml:id of each paragraph ('' if none)
+            'paragraph_tags': paragraph_tags,  # 'p' or 'head'
+            'text': '\n\n'.join(paragraphs)
+        })
+
+    def _read_header(self, header):
+        """Title, authors, publication year and abstract from <teiHeader>."""
+        title_elem = header.find('.//tei:titleStmt/tei:title[@type="main"]', NS)
+        if title_elem is not None and title_elem.text:
+            self.title = title_elem.text.strip()
+
+        for author_elem in header.iterfind('.//tei:sourceDesc//tei:author', NS):
+            author = author_dict(author_elem)
+            if author:
+                self.authors.append(author)
+
+        date_elem = header.find('.//tei:sourceDesc//tei:biblStruct//tei:date[@type="published"]', NS)
+        if date_elem is not None and date_elem.get('when'):
+            self.year = date_elem.get('when')[:4]
+
+        abstract_elem = header.find('.//tei:abstract', NS)
+        if abstract_elem is not None:
+            for p in abstract_elem.iterfind('.//tei:p', NS):
+                text = inline_text(p)
+                if text:
+                    self.abstract_paragraphs.append(text)
+            if not self.abstract_paragraphs and abstract_elem.text:
+                self.abstract_text = abstract_elem.text.strip()
+
+    # ------------------------------------------------------------------
+    # Derived views
+    # ------------------------------------------------------------------
+
+    @property
+    def abstract(self) -> str:
+        if self.abstract_paragraphs:
+            return ' '.join(self.abstract_paragraphs)
+        return self.abstract_text
+
+    @property
+    def body_text(self) -> str:
+        return '\n\n'.join(s['text'] for s in self.sections if s['text'])
+
+    @property
+    def tables(self) -> List[Dict]:
+        return [f for f in self.figures if f['type'] == 'table']
+
+    def full_text(self, include_abstract: bool = True) -> str:
+        """Abstract + body, formatted like TEIParser.get_full_text."""
+        parts = []
+        if include_abstract and self.abstract:
+            parts.append(f"ABSTRACT:\n{self.abstract}")
+        body = self.body_text
+        if body:
+            parts.append(f"FULL TEXT:\n{body}")
+        return '\n\n'.join(parts)
+
+    def metadata(self) -> Dict:
+        return {
+            'title': self.title,
+            'authors': self.authors,
+            'year': self.year,
+            'abstract': self.abstract,
+            'reference_count': len(self.references)
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            'metadata': self.metadata(),
+            'full_text': self.full_text(),
+            'references': self.references
+        }
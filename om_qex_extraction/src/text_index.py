@@ -0,0 +1,496 @@
+"""
+Text Index - Corpus-wide full-text index over GROBID TEI files.
+Every paragraph, section head, table caption, table row and table cell is a
+passage in SQLite (FTS5), with its paper key, section, xml:id and character
+offsets in the TEI file. Papers are re-indexed only when their file changes.
+"""
+
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from lxml import etree
+
+from .tei_document import TEI, XML_ID, inline_text
+
+logger = logging.getLogger(__name__)
+
+# Bump when the passages extracted from a TEI file change
+INDEX_VERSION = 1
+
+PASSAGE_KINDS = ('paragraph', 'head', 'caption', 'row', 'cell')
+
+# Elements that become passages, and the raw-text scan that locates them
+_PASSAGE_TAGS = ('p', 'head', 'figDesc', 'row', 'cell')
+_TAG_PATTERN = re.compile(r'<(/?)(p|head|figDesc|row|cell)\b[^>]*?(/?)>')
+_SECTION_TAGS = (TEI + 'div', TEI + 'figure', TEI + 'note')
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+_ANY_TABLE_REFERENCE = re.compile(r'\b(?:table|tabla|cuadro)\s+([A-Z]?\d+(?:\.\d+)*)', re.IGNORECASE)
+
+_COLUMNS = ('id', 'key', 'position', 'kind', 'part', 'section_index', 'xml_id', 'figure_id',
+            'row', 'col', 'char_start', 'char_end', 'line', 'text')
+
+
+def phrase_query(text: str) -> Optional[str]:
+    """FTS5 phrase matching the word tokens of `text` in sequence (None if it has none)."""
+    tokens = _TOKEN.findall(text.lower())
+    if not tokens:
+        return None
+    return '"' + ' '.join(tokens) + '"'
+
+
+def table_reference_pattern(table_number) -> re.Pattern:
+    """
+    'Table 1', 'Tab. 1', 'Cuadro 1' ... but not 'Table 10' or 'Table 1.2'
+    (in running text: 'Table 1. 2 households' is table 1).
+    """
+    number = re.escape(str(table_number)).replace(r'\.', r'\s*\.')
+    return re.compile(
+        rf'\b(?:table|tab\.?|tabla|cuadro)\s*{number}(?![\w]|\s*\.\d)',
+        re.IGNORECASE
+    )
+
+
+def element_offsets(tei_text: str) -> List[Tuple[int, int]]:
+    """
+    Character span of every <p>, <head>, <figDesc>, <row> and <cell> in the
+    raw TEI text, in document order (the order of lxml's element iteration).
+    """
+    spans: List[List[int]] = []
+    open_tags: Dict[str, List[int]] = {}
+    for match in _TAG_PATTERN.finditer(tei_text):
+        closing, name, self_closing = match.groups()
+        if closing:
+            stack = open_tags.get(name)
+            if stack:
+                spans[stack.pop()][1] = match.end()
+        else:
+            spans.append([match.start(), match.end()])
+            if not self_closing:
+                open_tags.setdefault(name, []).append(len(spans) - 1)
+    return [(start, end) for start, end in spans]
+
+
+def _child_index(elem, tag: str) -> Optional[int]:
+    """Position of an element among its parent's children with the same tag."""
+    parent = elem.getparent() if elem is not None else None
+    if parent is None:
+        return None
+    return [child for child in parent if child.tag == tag].index(elem)
+
+
+def extract_passages(data: bytes) -> List[Dict]:
+    """
+    Passages of one TEI file, in document order.
+
+    Abstract paragraphs, body and back matter are indexed (the rest of the
+    header and the bibliography are not). Section indices match
+    TEIDocument.sections.
+
+    Raises:
+        ValueError: If the file cannot be parsed
+    """
+    try:
+        root = etree.fromstring(data, parser=etree.XMLParser(huge_tree=True, remove_comments=True))
+    except etree.XMLSyntaxError as e:
+        raise ValueError(f"Failed to parse TEI: {e}")
+
+    elements = list(root.iter(*[TEI + name for name in _PASSAGE_TAGS]))
+    offsets = element_offsets(data.decode('utf-8'))
+    if len(offsets) != len(elements):
+        logger.warning(f"TEI tag scan found {len(offsets)} elements, lxml {len(elements)}; "
+                       f"character offsets left empty")
+        offsets = [(None, None)] * len(elements)
+
+    body = root.find(f'.//{TEI}body')
+    section_of = {}
+    if body is not None:
+        sections = [child for child in body if child.tag in _SECTION_TAGS]
+        section_of = {id(child): index for index, child in enumerate(sections)}
+
+    passages = []
+    for elem, (start, end) in zip(elements, offsets):
+        part, section_index, figure_id = None, None, None
+        node = elem
+        while node is not None:
+            if id(node) in section_of and section_index is None:
+                section_index = section_of[id(node)]
+            if node.tag == TEI + 'figure' and figure_id is None:
+                figure_id = node.get(XML_ID, '')
+            elif node.tag == TEI + 'abstract':
+                part = 'abstract'
+            elif node.tag in (TEI + 'body', TEI + 'back') and part is None:
+                part = node.tag[len(TEI):]
+            elif node.tag == TEI + 'listBibl':
+                part = None
+                break
+            node = node.getparent()
+        if part is None:
+            continue
+
+        name = elem.tag[len(TEI):]
+        row, col = None, None
+        if name == 'row':
+            text = ' '.join(inline_text(cell) for cell in elem.iterchildren(TEI + 'cell'))
+            row = _child_index(elem, TEI + 'row')
+        else:
+            text = inline_text(elem)
+        if name == 'cell':
+            col = _child_index(elem, TEI + 'cell')
+            row = _child_index(elem.getparent(), TEI + 'row')
+        if not text:
+            continue
+
+        if name in ('row', 'cell'):
+            kind = name
+        elif name == 'figDesc' or (name == 'head' and figure_id is not None):
+            kind = 'caption'
+        else:
+            kind = 'paragraph' if name == 'p' else 'head'
+
+        passages.append({
+            'kind': kind,
+            'part': part,
+            'section_index': section_index if part == 'body' else None,
+            'xml_id': elem.get(XML_ID) or None,
+            'figure_id': figure_id or None,
+            'row': row,
+            'col': col,
+            'char_start': start,
+            'char_end': end,
+            'line': elem.sourceline,
+            'text': text
+        })
+    return passages
+
+
+class TextIndex:
+    """
+    SQLite FTS5 index of TEI passages, shared by V1 and V2.
+
+    `update()` re-indexes a TEI file only when its size/mtime and then its
+    content hash have changed, so calling it before every lookup is cheap.
+    """
+
+    def __init__(self, db_path: Path):
+        """
+        Open (or create) the index database.
+
+        Raises:
+            RuntimeError: If this SQLite build has no FTS5
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                key TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                passages INTEGER NOT NULL,
+                indexed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS passages (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                part TEXT NOT NULL,
+                section_index INTEGER,
+                xml_id TEXT,
+                figure_id TEXT,
+                row INTEGER,
+                col INTEGER,
+                char_start INTEGER,
+                char_end INTEGER,
+                line INTEGER,
+                text TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_passages_key ON passages(key, position)")
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts USING fts5("
+                "text, content='passages', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            )
+        except sqlite3.OperationalError as e:
+            self._conn.close()
+            raise RuntimeError(f"SQLite FTS5 is not available: {e}")
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config: Dict, base_dir: Path) -> Optional["TextIndex"]:
+        """
+        Open the index from the `text_index` config section.
+
+        Args:
+            config: Full pipeline config
+            base_dir: Directory that a relative index path is resolved against
+
+        Returns:
+            TextIndex, or None when disabled or unavailable
+        """
+        index_config = config.get('text_index', {}) or {}
+        if not index_config.get('enabled', True):
+            return None
+        db_path = Path(index_config.get('path', 'om_qex_extraction/outputs/cache/text_index.sqlite'))
+        if not db_path.is_absolute():
+            db_path = Path(base_dir) / db_path
+        try:
+            return cls(db_path)
+        except RuntimeError as e:
+            logger.warning(f"Text index disabled: {e}")
+            return None
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def update(self, tei_files: Iterable[Path], force: bool = False) -> Dict[str, int]:
+        """
+        Index new and changed TEI files.
+
+        Args:
+            tei_files: TEI files ({key}.tei.xml)
+            force: Re-index every file even if unchanged
+
+        Returns:
+            Counts of indexed, unchanged and failed files
+        """
+        counts = {'indexed': 0, 'unchanged': 0, 'failed': 0}
+        for tei_file in tei_files:
+            try:
+                counts['indexed' if self.update_file(tei_file, force) else 'unchanged'] += 1
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not index {Path(tei_file).name}: {e}")
+                counts['failed'] += 1
+        return counts
+
+    def update_file(self, tei_file: Path, force: bool = False) -> bool:
+        """
+        Index one TEI file if it changed since it was last indexed.
+
+        Returns:
+            True if the file was (re-)indexed
+
+        Raises:
+            ValueError: If the file cannot be parsed
+        """
+        path = Path(tei_file).resolve()
+        key = path.name.replace('.tei.xml', '')
+        stat = path.stat()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, content_hash, size, mtime_ns, version FROM documents WHERE key = ?", (key,)
+            ).fetchone()
+        if not force and row is not None and row[4] == INDEX_VERSION and row[0] == str(path) \
+                and (row[2], row[3]) == (stat.st_size, stat.st_mtime_ns):
+            return False
+
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        if not force and row is not None and row[4] == INDEX_VERSION and row[1] == digest:
+            # Touched but not edited: remember the new mtime, keep the passages
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE documents SET path = ?, size = ?, mtime_ns = ? WHERE key = ?",
+                    (str(path), stat.st_size, stat.st_mtime_ns, key)
+                )
+                self._conn.commit()
+            return False
+
+        passages = extract_passages(data)
+        with self._lock:
+            self._delete_key(key)
+            self._conn.executemany(
+                "INSERT INTO passages (key, position, kind, part, section_index, xml_id, figure_id, "
+                "row, col, char_start, char_end, line, text) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (key, position, p['kind'], p['part'], p['section_index'], p['xml_id'], p['figure_id'],
+                     p['row'], p['col'], p['char_start'], p['char_end'], p['line'], p['text'])
+                    for position, p in enumerate(passages)
+                ]
+            )
+            self._conn.execute(
+                "INSERT INTO passages_fts (rowid, text) SELECT id, text FROM passages WHERE key = ?", (key,)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (key, path, content_hash, size, mtime_ns, version, "
+                "passages, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, str(path), digest, stat.st_size, stat.st_mtime_ns, INDEX_VERSION, len(passages), time.time())
+            )
+            self._conn.commit()
+        logger.debug(f"Indexed {key}: {len(passages)} passages")
+        return True
+
+    def remove(self, key: str):
+        """Drop a paper from the index."""
+        with self._lock:
+            self._delete_key(key)
+            self._conn.execute("DELETE FROM documents WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def prune(self, keep_keys: Iterable[str]) -> int:
+        """Drop papers whose key is not in `keep_keys` (e.g. deleted TEI files). Returns the number dropped."""
+        keep = set(keep_keys)
+        stale = [key for key in self.keys() if key not in keep]
+        for key in stale:
+            self.remove(key)
+        return len(stale)
+
+    def _delete_key(self, key: str):
+        # External-content FTS rows must be deleted with their old text
+        self._conn.execute(
+            "INSERT INTO passages_fts (passages_fts, rowid, text) "
+            "SELECT 'delete', id, text FROM passages WHERE key = ?", (key,)
+        )
+        self._conn.execute("DELETE FROM passages WHERE key = ?", (key,))
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT key FROM documents ORDER BY key")]
+
+    def search(
+        self,
+        query: str,
+        key: Optional[str] = None,
+        kinds: Optional[Sequence[str]] = None,
+        limit: Optional[int] = 20
+    ) -> List[Dict]:
+        """
+        Passages matching an FTS5 query, best match (bm25) first.
+
+        Args:
+            query: FTS5 query ('impact AND consumption', '"table 3"', 'saving*')
+            key: Restrict to one paper
+            kinds: Restrict to passage kinds (see PASSAGE_KINDS)
+            limit: Maximum passages (None = all)
+        """
+        sql = (f"SELECT {', '.join('p.' + c for c in _COLUMNS)}, bm25(passages_fts) AS score "
+               f"FROM passages_fts JOIN passages p ON p.id = passages_fts.rowid WHERE passages_fts MATCH ?")
+        params: list = [query]
+        if key is not None:
+            sql += " AND p.key = ?"
+            params.append(key)
+        if kinds:
+            sql += f" AND p.kind IN ({', '.join('?' * len(kinds))})"
+            params.extend(kinds)
+        sql += " ORDER BY score"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(zip(_COLUMNS + ('score',), row)) for row in rows]
+
+    def passages(self, key: str, kinds: Optional[Sequence[str]] = None,
+                 start: int = 0, end: Optional[int] = None) -> List[Dict]:
+        """A paper's passages with position in [start, end), in document order."""
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM passages WHERE key = ? AND position >= ?"
+        params: list = [key, start]
+        if end is not None:
+            sql += " AND position < ?"
+            params.append(end)
+        if kinds:
+            sql += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            params.extend(kinds)
+        sql += " ORDER BY position"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    def table_mentions(self, key: str, table_number) -> List[Dict]:
+        """
+        Paragraphs and heads (outside figures) that refer to a table, in
+        document order, each with match_start/match_end of the first reference
+        in its text. "Table 1" does not match "Table 10" or "Table 1.2".
+        """
+        tokens = _TOKEN.findall(str(table_number).lower())
+        if not tokens:
+            return []
+        number = ' '.join(tokens)
+        query = ' OR '.join([f'"{word} {number}"' for word in ('table', 'tab', 'tabla', 'cuadro')]
+                            + ([f'"table{tokens[0]}"'] if len(tokens) == 1 else []))
+        pattern = table_reference_pattern(table_number)
+
+        mentions = []
+        for passage in self.search(query, key=key, kinds=('paragraph', 'head'), limit=None):
+            if passage['figure_id']:
+                continue  # The table's own caption/notes
+            match = pattern.search(passage['text'])
+            if match:
+                passage['match_start'], passage['match_end'] = match.start(), match.end()
+                mentions.append(passage)
+        mentions.sort(key=lambda p: p['position'])
+        return mentions
+
+    def table_context(self, key: str, table_number, chars: int = 300, max_excerpts: int = 3) -> Dict:
+        """
+        Text around the references to a table.
+
+        Returns:
+            Dict with mentions (count), before/after (text around the first
+            reference, up to `chars` each) and excerpts (windows around the
+            first `max_excerpts` references, with section and xml:id).
+            Lists of tables ("Table 4: ... Table 5: ... Table 6: ...") come
+            after references in prose.
+        """
+        mentions = self.table_mentions(key, table_number)
+        context = {'mentions': len(mentions), 'before': '', 'after': '', 'excerpts': []}
+        if not mentions:
+            return context
+        mentions.sort(key=lambda p: len(set(_ANY_TABLE_REFERENCE.findall(p['text']))) >= 3)
+
+        first = mentions[0]
+        context['before'] = first['text'][max(0, first['match_start'] - chars):first['match_start']].strip()
+        context['after'] = first['text'][first['match_end']:first['match_end'] + chars].strip()
+        for passage in mentions[:max_excerpts]:
+            start, end = passage['match_start'], passage['match_end']
+            context['excerpts'].append({
+                'section_index': passage['section_index'],
+                'xml_id': passage['xml_id'],
+                'text': passage['text'][max(0, start - chars // 2):end + chars // 2].strip()
+            })
+        return context
+
+    def find_literal(self, key: str, literal: str, limit: Optional[int] = 5) -> List[Dict]:
+        """
+        Passages of a paper that contain `literal` (its words in sequence,
+        ignoring case, spacing and punctuation), e.g. to check an extracted
+        literal_text against the source.
+        """
+        query = phrase_query(literal)
+        if query is None:
+            return []
+        return self.search(query, key=key, limit=limit)
+
+    def stats(self) -> Dict:
+        """Return paper and passage counts."""
+        with self._lock:
+            documents = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            kinds = dict(self._conn.execute("SELECT kind, COUNT(*) FROM passages GROUP BY kind").fetchall())
+        return {'documents': documents, 'passages': sum(kinds.values()), 'by_kind': kinds}
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,153 @@
+"""
+Token Ledger - Offline token estimation and a persistent per-call usage ledger.
+Every LLM call (V1 engine and V2 phases) is appended to a JSONL file.
+"""
+
+import json
+import logging
+import math
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Letter runs, digit groups (tokenizers split numbers into groups of <= 3 digits)
+# and single punctuation/symbol characters
+_TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d{1,3}|[^\w\s]|_")
+
+# Average characters per token within a run of letters
+_CHARS_PER_WORD_TOKEN = 4.5
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a text without calling a tokenizer.
+
+    Words cost roughly one token per 4-5 letters, numbers one token per
+    group of up to three digits, and punctuation one token per symbol.
+    This tracks BPE tokenizers far better than len(text) / 4 on the
+    number-heavy tables in the corpus.
+
+    Returns:
+        Estimated token count
+    """
+    if not text:
+        return 0
+
+    tokens = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        piece = match.group()
+        if piece[0].isalpha():
+            tokens += math.ceil(len(piece) / _CHARS_PER_WORD_TOKEN)
+        else:
+            tokens += 1
+    return tokens
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """Estimate tokens for one image input (about width * height / 750)."""
+    return math.ceil(width * height / 750)
+
+
+def new_run_id() -> str:
+    """Run identifier used to group ledger entries."""
+    return datetime.now().strftime('%Y%m%d_%H%M%S')
+
+
+class TokenLedger:
+    """Thread-safe, append-only JSONL ledger of LLM calls."""
+
+    def __init__(self, ledger_file: Path, run_id: Optional[str] = None, pipeline: str = "v1"):
+        """
+        Args:
+            ledger_file: Path to the JSONL ledger
+            run_id: Identifier shared by all calls of this run (default: timestamp)
+            pipeline: Pipeline name recorded with each entry ("v1" or "v2")
+        """
+        self.ledger_file = Path(ledger_file)
+        self.ledger_file.parent.mkdir(parents=True, exist_ok=True)
+        self.run_id = run_id or new_run_id()
+        self.pipeline = pipeline
+        self._lock = threading.Lock()
+
+    def record(self, key: Optional[str], phase: str, model: str, estimated_prompt_tokens: int,
+               usage: Optional[Dict] = None, latency_s: float = 0.0, status: str = "ok",
+               cached: bool = False):
+        """
+        Append one LLM call to the ledger.
+
+        Args:
+            key: Paper key
+            phase: Pipeline phase (e.g. "om", "qex", "phase1")
+            model: Model name
+            estimated_prompt_tokens: Pre-flight estimate of the prompt size
+            usage: Token usage reported by the API (prompt/completion/total tokens)
+            latency_s: Wall-clock seconds for the call
+            status: "ok", "truncated" or "error"
+            cached: True if served from the response cache
+        """
+        usage = usage or {}
+        entry = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'run_id': self.run_id,
+            'pipeline': self.pipeline,
+            'key': key,
+            'phase': phase,
+            'model': model,
+            'estimated_prompt_tokens': estimated_prompt_tokens,
+            'prompt_tokens': usage.get('prompt_tokens', 0) or 0,
+            'completion_tokens': usage.get('completion_tokens', 0) or 0,
+            'total_tokens': usage.get('total_tokens', 0) or 0,
+            'latency_s': round(latency_s, 3),
+            'status': status,
+            'cached': cached
+        }
+
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            with open(self.ledger_file, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+    def record_response(self, response, key: Optional[str], phase: str, model: str,
+                        estimated_prompt_tokens: int, latency_s: float):
+        """Append a call from an OpenAI-style response object (reads response.usage and finish_reason)."""
+        status = "ok"
+        choices = getattr(response, 'choices', None) or []
+        if choices and getattr(choices[0], 'finish_reason', None) == 'length':
+            status = "truncated"
+        self.record(key, phase, model, estimated_prompt_tokens, usage_to_dict(getattr(response, 'usage', None)),
+                    latency_s, status)
+
+
+def usage_to_dict(usage) -> Dict:
+    """Convert an API usage object to a plain dictionary."""
+    if usage is None:
+        return {}
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+        'completion_tokens': getattr(usage, 'completion_tokens', 0) or 0,
+        'total_tokens': getattr(usage, 'total_tokens', 0) or 0
+    }
+
+
+def load_ledger(ledger_file: Path) -> List[Dict]:
+    """Read all ledger entries, skipping malformed lines."""
+    entries = []
+    ledger_file = Path(ledger_file)
+    if not ledger_file.exists():
+        return entries
+
+    with open(ledger_file, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping malformed ledger line {line_number}")
+    return entries
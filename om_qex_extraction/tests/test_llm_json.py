@@ -0,0 +1,57 @@
+"""
+Tests for the tolerant LLM JSON parser.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.llm_json import LLMJSONError, parse_llm_json
+
+
+def test_plain_document():
+    parsed = parse_llm_json('{"study_id": "x", "outcomes": []}')
+    assert parsed.data == {"study_id": "x", "outcomes": []}
+    assert not parsed.truncated
+    assert parsed.repairs == ()
+
+
+def test_fence_and_prose():
+    parsed = parse_llm_json('Here it is:\n```json\n{"a": 1,}\n```\nDone.')
+    assert parsed.data == {"a": 1}
+    assert 'fence' in parsed.repairs
+    assert 'trailing_commas' in parsed.repairs
+
+
+def test_prose_braces_before_document():
+    parsed = parse_llm_json('Fill in {fields} as asked: {"a": 1}')
+    assert parsed.data == {"a": 1}
+    assert 'prefix' in parsed.repairs
+
+
+def test_truncated_array_drops_partial_element():
+    parsed = parse_llm_json('{"outcomes": [{"outcome_name": "a"}, {"outcome_name": "b", "lit')
+    assert parsed.data == {"outcomes": [{"outcome_name": "a"}]}
+    assert parsed.truncated
+
+
+def test_broken_document_does_not_return_inner_object():
+    text = ('{"study_id": "x", "outcomes": [{"outcome_name": "a", "literal_text": "he said "hi" ok"}, '
+            '{"outcome_name": "b"}]}')
+    with pytest.raises(LLMJSONError):
+        parse_llm_json(text)
+
+
+def test_invalid_value_does_not_return_inner_object():
+    text = '{"study_id": "x", "outcomes": [{"outcome_name": "a", "effect_size": 0.5 0.6}, {"outcome_name": "b"}]}'
+    with pytest.raises(LLMJSONError):
+        parse_llm_json(text)
+
+
+def test_empty_response():
+    with pytest.raises(LLMJSONError):
+        parse_llm_json("   ")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Train the local table classifier on saved V2 Phase 2 labels (no LLM calls).
+
+Reads {key}_phase2.json (RESULTS / DESCRIPTIVE per table) and the matching
+Phase 1 results and TEI files, builds the table_classifier feature matrix and
+fits a logistic regression. Metrics for held-out papers (cross-validated by
+paper), the training data and the default weights are saved with the model,
+with the uncertain band for the V2 Phase 2 cascade: the narrowest score band
+outside which held-out local decisions reach --target-agreement.
+Use the model with classify_tables.py --weights or config table_classifier.weights.
+
+Usage:
+  python train_table_classifier.py
+  python train_table_classifier.py --labels ../om_qex_extraction_v2/outputs/phase2 --output outputs/table_classifier.json
+  python train_table_classifier.py --l2 3 --folds 10
+  python train_table_classifier.py --target-agreement 0.9
+"""
+
+import sys
+import io
+
+# Force UTF-8 output encoding for Windows console
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+import argparse
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.table_classifier import (
+    TableClassifier, feature_matrix, load_phase2_training_papers, match_labels, train_table_classifier
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the table classifier on Phase 2 labels")
+    parser.add_argument('--labels', nargs='+',
+                        help='Phase 2 output directories (default: om_qex_extraction_v2/outputs/phase2)')
+    parser.add_argument('--tei-dir', type=str, help='TEI directory (default: data/grobid_outputs/tei)')
+    parser.add_argument('--output', type=str, help='Model JSON (default: outputs/table_classifier.json)')
+    parser.add_argument('--l2', type=float, default=1.0, help='L2 regularization strength (default: 1.0)')
+    parser.add_argument('--folds', type=int, default=5, help='Cross-validation folds, split by paper (default: 5)')
+    parser.add_argument('--target-agreement', type=float, default=0.95,
+                        help='Agreement of local decisions with the labels outside the uncertain band (default: 0.95)')
+
+    args = parser.parse_args()
+
+    # Paths
+    project_root = Path(__file__).parent.parent
+    label_dirs = [Path(d) for d in args.labels] if args.labels else \
+        [project_root / "om_qex_extraction_v2" / "outputs" / "phase2"]
+    tei_dir = Path(args.tei_dir) if args.tei_dir else project_root / "data" / "grobid_outputs" / "tei"
+    output_file = Path(args.output) if args.output else Path(__file__).parent / "outputs" / "table_classifier.json"
+
+    missing = [d for d in label_dirs if not d.is_dir()]
+    if missing:
+        print(f"❌ Label directory not found: {', '.join(str(d) for d in missing)}")
+        return 1
+
+    print(f"📊 Loading Phase 2 labels from {', '.join(str(d) for d in label_dirs)}...")
+    start = time.perf_counter()
+    papers, labels = load_phase2_training_papers(label_dirs, tei_dir)
+    matrix, index = feature_matrix(papers)
+    row_labels = match_labels(index, labels)
+
+    try:
+        model = train_table_classifier(matrix, index, row_labels, l2=args.l2, folds=args.folds,
+                                       target_agreement=args.target_agreement)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    training = model['training']
+    training['created'] = datetime.now().isoformat(timespec='seconds')
+    training['label_dirs'] = [str(d) for d in label_dirs]
+    TableClassifier(model).save(output_file)
+
+    held_out = training['held_out']
+    default = training['default_weights']
+    print(f"\n{'='*60}")
+    print(f"✅ TABLE CLASSIFIER TRAINED ({elapsed:.1f}s)")
+    print(f"{'='*60}")
+    print(f"  - Papers: {training['papers']} ({len(labels) - training['papers']} without TEI skipped)")
+    print(f"  - Tables: {training['tables']} ({held_out['results_tables']} RESULTS)")
+    print(f"  - Held-out papers: accuracy {held_out['accuracy']:.1%}, F1 {held_out['f1']:.3f}, "
+          f"log loss {held_out['log_loss']:.3f}, calibration error {held_out['calibration_error']:.3f}")
+    print(f"  - Default weights: accuracy {default['accuracy']:.1%}, F1 {default['f1']:.3f}")
+    cascade = training['cascade']
+    low, high = cascade['uncertain_band']
+    print(f"  - Uncertain band: [{low:.3f}, {high:.3f}) - {cascade['decided_locally']:.0%} of held-out tables "
+          f"decided locally, {cascade['agreement']:.1%} agreement (target {cascade['target_agreement']:.0%})")
+    print(f"  - Model: {output_file}")
+    print(json.dumps(model['weights'], indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,6 +11,7 @@ Usage:
 """
 
 import argparse
+import json
 import logging
 import sys
 from pathlib import Path
@@ -20,6 +21,15 @@ from openai import OpenAI
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent / 'src'))
+# Project root, for utilities shared with V1 (om_qex_extraction.src)
+sys.path.append(str(Path(__file__).parent.parent))
+
+from om_qex_extraction.src.doc_cache import DocumentCache
+from om_qex_extraction.src.llm_client import LLMCaller
+from om_qex_extraction.src.mock_llm import MockLLMClient
+from om_qex_extraction.src.rate_limiter import RateLimiter
+from om_qex_extraction.src.text_index import TextIndex
+from om_qex_extraction.src.token_ledger import TokenLedger
 
 from phase1_table_discovery import Phase1TableDiscovery
 from phase2_table_filtering import Phase2TableFiltering
@@ -56,18 +66,36 @@ class V2Pipeline:
         self.client = self._initialize_client()
         self.model = self.config['model']['name']
         
-        # Initialize phases
-        self.phase1 = Phase1TableDiscovery(self.client, self.model, self.config)
-        self.phase2 = Phase2TableFiltering(self.client, self.model, self.config)
-        self.phase3 = Phase3TEIExtraction(self.client, self.model, self.config)
-        self.phase3b = Phase3bPDFVision(self.client, self.model, self.config)
-        self.phase4 = Phase4OutcomeMapping(self.client, self.model, self.config)
-        self.phase5 = Phase5QEXExtraction(self.client, self.model, self.config)
-        self.phase6 = Phase6PostProcessing(self.client, self.model, self.config)
-        
         # Output directories
         self.output_base = Path(self.config['paths']['output_base'])
         self._create_output_dirs()
+        
+        # One LLM caller for all phases: shared retries, circuit breaker, rate limits and token ledger
+        self.ledger = self._initialize_ledger()
+        extraction_config = self.config.get('extraction', {})
+        self.llm = LLMCaller.from_config(
+            self.client, self.config,
+            rate_limiter=RateLimiter(
+                requests_per_minute=extraction_config.get('requests_per_minute'),
+                tokens_per_minute=extraction_config.get('tokens_per_minute')
+            ),
+            ledger=self.ledger
+        )
+        
+        # TEI files are read once per run and shared between phases
+        self.doc_cache = DocumentCache.from_config(self.config, Path(__file__).parent.parent)
+        # Paragraph/caption/cell index for table context and literal_text checks (updated per paper)
+        self.text_index = TextIndex.from_config(self.config, Path(__file__).parent.parent)
+        
+        # Initialize phases
+        self.phase1 = Phase1TableDiscovery(self.client, self.model, self.config, llm=self.llm, doc_cache=self.doc_cache)
+        self.phase2 = Phase2TableFiltering(self.client, self.model, self.config, llm=self.llm, text_index=self.text_index,
+                                           doc_cache=self.doc_cache)
+        self.phase3 = Phase3TEIExtraction(self.client, self.model, self.config, llm=self.llm, doc_cache=self.doc_cache)
+        self.phase3b = Phase3bPDFVision(self.client, self.model, self.config, llm=self.llm)
+        self.phase4 = Phase4OutcomeMapping(self.client, self.model, self.config)
+        self.phase5 = Phase5QEXExtraction(self.client, self.model, self.config, text_index=self.text_index)
+        self.phase6 = Phase6PostProcessing(self.client, self.model, self.config)
     
     def _load_config(self, config_path: Path) -> Dict:
         """Load configuration from YAML."""
@@ -75,18 +103,120 @@ class V2Pipeline:
             return yaml.safe_load(f)
     
     def _initialize_client(self) -> OpenAI:
+        """Initialize the LLM client (OpenRouter, or the offline mock when api.backend is "mock")."""
+        if self.config['api'].get('backend', 'openrouter') == 'mock':
+            mock_config = self.config.get('mock', {}) or {}
+            real_client = self._initialize_openrouter_client() if mock_config.get('mode') == 'record' else None
+            return MockLLMClient.from_config(mock_config, Path(__file__).parent.parent, real_client=real_client)
+        return self._initialize_openrouter_client()
+    
+    def _initialize_openrouter_client(self) -> OpenAI:
         """Initialize OpenRouter client."""
+        from openai import Timeout
+        
+        timeout = self.config.get('extraction', {}).get('timeout', 300)
         return OpenAI(
             base_url=self.config['api']['openrouter']['base_url'],
-            api_key=self.config['api']['openrouter']['api_key'].strip('${}')
+            api_key=self.config['api']['openrouter']['api_key'].strip('${}'),
+            timeout=Timeout(
+                connect=15.0,
+                read=float(timeout),  # Long TEI prompts can take minutes to answer
+                write=15.0,
+                pool=15.0
+            ),
+            max_retries=0  # Retries are handled by LLMCaller (backoff, Retry-After, circuit breaker)
         )
     
+    def _initialize_ledger(self) -> Optional[TokenLedger]:
+        """Open the token ledger (default: <output_base>/token_ledger.jsonl)."""
+        ledger_config = self.config.get('ledger', {})
+        if not ledger_config.get('enabled', True):
+            return None
+        ledger_path = Path(ledger_config.get('path', self.output_base / 'token_ledger.jsonl'))
+        return TokenLedger(ledger_path, pipeline="v2")
+    
     def _create_output_dirs(self):
         """Create output directories for each phase."""
         for phase in ['phase1', 'phase2', 'phase3', 'phase3b', 'phase4', 'phase5', 'phase6']:
             phase_dir = self.output_base / phase
             phase_dir.mkdir(parents=True, exist_ok=True)
     
+    def _tei_file(self, key: str) -> Path:
+        tei_dir = Path(self.config['paths']['tei_dir'])
+        if not tei_dir.is_absolute():
+            tei_dir = Path(__file__).parent.parent / tei_dir
+        return tei_dir / f"{key}.tei.xml"
+    
+    def run_batch(self, keys: List[str], phases: Optional[List[int]] = None, verbose: bool = False) -> Dict[str, Dict]:
+        """
+        Run pipeline for several papers, with Phase 2 batched across them.
+        
+        Phase 1 runs (or is loaded) for every paper first; Phase 2 then
+        classifies all their tables together, so the uncertain tables of
+        all papers share LLM requests. Phases 3-6 run per paper as in run().
+        
+        Args:
+            keys: Paper identifiers
+            phases: List of phases to run (default: all)
+            verbose: Enable verbose logging
+        
+        Returns:
+            {key: results} (results as run(), or {'error': ...})
+        """
+        all_phases = phases or [1, 2, 3, 4, 5, 6]
+        if 2 not in all_phases or self.phase2.strategy != 'cascade':
+            return {key: self._run_logged(key, all_phases, verbose) for key in keys}
+        if verbose:
+            logging.getLogger().setLevel(logging.DEBUG)
+        
+        results = {}
+        phase2_inputs = []
+        for key in keys:
+            tei_file = self._tei_file(key)
+            if not tei_file.exists():
+                logger.error(f"TEI file not found: {tei_file}")
+                results[key] = {'error': 'TEI file not found'}
+                continue
+            try:
+                if 1 in all_phases:
+                    logger.info(f"\n--- PHASE 1: Table Discovery ({key}) ---")
+                    phase1_result = self.phase1.discover_tables(tei_file, key)
+                    self.phase1.save_result(phase1_result, self.output_base / 'phase1')
+                else:
+                    with open(self.output_base / 'phase1' / f"{key}_phase1.json", 'r') as f:
+                        phase1_result = json.load(f)
+            except Exception as e:
+                logger.error(f"Error processing {key}: {e}", exc_info=True)
+                results[key] = {'error': str(e)}
+                continue
+            results[key] = {'phase1': phase1_result}
+            phase2_inputs.append((phase1_result, tei_file))
+        
+        logger.info(f"\n--- PHASE 2: Table Filtering ({len(phase2_inputs)} papers, batched) ---")
+        for phase2_result in self.phase2.filter_tables_batch(phase2_inputs):
+            key = phase2_result['_key']
+            if 'error' in phase2_result:
+                results[key]['error'] = phase2_result['error']
+                continue
+            self.phase2.save_result(phase2_result, self.output_base / 'phase2')
+            results[key]['phase2'] = phase2_result
+        
+        later_phases = [p for p in all_phases if p > 2]
+        if later_phases:
+            for phase1_result, _ in phase2_inputs:
+                key = phase1_result['_key']
+                if 'error' not in results[key]:
+                    results[key].update(self._run_logged(key, later_phases, verbose))
+        return results
+    
+    def _run_logged(self, key: str, phases: List[int], verbose: bool) -> Dict:
+        """run(), with errors logged instead of raised."""
+        try:
+            return self.run(key, phases=phases, verbose=verbose)
+        except Exception as e:
+            logger.error(f"Error processing {key}: {e}", exc_info=True)
+            return {'error': str(e)}
+    
     def run(self, key: str, phases: Optional[List[int]] = None, verbose: bool = False) -> Dict:
         """
         Run pipeline for a single paper.
@@ -107,11 +237,7 @@ class V2Pipeline:
         logger.info(f"=" * 80)
         
         # Get file paths
-        tei_dir = Path(self.config['paths']['tei_dir'])
-        if not tei_dir.is_absolute():
-            tei_dir = Path(__file__).parent.parent / tei_dir
-        
-        tei_file = tei_dir / f"{key}.tei.xml"
+        tei_file = self._tei_file(key)
         
         pdf_dir = Path(self.config['paths'].get('pdf_dir', 'data/raw_pdfs'))
         if not pdf_dir.is_absolute():
@@ -277,12 +403,8 @@ def main():
         logger.error("--all not yet implemented")
         return
     
-    # Run pipeline for each paper
-    for key in keys:
-        try:
-            pipeline.run(key, phases=phases, verbose=args.verbose)
-        except Exception as e:
-            logger.error(f"Error processing {key}: {e}", exc_info=True)
+    # Run pipeline for the papers (Phase 2 shares LLM requests across them)
+    pipeline.run_batch(keys, phases=phases, verbose=args.verbose)
 
 
 if __name__ == '__main__':
@@ -1,32 +1,60 @@
 """
-Phase 1: Table Discovery using LLM
+Phase 1: Table Discovery
 
 Reads TEI XML and finds ALL table references, including:
 - Structured tables in <figure> tags
 - Paragraph-embedded tables in <p> tags
 - Text references to tables
+
+Structured tables and clear-cut paragraph tables are found locally; the LLM
+is only asked about paragraphs the heuristics are unsure of (or about the
+whole paper with discovery_mode: llm).
 """
 
 import json
 import logging
+import re
 from pathlib import Path
 from typing import Dict, List, Optional
+from xml.sax.saxutils import escape
 from openai import OpenAI
 
+from om_qex_extraction.src.doc_cache import DocumentCache
+from om_qex_extraction.src.llm_client import LLMCaller
+from om_qex_extraction.src.llm_json import LLMJSONError, parse_llm_json
+from om_qex_extraction.src.paragraph_table_detector import (
+    ANCHOR_PATTERN, DEFAULT_HIGH_CONFIDENCE, DEFAULT_LOW_CONFIDENCE, detect_paragraph_tables, table_mentions
+)
+from om_qex_extraction.src.table_extractor import extract_tables
+from om_qex_extraction.src.tei_compact import FORMAT_NOTE, compact_tei
+from om_qex_extraction.src.tei_document import TEIDocument
+from om_qex_extraction.src.token_ledger import estimate_tokens
+
 logger = logging.getLogger(__name__)
 
+REGION_NOTE = (
+    "NOTE: Only the paragraphs below are included. Structured <figure> tables and clear-cut "
+    "paragraph tables of this paper were already found. Report only tables contained in these "
+    "paragraphs (use each paragraph's xml:id as its location)."
+)
+
 
 class Phase1TableDiscovery:
     """
-    Phase 1: LLM-based table discovery from TEI XML.
+    Phase 1: Table discovery from TEI XML.
     
-    Solves the critical issue where Python XML parsers miss paragraph-embedded tables.
+    Solves the critical issue where Python XML parsers miss paragraph-embedded tables:
+    paragraphs are scored locally (numeric density, standard errors, stars,
+    "Table N" captions) and only the uncertain ones are sent to the LLM.
     """
     
-    def __init__(self, client: OpenAI, model: str, config: Dict):
+    def __init__(self, client: OpenAI, model: str, config: Dict, llm: Optional[LLMCaller] = None,
+                 doc_cache: Optional[DocumentCache] = None):
         self.client = client
         self.model = model
         self.config = config
+        self.llm = llm or LLMCaller.from_config(client, config)
+        self.doc_cache = doc_cache
         self.prompt_template = self._load_prompt()
     
     def _load_prompt(self) -> str:
@@ -50,24 +78,80 @@ class Phase1TableDiscovery:
             - total_tables_found: Count
             - warnings: List of issues detected
             - summary: Statistics
+            - discovery: How the tables were found (mode, uncertain regions, LLM called)
         """
         logger.info(f"PHASE 1: Table Discovery for {key}")
         
-        # Read TEI XML
-        tei_content = self._read_tei(tei_file)
+        phase_config = self.config.get('phase1_table_discovery', {})
+        mode = phase_config.get('discovery_mode', 'gated')
+        
+        compact = phase_config.get('tei_format', 'compact') == 'compact'
+        
+        if mode == 'llm':
+            # Whole paper to the LLM (truncated if too large to avoid token limits)
+            tei_content = self._read_tei(tei_file)
+            compaction = None
+            if compact:
+                compaction = compact_tei(tei_content)
+                tei_content = compaction['text']
+                compaction = compaction['report']
+                logger.info(f"Compacted TEI: ~{compaction['original_tokens']:,} -> ~{compaction['compact_tokens']:,} "
+                            f"tokens ({compaction['reduction']:.0%} smaller)")
+            max_chars = phase_config.get('max_tei_chars', 100000)
+            truncated = len(tei_content) > max_chars
+            if truncated:
+                logger.warning(f"TEI content too large ({len(tei_content)} chars), truncating to {max_chars}")
+                tei_content = tei_content[:max_chars]
+            result = self._call_llm(tei_content, key, note=FORMAT_NOTE if compact else None)
+            result['discovery'] = {'mode': mode, 'llm_called': True, 'tei_truncated': truncated}
+            if compaction is not None:
+                result['discovery']['tei_compaction'] = compaction
+        else:
+            document = self._load_document(tei_file)
+            result, uncertain = self._discover_locally(document, key)
+            
+            if uncertain and mode == 'gated':
+                logger.info(f"{len(uncertain)} uncertain paragraph(s) - asking the LLM about those regions only")
+                excerpt = self._region_excerpt(tei_file, document, uncertain)
+                note = REGION_NOTE
+                if compact:
+                    excerpt = compact_tei(excerpt)['text']
+                    note = REGION_NOTE + "\n" + FORMAT_NOTE
+                llm_result = self._call_llm(excerpt, key, note=note)
+                self._merge_llm_result(result, llm_result)
+            elif uncertain:
+                result['warnings'].append(
+                    f"{len(uncertain)} possible paragraph tables left unchecked (discovery_mode: {mode})"
+                )
+            else:
+                logger.info("All tables found locally - no LLM call needed")
+            
+            self._add_text_references(result, document)
+            result['discovery'] = {
+                'mode': mode,
+                'uncertain_regions': len(uncertain),
+                'llm_called': bool(uncertain) and mode == 'gated'
+            }
+        
+        # Validate and add warnings
+        result = self._validate_result(result)
         
-        # Truncate if too large (to avoid token limits)
-        max_chars = self.config.get('phase1_table_discovery', {}).get('max_tei_chars', 100000)
-        if len(tei_content) > max_chars:
-            logger.warning(f"TEI content too large ({len(tei_content)} chars), truncating to {max_chars}")
-            tei_content = tei_content[:max_chars]
+        # Log summary
+        self._log_summary(result, key)
         
-        # Create prompt
-        prompt = self.prompt_template + "\n\n" + tei_content
+        return result
+    
+    def _call_llm(self, tei_content: str, key: str, note: Optional[str] = None) -> Dict:
+        """Send TEI content with the discovery prompt and parse the response."""
+        prompt = self.prompt_template + "\n\n" + (note + "\n\n" if note else "") + tei_content
         
-        # Call LLM
-        logger.info(f"Calling LLM for table discovery (TEI size: {len(tei_content)} chars)")
-        response = self.client.chat.completions.create(
+        estimated_tokens = estimate_tokens(prompt)
+        logger.info(f"Calling LLM for table discovery (TEI size: {len(tei_content)} chars, "
+                    f"~{estimated_tokens:,} prompt tokens)")
+        response = self.llm.complete(
+            key=key,
+            phase="phase1",
+            estimated_tokens=estimated_tokens,
             model=self.model,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.0,
@@ -83,17 +167,182 @@ class Phase1TableDiscovery:
         # Save raw response for debugging (especially useful when parsing fails)
         result['_raw_response'] = raw_response
         result['_raw_response_length'] = len(raw_response)
+        return result
+    
+    def _load_document(self, tei_file: Path) -> TEIDocument:
+        """Parsed TEI document (shared with the other phases through the document cache)."""
+        if self.doc_cache is not None:
+            return self.doc_cache.get_document(tei_file)
+        return TEIDocument.from_file(tei_file)
+    
+    def _discover_locally(self, document: TEIDocument, key: str):
+        """
+        Structured tables plus confidently detected paragraph tables.
         
-        # Validate and add warnings
-        result = self._validate_result(result)
+        Returns:
+            (result, uncertain) - Phase 1 result without text references, and
+            the paragraph candidates the heuristics could not decide
+        """
+        phase_config = self.config.get('phase1_table_discovery', {})
+        high = phase_config.get('high_confidence', DEFAULT_HIGH_CONFIDENCE)
+        low = phase_config.get('low_confidence', DEFAULT_LOW_CONFIDENCE)
         
-        # Log summary
-        self._log_summary(result, key)
+        tables = []
+        for table in extract_tables(document, key):
+            tables.append({
+                'table_number': str(table['table_number']) if table['numbered'] else f"unnumbered-{table['table_index']}",
+                'title': self._caption_title(table['head']) or table['description'][:100],
+                'location': f"figure {table['xml_id']}",
+                'xml_id': table['xml_id'] or None,
+                'has_structure': table['n_rows'] > 0,
+                'confidence': 1.0 if table['numbered'] else 0.6,
+                'source': 'tei_structure'
+            })
+        with_rows = {t['table_number'] for t in tables if t['has_structure']}
         
-        return result
+        uncertain = []
+        by_number = {}
+        unnumbered = 0
+        for candidate in detect_paragraph_tables(document, high, low):
+            number = candidate['table_number']
+            if candidate['status'] == 'uncertain':
+                if candidate['confidence'] < high:
+                    if not (number and (number in with_rows or number in by_number)):
+                        uncertain.append(candidate)
+                    continue
+                # Clearly tabular but no "Table N" caption anywhere near it
+                unnumbered += 1
+                number = f"unnumbered-p{unnumbered}"
+            if number in with_rows:
+                continue  # Paragraph repeats a structured table's content
+            if number in by_number:
+                by_number[number].setdefault('continued_in', []).append(candidate['xml_id'])
+                continue
+            # Prompt scale: 1.0 captioned table, 0.8 caption + numbers, 0.6 tabular but unlabelled
+            if candidate['status'] != 'table':
+                confidence = 0.6
+            else:
+                confidence = 1.0 if candidate['confidence'] >= high else 0.8
+            entry = {
+                'table_number': number,
+                'title': candidate['title'] or "Untitled paragraph table",
+                'location': f"paragraph {candidate['xml_id']}",
+                'xml_id': candidate['xml_id'],
+                'has_structure': False,
+                'confidence': confidence,
+                'estimated_columns': candidate['structure']['n_columns'],
+                'estimated_rows': sum(1 for r in candidate['structure']['rows'] if r['values']),
+                'source': 'paragraph_heuristics'
+            }
+            by_number[number] = entry
+            tables.append(entry)
+        
+        result = {
+            '_key': key,
+            '_phase': 'phase1_table_discovery',
+            'tables_found': tables,
+            'warnings': []
+        }
+        if unnumbered:
+            result['warnings'].append(f"{unnumbered} paragraph table(s) without a table number")
+        return result, uncertain
+    
+    @staticmethod
+    def _caption_title(head: str) -> str:
+        """Caption text after "Table N:"."""
+        anchor = ANCHOR_PATTERN.match(head or '')
+        return (head[anchor.end():] if anchor else head or '').strip(' :.-|')
+    
+    def _region_excerpt(self, tei_file: Path, document: TEIDocument, regions: List[Dict]) -> str:
+        """Minimal TEI document holding only the uncertain paragraphs (original XML where possible)."""
+        tei_text = self._read_tei(tei_file)
+        parts = []
+        for region in regions:
+            xml = self._paragraph_xml(tei_text, region['xml_id']) if region['xml_id'] else None
+            if xml is None:
+                text = document.sections[region['section_index']]['paragraphs'][region['paragraph_index']]
+                xml = f"<p>{escape(text)}</p>"
+            parts.append(xml)
+        return ('<TEI xmlns="http://www.tei-c.org/ns/1.0"><text><body>\n'
+                + '\n'.join(parts) + '\n</body></text></TEI>')
+    
+    @staticmethod
+    def _paragraph_xml(tei_text: str, xml_id: str) -> Optional[str]:
+        """Raw XML of the element carrying xml:id="{xml_id}"."""
+        position = tei_text.find(f'xml:id="{xml_id}"')
+        if position == -1:
+            return None
+        start = tei_text.rfind('<', 0, position)
+        tag = re.match(r'<([\w:]+)', tei_text[start:])
+        if start == -1 or tag is None:
+            return None
+        end = tei_text.find(f'</{tag.group(1)}>', position)
+        if end == -1:
+            return None
+        return tei_text[start:end + len(tag.group(1)) + 3]
+    
+    @staticmethod
+    def _merge_llm_result(result: Dict, llm_result: Dict):
+        """Add the paragraph tables the LLM found in the uncertain regions."""
+        tables = result['tables_found']
+        by_number = {t['table_number']: t for t in tables}
+        added = 0
+        for table in llm_result.get('tables_found', []):
+            if not str(table.get('location', '')).startswith('paragraph'):
+                continue  # Figures and text references are collected from the whole paper locally
+            number = str(table.get('table_number') or '').strip()
+            if not number:
+                continue
+            if number in by_number:
+                # Another part of a table that was already found
+                existing = by_number[number]
+                if table.get('xml_id') and table.get('xml_id') != existing.get('xml_id'):
+                    existing.setdefault('continued_in', []).append(table['xml_id'])
+                continue
+            table['table_number'] = number
+            table['source'] = 'llm'
+            tables.append(table)
+            by_number[number] = table
+            added += 1
+        logger.info(f"LLM confirmed {added} table(s) in the uncertain regions")
+        
+        # Parse failures / truncation; gap and duplicate checks are redone on the merged result
+        result['warnings'].extend(w for w in llm_result.get('warnings', []) if 'LLM' in w)
+        for field in ('_raw_response', '_raw_response_length'):
+            if field in llm_result:
+                result[field] = llm_result[field]
+    
+    @staticmethod
+    def _add_text_references(result: Dict, document: TEIDocument):
+        """Tables mentioned in the text but not found anywhere, plus the totals and summary."""
+        tables = result['tables_found']
+        found = {t['table_number'] for t in tables}
+        for number, section_index in table_mentions(document).items():
+            if number in found:
+                continue
+            tables.append({
+                'table_number': number,
+                'title': "Referenced but content not found in this section",
+                'location': f"text_reference section_{section_index}",
+                'xml_id': None,
+                'has_structure': False,
+                'confidence': 0.4,
+                'source': 'text_reference'
+            })
+            found.add(number)
+        
+        result['total_tables_found'] = len(tables)
+        result['table_numbers'] = [t['table_number'] for t in tables]
+        result['summary'] = {
+            'structured_tables': sum(1 for t in tables if str(t.get('location', '')).startswith('figure')),
+            'paragraph_tables': sum(1 for t in tables if str(t.get('location', '')).startswith('paragraph')),
+            'text_references_only': sum(1 for t in tables if str(t.get('location', '')).startswith('text_reference'))
+        }
     
     def _read_tei(self, tei_file: Path) -> str:
-        """Read TEI XML file."""
+        """Read TEI XML file (from the document cache shared with the other phases, if enabled)."""
+        if self.doc_cache is not None:
+            return self.doc_cache.get_text(tei_file)
         with open(tei_file, 'r', encoding='utf-8') as f:
             return f.read()
     
@@ -105,68 +354,28 @@ class Phase1TableDiscovery:
         - Pure JSON
         - Markdown-wrapped JSON (```json or ```)
         - Text prefix + JSON (e.g., "Here's the JSON: {...}")
+        - Trailing commas and responses truncated at max_tokens
         """
         try:
-            # Try direct JSON parsing
-            result = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            # Try extracting JSON from markdown code blocks
-            if "```json" in response_text:
-                json_str = response_text.split("```json")[1].split("```")[0].strip()
-                try:
-                    result = json.loads(json_str)
-                except json.JSONDecodeError as e2:
-                    logger.error(f"Failed to parse JSON from markdown block: {e2}")
-                    logger.error(f"Response preview: {response_text[:1000]}")
-                    result = {
-                        "tables_found": [],
-                        "total_tables_found": 0,
-                        "warnings": [f"Failed to parse LLM response: {str(e2)}"],
-                        "summary": {}
-                    }
-            elif "```" in response_text:
-                json_str = response_text.split("```")[1].split("```")[0].strip()
-                try:
-                    result = json.loads(json_str)
-                except json.JSONDecodeError as e2:
-                    logger.error(f"Failed to parse JSON from code block: {e2}")
-                    logger.error(f"Response preview: {response_text[:1000]}")
-                    result = {
-                        "tables_found": [],
-                        "total_tables_found": 0,
-                        "warnings": [f"Failed to parse LLM response: {str(e2)}"],
-                        "summary": {}
-                    }
-            else:
-                # Try to find JSON by looking for first '{' character
-                # This handles cases like "Here's the result: {...}"
-                json_start = response_text.find('{')
-                if json_start > 0:
-                    logger.info(f"Detected text prefix before JSON, stripping first {json_start} chars")
-                    json_str = response_text[json_start:]
-                    try:
-                        result = json.loads(json_str)
-                        logger.info(f"Successfully parsed JSON after stripping text prefix")
-                    except json.JSONDecodeError as e2:
-                        logger.error(f"Failed to parse JSON after stripping prefix: {e2}")
-                        logger.error(f"Response preview: {response_text[:1000]}")
-                        result = {
-                            "tables_found": [],
-                            "total_tables_found": 0,
-                            "warnings": [f"Failed to parse LLM response: {str(e2)}"],
-                            "summary": {}
-                        }
-                else:
-                    logger.error(f"Failed to parse LLM response as JSON: {e}")
-                    logger.error(f"Response length: {len(response_text)} chars")
-                    logger.error(f"Response preview (first 1000 chars): {response_text[:1000]}")
-                    logger.error(f"Response preview (last 500 chars): {response_text[-500:]}")
-                    result = {
-                        "tables_found": [],
-                        "total_tables_found": 0,
-                        "warnings": [f"Failed to parse LLM response: {str(e)}"],
-                        "summary": {}
-                    }
+            parsed = parse_llm_json(response_text)
+            result = parsed.data
+            if parsed.repairs:
+                logger.info(f"Recovered JSON from LLM response ({', '.join(parsed.repairs)})")
+            if parsed.truncated:
+                result.setdefault('warnings', []).append(
+                    "LLM response was truncated - kept the tables listed before the cut-off"
+                )
+        except LLMJSONError as e:
+            logger.error(f"Failed to parse LLM response as JSON: {e.msg}")
+            logger.error(f"Response length: {len(response_text)} chars")
+            logger.error(f"Response preview (first 1000 chars): {response_text[:1000]}")
+            logger.error(f"Response preview (last 500 chars): {response_text[-500:]}")
+            result = {
+                "tables_found": [],
+                "total_tables_found": 0,
+                "warnings": [f"Failed to parse LLM response: {e.msg}"],
+                "summary": {}
+            }
         
         # Add metadata
         result['_key'] = key
@@ -5,16 +5,42 @@ Classifies tables as RESULTS or DESCRIPTIVE based on:
 - Table caption/title
 - Table headers
 - Context in paper
+
+A local classifier (smart_table_filter signals) decides the confident
+tables; only tables in its uncertain band go to the LLM, packed across
+papers into as few requests as the token budget allows.
 """
 
 import json
 import logging
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from openai import OpenAI
 
+from om_qex_extraction.src.doc_cache import DocumentCache
+from om_qex_extraction.src.llm_client import LLMCaller
+from om_qex_extraction.src.llm_json import LLMJSONError, parse_llm_json
+from om_qex_extraction.src.table_classifier import TableClassifier, load_tei_tables, phase1_tables
+from om_qex_extraction.src.text_index import TextIndex
+from om_qex_extraction.src.token_ledger import estimate_tokens
+
 logger = logging.getLogger(__name__)
 
+STRATEGIES = ('cascade', 'llm', 'heuristic')
+
+# Added to the prompt when tables of several papers share one request
+BATCH_NOTE = (
+    "The tables below come from {papers} different papers. Each table has a \"paper\" field: "
+    "copy it, together with the exact table_number, into every classification."
+)
+
+# Uncertain band for the built-in weights, which are not probabilities. It sends
+# most tables to the LLM; a trained model's calibrated band decides more locally
+DEFAULT_UNCERTAIN_BAND = [0.45, 0.65]
+
+# Response tokens allowed per table in a batched request
+RESPONSE_TOKENS_PER_TABLE = 100
+
 
 class Phase2TableFiltering:
     """
@@ -24,11 +50,38 @@ class Phase2TableFiltering:
     and keeps only RESULTS tables (treatment effects, impacts, etc.)
     """
     
-    def __init__(self, client: OpenAI, model: str, config: Dict):
+    def __init__(self, client: OpenAI, model: str, config: Dict, llm: Optional[LLMCaller] = None,
+                 text_index: Optional[TextIndex] = None, doc_cache: Optional[DocumentCache] = None):
         self.client = client
         self.model = model
         self.config = config
+        self.llm = llm or LLMCaller.from_config(client, config)
+        self.text_index = text_index
+        self.doc_cache = doc_cache
         self.prompt_template = self._load_prompt()
+        
+        phase_config = config.get('phase2_table_filtering', {}) or {}
+        self.strategy = phase_config.get('strategy', 'cascade') if phase_config.get('use_llm', True) else 'heuristic'
+        if self.strategy not in STRATEGIES:
+            raise ValueError(f"Unknown phase2_table_filtering.strategy '{self.strategy}' "
+                             f"(expected one of {', '.join(STRATEGIES)})")
+        self.batch_tokens = phase_config.get('batch_tokens', 12000)
+        self.batch_max_tables = phase_config.get('batch_max_tables', 40)
+        self.classifier = self._load_classifier()
+        # Local scores in [low, high) are uncertain and go to the LLM: the configured band, else the
+        # band calibrated with the trained model (train_table_classifier.py), else DEFAULT_UNCERTAIN_BAND
+        band = phase_config.get('uncertain_band') or self.classifier.model.get('uncertain_band') or DEFAULT_UNCERTAIN_BAND
+        self.uncertain_low, self.uncertain_high = band
+    
+    def _load_classifier(self) -> TableClassifier:
+        """Local classifier: table_classifier.weights (relative to the project root), else the built-in weights."""
+        weights = (self.config.get('table_classifier', {}) or {}).get('weights')
+        if not weights:
+            return TableClassifier()
+        path = Path(weights)
+        if not path.is_absolute():
+            path = Path(__file__).parent.parent.parent / path
+        return TableClassifier.load(path)
     
     def _load_prompt(self) -> str:
         """Load Phase 2 prompt template."""
@@ -94,20 +147,28 @@ For each table, output:
                 }
             }
         
-        # Check if LLM filtering is enabled
-        if not self.config.get('phase2_table_filtering', {}).get('use_llm', True):
+        if self.strategy == 'heuristic':
             logger.info("LLM filtering disabled, using heuristic filter")
-            return self._heuristic_filter(tables, key)
+            return self._heuristic_filter(tables, key, tei_file)
+        if self.strategy == 'cascade':
+            result = self.filter_tables_batch([(phase1_result, tei_file)])[0]
+            if 'error' in result:
+                raise RuntimeError(f"Phase 2 table filtering failed for {key}: {result['error']}")
+            return result
         
-        # Extract context for each table (TODO: implement)
+        # Extract context for each table
         table_contexts = self._extract_contexts(tei_file, tables)
         
         # Create prompt
         prompt = self._create_prompt(tables, table_contexts)
         
         # Call LLM
-        logger.info(f"Calling LLM for table filtering ({len(tables)} tables)")
-        response = self.client.chat.completions.create(
+        estimated_tokens = estimate_tokens(prompt)
+        logger.info(f"Calling LLM for table filtering ({len(tables)} tables, ~{estimated_tokens:,} prompt tokens)")
+        response = self.llm.complete(
+            key=key,
+            phase="phase2",
+            estimated_tokens=estimated_tokens,
             model=self.model,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.0,
@@ -125,27 +186,213 @@ For each table, output:
         
         return result
     
+    def filter_tables_batch(self, papers: List[Tuple[Dict, Path]]) -> List[Dict]:
+        """
+        Filter the tables of several papers with the confidence cascade.
+        
+        Every table is scored locally first. Tables scoring at or above the
+        uncertain band are RESULTS and below it DESCRIPTIVE; the uncertain
+        ones of all papers are packed into shared LLM requests of up to
+        batch_tokens prompt tokens (batch_max_tables tables).
+        
+        Args:
+            papers: (Phase 1 result, TEI file) per paper
+        
+        Returns:
+            One Phase 2 result per paper, in order (as filter_tables), or
+            {'_key', '_phase', 'error'} for a paper whose tables could not be scored
+        """
+        classified = {}  # key -> table classifications, in Phase 1 order
+        uncertain = []   # (key, index into classified[key], table, context)
+        errors = {}      # key -> error; the paper gets an error result, the others continue
+        for phase1_result, tei_file in papers:
+            key = phase1_result.get('_key', tei_file.name.replace('.tei.xml', ''))
+            try:
+                tables = phase1_result['tables_found']
+                paper_classified = self._score_locally(tables, tei_file) if tables else []
+                pending = [i for i, table in enumerate(paper_classified) if table['decided_by'] == 'uncertain']
+                paper_uncertain = []
+                if pending:
+                    contexts = self._extract_contexts(tei_file, [tables[i] for i in pending])
+                    paper_uncertain = [(key, i, tables[i], contexts[tables[i]['table_number']]) for i in pending]
+            except Exception as e:
+                logger.error(f"Phase 2 failed for {key}: {e}", exc_info=True)
+                errors[key] = str(e)
+                continue
+            classified[key] = paper_classified
+            uncertain.extend(paper_uncertain)
+        
+        batches = self._pack_batches(uncertain)
+        if uncertain:
+            logger.info(f"Phase 2 cascade: {sum(len(t) for t in classified.values()) - len(uncertain)} tables decided "
+                        f"locally, {len(uncertain)} uncertain in {len(batches)} LLM request(s)")
+        for batch in batches:
+            answers = self._classify_batch(batch)
+            for key, i, table, _ in batch:
+                answer = answers.get((key, str(table['table_number'])))
+                local = classified[key][i]
+                if answer is None:
+                    # No usable answer: keep the local decision
+                    local.update(decided_by='local', reasoning=local['reasoning'] + "; no LLM classification")
+                    continue
+                classified[key][i] = {
+                    **table,
+                    'classification': answer['classification'],
+                    'confidence': answer.get('confidence', 1.0),
+                    'reasoning': answer.get('reasoning', ''),
+                    'local_score': local['local_score'],
+                    'decided_by': 'llm'
+                }
+        
+        results = []
+        for phase1_result, tei_file in papers:
+            key = phase1_result.get('_key', tei_file.name.replace('.tei.xml', ''))
+            if key in errors:
+                results.append({'_key': key, '_phase': 'phase2_table_filtering', 'error': errors[key]})
+                continue
+            result = self._apply_threshold(self._build_result(key, classified[key]))
+            result['summary'].update(
+                decided_locally=sum(1 for t in classified[key] if t['decided_by'] == 'local'),
+                decided_by_llm=sum(1 for t in classified[key] if t['decided_by'] == 'llm')
+            )
+            self._log_summary(result, key)
+            results.append(result)
+        return results
+    
+    def _score_locally(self, tables: List[Dict], tei_file: Path) -> List[Dict]:
+        """
+        Local classification of Phase 1 tables. Scores in the uncertain
+        band are marked decided_by "uncertain" (the cascade sends them to
+        the LLM); the heuristic strategy has no band.
+        """
+        key = tei_file.name.replace('.tei.xml', '')
+        try:
+            _, extracted, full_text = next(load_tei_tables([tei_file], self.doc_cache))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read tables of {tei_file.name} for local scoring: {e}")
+            extracted, full_text = [], None
+        scores = self.classifier.score_tables(phase1_tables(tables, extracted), full_text)
+        
+        classified = []
+        for table, score, is_results in zip(tables, scores, self.classifier.decide(scores)):
+            score = float(score)
+            uncertain = self.strategy == 'cascade' and self.uncertain_low <= score < self.uncertain_high
+            classified.append({
+                **table,
+                'classification': 'RESULTS' if is_results else 'DESCRIPTIVE',
+                'confidence': round(max(score, 1 - score), 3),
+                'reasoning': f"Local classifier score {score:.2f} (threshold {self.classifier.threshold})",
+                'local_score': round(score, 4),
+                'decided_by': 'uncertain' if uncertain else 'local'
+            })
+        logger.debug(f"{key}: local scores {[t['local_score'] for t in classified]}")
+        return classified
+    
+    def _pack_batches(self, uncertain: List[Tuple]) -> List[List[Tuple]]:
+        """Split uncertain tables into requests of at most batch_tokens (estimated) and batch_max_tables."""
+        base_tokens = estimate_tokens(self.prompt_template)
+        batches, batch, tokens = [], [], base_tokens
+        for item in uncertain:
+            key, _, table, context = item
+            item_tokens = estimate_tokens(json.dumps({'paper': key, **table}) + json.dumps(context))
+            if batch and (tokens + item_tokens > self.batch_tokens or len(batch) >= self.batch_max_tables):
+                batches.append(batch)
+                batch, tokens = [], base_tokens
+            batch.append(item)
+            tokens += item_tokens
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _classify_batch(self, batch: List[Tuple]) -> Dict[Tuple[str, str], Dict]:
+        """
+        One LLM request for a batch of uncertain tables.
+        
+        Returns:
+            {(paper key, table_number): classification}; empty if the
+            request or its JSON failed (the local decisions stand)
+        """
+        keys = list(dict.fromkeys(key for key, _, _, _ in batch))
+        tables = [{'paper': key, 'table_number': str(table['table_number']),
+                   **{k: v for k, v in table.items() if k not in ('paper', 'table_number')}}
+                  for key, _, table, _ in batch]
+        contexts = {f"{key}:{table['table_number']}": context for key, _, table, context in batch}
+        prompt = self._create_prompt(tables, contexts, note=BATCH_NOTE.format(papers=len(keys)))
+        
+        estimated_tokens = estimate_tokens(prompt)
+        logger.info(f"Calling LLM for table filtering ({len(batch)} uncertain tables from {len(keys)} papers, "
+                    f"~{estimated_tokens:,} prompt tokens)")
+        try:
+            response = self.llm.complete(
+                key=keys[0] if len(keys) == 1 else "batch:" + ",".join(keys),
+                phase="phase2",
+                estimated_tokens=estimated_tokens,
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.0,
+                max_tokens=max(self.config.get('model', {}).get('phase2_max_tokens', 2000),
+                               RESPONSE_TOKENS_PER_TABLE * len(batch))
+            )
+            result = parse_llm_json(response.choices[0].message.content).data
+        except LLMJSONError as e:
+            logger.error(f"Failed to parse filtering response: {e.msg}")
+            return {}
+        except Exception as e:
+            logger.error(f"Phase 2 batch request failed ({len(batch)} tables kept as classified locally): {e}")
+            return {}
+        
+        answers = {}
+        for answer in result.get('tables_classified', []):
+            if answer.get('classification') not in ('RESULTS', 'DESCRIPTIVE'):
+                continue
+            paper = answer.get('paper') or (keys[0] if len(keys) == 1 else None)
+            answers[(paper, str(answer.get('table_number')))] = answer
+        return answers
+    
     def _extract_contexts(self, tei_file: Path, tables: List[Dict]) -> Dict:
         """
         Extract text context around each table.
         
-        TODO: Implement proper context extraction
-        For now, just use table titles as context.
+        With a text index, before/after are the text around the table's first
+        reference in the paper ("... as Table 3 shows ...") and excerpts the
+        windows around its first few references. Without one, only the table
+        title and location are given.
         """
+        mentions_available = False
+        if self.text_index is not None:
+            try:
+                self.text_index.update_file(tei_file)  # No-op unless the TEI changed
+                mentions_available = True
+            except (OSError, ValueError) as e:
+                logger.warning(f"Text index unavailable for {tei_file.name}: {e}")
+        
+        key = tei_file.name.replace('.tei.xml', '')
+        chars = (self.config.get('text_index', {}) or {}).get('context_chars', 300)
         contexts = {}
         for table in tables:
             table_num = table['table_number']
-            contexts[table_num] = {
+            context = {
                 'title': table.get('title', ''),
                 'location': table.get('location', ''),
-                'before': '',  # TODO: Extract text before table
-                'after': ''    # TODO: Extract text after table
+                'before': '',
+                'after': ''
             }
+            if mentions_available and not str(table_num).startswith('unnumbered'):
+                found = self.text_index.table_context(key, table_num, chars=chars)
+                context.update(
+                    before=found['before'],
+                    after=found['after'],
+                    mentions=found['mentions'],
+                    excerpts=[e['text'] for e in found['excerpts']]
+                )
+            contexts[table_num] = context
         return contexts
     
-    def _create_prompt(self, tables: List[Dict], contexts: Dict) -> str:
+    def _create_prompt(self, tables: List[Dict], contexts: Dict, note: str = "") -> str:
         """Create prompt for LLM classification."""
         prompt = self.prompt_template + "\n\n"
+        if note:
+            prompt += note + "\n\n"
         prompt += f"Tables to classify ({len(tables)} total):\n\n"
         prompt += json.dumps(tables, indent=2)
         prompt += "\n\nContext excerpts:\n\n"
@@ -156,18 +403,16 @@ For each table, output:
     def _parse_response(self, response_text: str, key: str) -> Dict:
         """Parse LLM response."""
         try:
-            result = json.loads(response_text)
-        except json.JSONDecodeError:
-            # Try extracting from markdown
-            if "```json" in response_text:
-                json_str = response_text.split("```json")[1].split("```")[0].strip()
-                result = json.loads(json_str)
-            else:
-                logger.error(f"Failed to parse filtering response")
-                result = {'tables_classified': []}
+            result = parse_llm_json(response_text).data
+        except LLMJSONError as e:
+            logger.error(f"Failed to parse filtering response: {e.msg}")
+            result = {'tables_classified': []}
         
+        return self._build_result(key, result.get('tables_classified', []))
+    
+    def _build_result(self, key: str, tables_classified: List[Dict]) -> Dict:
+        """Phase 2 result from table classifications."""
         # Separate RESULTS and DESCRIPTIVE
-        tables_classified = result.get('tables_classified', [])
         results_tables = [t for t in tables_classified if t.get('classification') == 'RESULTS']
         descriptive_tables = [t for t in tables_classified if t.get('classification') == 'DESCRIPTIVE']
         
@@ -199,36 +444,13 @@ For each table, output:
         
         return result
     
-    def _heuristic_filter(self, tables: List[Dict], key: str) -> Dict:
-        """
-        Fallback heuristic filtering (similar to V1 smart_table_filter.py).
-        
-        TODO: Implement heuristic rules
-        For now, just classify all as RESULTS.
-        """
-        logger.info("Using heuristic filter (all tables classified as RESULTS)")
-        
-        tables_classified = []
-        for table in tables:
-            tables_classified.append({
-                **table,
-                'classification': 'RESULTS',
-                'confidence': 0.8,
-                'reasoning': 'Heuristic filter: default to RESULTS'
-            })
-        
-        return {
-            '_key': key,
-            '_phase': 'phase2_table_filtering',
-            'tables_classified': tables_classified,
-            'results_tables': tables_classified,
-            'descriptive_tables': [],
-            'summary': {
-                'total_tables': len(tables_classified),
-                'results_tables': len(tables_classified),
-                'descriptive_tables': 0
-            }
-        }
+    def _heuristic_filter(self, tables: List[Dict], key: str, tei_file: Path) -> Dict:
+        """Classify every table with the local classifier only (no LLM call)."""
+        logger.info("Using heuristic filter (local classifier)")
+        result = self._apply_threshold(self._build_result(key, self._score_locally(tables, tei_file)))
+        result['summary'].update(decided_locally=len(tables), decided_by_llm=0)
+        self._log_summary(result, key)
+        return result
     
     def _log_summary(self, result: Dict, key: str):
         """Log filtering summary."""
@@ -8,9 +8,16 @@ Handles both structured <figure> tables and paragraph-embedded <p> tables.
 import logging
 import json
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 from openai import OpenAI
 
+from om_qex_extraction.src.doc_cache import DocumentCache
+from om_qex_extraction.src.llm_client import LLMCaller
+from om_qex_extraction.src.llm_json import LLMJSONError, parse_llm_json
+from om_qex_extraction.src.tei_compact import FORMAT_NOTE, compact_tei
+from om_qex_extraction.src.tei_parser import TEIParser
+from om_qex_extraction.src.token_ledger import estimate_tokens
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,10 +29,13 @@ class Phase3TEIExtraction:
     handling both structured and paragraph-embedded tables.
     """
     
-    def __init__(self, client: OpenAI, model: str, config: Dict):
+    def __init__(self, client: OpenAI, model: str, config: Dict, llm: Optional[LLMCaller] = None,
+                 doc_cache: Optional[DocumentCache] = None):
         self.client = client
         self.model = model
         self.config = config
+        self.llm = llm or LLMCaller.from_config(client, config)
+        self.doc_cache = doc_cache
         self.prompt_template = self._load_prompt()
         self.output_dir = Path(__file__).parent.parent / "outputs" / "phase3"
     
@@ -65,11 +75,21 @@ class Phase3TEIExtraction:
         
         # Read TEI XML once
         tei_content = self._read_tei(tei_file)
+        phase3_config = self.config.get('pipeline', {}).get('phase3_tei_extraction', {})
+        
+        # Compact to what the prompt needs (drops namespaces, coordinates, references, ...)
+        compaction = None
+        if phase3_config.get('tei_format', 'compact') == 'compact':
+            compacted = compact_tei(tei_content)
+            tei_content = FORMAT_NOTE + "\n\n" + compacted['text']
+            compaction = compacted['report']
+            logger.info(f"Compacted TEI: ~{compaction['original_tokens']:,} -> ~{compaction['compact_tokens']:,} "
+                        f"tokens ({compaction['reduction']:.0%} smaller)")
         
         # Truncate if too large
-        phase3_config = self.config.get('pipeline', {}).get('phase3_tei_extraction', {})
         max_chars = phase3_config.get('max_tei_chars', 150000)
-        if len(tei_content) > max_chars:
+        truncated = len(tei_content) > max_chars
+        if truncated:
             logger.warning(f"TEI content too large ({len(tei_content)} chars), truncating to {max_chars}")
             tei_content = tei_content[:max_chars]
         
@@ -92,8 +112,13 @@ class Phase3TEIExtraction:
             prompt = self._create_prompt(batch, tei_content)
             
             # Call LLM
-            logger.info(f"Calling LLM for batch {batch_num} ({len(tei_content)} chars TEI)")
-            response = self.client.chat.completions.create(
+            estimated_tokens = estimate_tokens(prompt)
+            logger.info(f"Calling LLM for batch {batch_num} ({len(tei_content)} chars TEI, "
+                        f"~{estimated_tokens:,} prompt tokens)")
+            response = self.llm.complete(
+                key=key,
+                phase="phase3",
+                estimated_tokens=estimated_tokens,
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.0,
@@ -116,16 +141,57 @@ class Phase3TEIExtraction:
             '_phase': 'phase3_tei_extraction',
             'tables_extracted': all_tables_extracted,
             'outcomes': all_outcomes,
-            'total_outcomes_extracted': len(all_outcomes)
+            'total_outcomes_extracted': len(all_outcomes),
+            'tei_truncated': truncated
         }
+        if compaction is not None:
+            result['tei_compaction'] = compaction
+        if phase3_config.get('resolve_sources', True):
+            result['sources_resolved'] = self._attach_sources(all_outcomes, tei_file)
         
         # Log summary
         self._log_summary(result, key)
         
         return result
     
+    def _attach_sources(self, outcomes: List[Dict], tei_file: Path) -> int:
+        """
+        Add a 'source' span to every outcome whose literal_text or
+        text_position resolves in the paper (see SpanMap.resolve).
+        
+        Returns:
+            Number of outcomes resolved
+        """
+        if not outcomes:
+            return 0
+        if self.doc_cache is not None:
+            parser = TEIParser.from_document(self.doc_cache.get_document(tei_file))
+        else:
+            parser = TEIParser(tei_file, streaming=True)
+        spans = parser.get_full_text_with_spans(include_tables=True)
+        
+        resolved = 0
+        for outcome in outcomes:
+            found = spans.resolve(outcome)
+            if found is None:
+                continue
+            element = found['elements'][0] if found['elements'] else {}
+            outcome['source'] = {
+                'start': found['start'],
+                'end': found['end'],
+                'method': found['method'],
+                **{name: element[name] for name in
+                   ('kind', 'xml_id', 'section_index', 'figure_id', 'table_number', 'row', 'col')
+                   if element.get(name) not in (None, '')}
+            }
+            resolved += 1
+        logger.info(f"Resolved source spans for {resolved}/{len(outcomes)} outcomes")
+        return resolved
+    
     def _read_tei(self, tei_file: Path) -> str:
-        """Read TEI XML content."""
+        """Read TEI XML content, through the shared document cache when there is one."""
+        if self.doc_cache is not None:
+            return self.doc_cache.get_text(tei_file)
         with open(tei_file, 'r', encoding='utf-8') as f:
             return f.read()
     
@@ -154,25 +220,20 @@ class Phase3TEIExtraction:
             f.write(response_text)
         
         try:
-            result = json.loads(response_text)
-        except json.JSONDecodeError:
-            # Try extracting from markdown
-            if "```json" in response_text:
-                json_str = response_text.split("```json")[1].split("```")[0].strip()
-                result = json.loads(json_str)
-            elif "```" in response_text:
-                # Try generic code block
-                json_str = response_text.split("```")[1].split("```")[0].strip()
-                result = json.loads(json_str)
-            else:
-                logger.error(f"Failed to parse Phase 3 response")
-                logger.error(f"Raw response saved to: {raw_file}")
-                logger.error(f"Response preview: {response_text[:500]}...")
-                result = {
-                    'tables_extracted': [],
-                    'outcomes': [],
-                    'total_outcomes_extracted': 0
-                }
+            parsed = parse_llm_json(response_text)
+            result = parsed.data
+            if parsed.truncated:
+                logger.warning(f"Phase 3 response truncated - kept {len(result.get('outcomes', []))} complete outcomes")
+                result['_truncated'] = True
+        except LLMJSONError as e:
+            logger.error(f"Failed to parse Phase 3 response: {e.msg}")
+            logger.error(f"Raw response saved to: {raw_file}")
+            logger.error(f"Response preview: {response_text[:500]}...")
+            result = {
+                'tables_extracted': [],
+                'outcomes': [],
+                'total_outcomes_extracted': 0
+            }
         
         # Add metadata
         result['_key'] = key
@@ -9,9 +9,13 @@ Only extracts specific missing tables (targeted approach).
 
 import logging
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set
 from openai import OpenAI
 
+from om_qex_extraction.src.llm_client import LLMCaller
+from om_qex_extraction.src.llm_json import LLMJSONError, parse_llm_json
+from om_qex_extraction.src.token_ledger import estimate_image_tokens, estimate_tokens
+
 logger = logging.getLogger(__name__)
 
 
@@ -24,10 +28,11 @@ class Phase3bPDFVision:
     - Specific table numbers are missing from extraction
     """
     
-    def __init__(self, client: OpenAI, model: str, config: Dict):
+    def __init__(self, client: OpenAI, model: str, config: Dict, llm: Optional[LLMCaller] = None):
         self.client = client
         self.model = model
         self.config = config
+        self.llm = llm or LLMCaller.from_config(client, config)
     
     def should_trigger(self, phase1_result: Dict, phase2_result: Dict, phase3_result: Dict) -> tuple[bool, List[str]]:
         """
@@ -212,9 +217,6 @@ class Phase3bPDFVision:
         Returns:
             List of extracted outcomes
         """
-        import json
-        import re
-        
         all_outcomes = []
         total_pages = len(images)
         num_batches = (total_pages + batch_size - 1) // batch_size
@@ -291,9 +293,18 @@ Return ONLY valid JSON (or {{"results_tables": []}} if target tables not found o
                     }
                 })
             
+            # Text prompt plus page images
+            estimated_tokens = estimate_tokens(prompt) + sum(
+                estimate_image_tokens(img['width'], img['height']) for img in batch_images
+            )
+            logger.info(f"Estimated prompt size: ~{estimated_tokens:,} tokens ({len(batch_images)} images)")
+            
             try:
                 # Call vision API
-                response = self.client.chat.completions.create(
+                response = self.llm.complete(
+                    key=key,
+                    phase="phase3b",
+                    estimated_tokens=estimated_tokens,
                     model=self.model,
                     messages=messages,
                     temperature=0.0,
@@ -307,25 +318,10 @@ Return ONLY valid JSON (or {{"results_tables": []}} if target tables not found o
                     continue
                 
                 # Parse JSON response
-                parsed = None
-                if '```json' in content:
-                    json_match = re.search(r'```json\s*(\{[\s\S]*?\})\s*```', content, re.DOTALL)
-                    if json_match:
-                        try:
-                            parsed = json.loads(json_match.group(1))
-                        except json.JSONDecodeError:
-                            pass
-                
-                if parsed is None:
-                    json_match = re.search(r'(\{[\s\S]*\})', content, re.DOTALL)
-                    if json_match:
-                        try:
-                            parsed = json.loads(json_match.group(1))
-                        except json.JSONDecodeError:
-                            pass
-                
-                if parsed is None:
-                    logger.warning(f"Failed to parse JSON from batch {batch_idx + 1}")
+                try:
+                    parsed = parse_llm_json(content).data
+                except LLMJSONError as e:
+                    logger.warning(f"Failed to parse JSON from batch {batch_idx + 1}: {e.msg}")
                     logger.warning(f"Raw response (first 500 chars): {content[:500]}")
                     continue
                 
@@ -7,9 +7,11 @@ In V2, this is a validation pass-through since Phase 3 already extracted all QEX
 
 import logging
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 from openai import OpenAI
 
+from om_qex_extraction.src.text_index import TextIndex
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,13 +25,15 @@ class Phase5QEXExtraction:
     Validates:
     - All required fields present (effect_size, p_value, etc.)
     - literal_text and text_position captured
+    - literal_text found in the paper (when a text index is available)
     - Data quality (no obvious parsing errors)
     """
     
-    def __init__(self, client: OpenAI, model: str, config: Dict):
+    def __init__(self, client: OpenAI, model: str, config: Dict, text_index: Optional[TextIndex] = None):
         self.client = client
         self.model = model
         self.config = config
+        self.text_index = text_index
     
     def extract_quantitative(self, phase4_result: Dict, tei_file: Path, key: str) -> Dict:
         """
@@ -56,13 +60,22 @@ class Phase5QEXExtraction:
             all_statistics.extend(group.get('statistics', []))
         
         # Validate each statistic
-        validation_results = self._validate_statistics(all_statistics)
+        indexed = False
+        if self.text_index is not None:
+            try:
+                self.text_index.update_file(tei_file)
+                indexed = True
+            except (OSError, ValueError) as e:
+                logger.warning(f"Text index unavailable for {key}, literal_text not checked: {e}")
+        validation_results = self._validate_statistics(all_statistics, key if indexed else None)
         
         logger.info(f"Validation complete:")
         logger.info(f"  - Complete records: {validation_results['complete']}")
         logger.info(f"  - Missing effect_size: {validation_results['missing_effect_size']}")
         logger.info(f"  - Missing standard_error: {validation_results['missing_se']}")
         logger.info(f"  - Missing literal_text: {validation_results['missing_literal']}")
+        if indexed:
+            logger.info(f"  - literal_text not found in paper: {validation_results['unverified_literal']}")
         
         return {
             '_key': key,
@@ -76,12 +89,14 @@ class Phase5QEXExtraction:
             }
         }
     
-    def _validate_statistics(self, statistics: List[Dict]) -> Dict:
+    def _validate_statistics(self, statistics: List[Dict], key: Optional[str] = None) -> Dict:
         """
         Validate completeness of extracted statistics.
         
         Args:
             statistics: List of all statistics from all outcome groups
+            key: Paper key in the text index; when given, each literal_text
+                must occur in the paper (ignoring case, spacing and punctuation)
         
         Returns:
             Dictionary with validation counts
@@ -93,6 +108,7 @@ class Phase5QEXExtraction:
             'missing_se': 0,
             'missing_p_value': 0,
             'missing_literal': 0,
+            'unverified_literal': 0,
             'missing_position': 0,
             'issues': []
         }
@@ -116,6 +132,9 @@ class Phase5QEXExtraction:
             if not stat.get('literal_text'):
                 validation['missing_literal'] += 1
                 issues.append('missing_literal_text')
+            elif key is not None and not self.text_index.find_literal(key, str(stat['literal_text']), limit=1):
+                validation['unverified_literal'] += 1
+                issues.append('literal_text_not_in_source')
             
             if not stat.get('text_position'):
                 validation['missing_position'] += 1